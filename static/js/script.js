@@ -8,3 +8,111 @@ console.log("Главный скрипт загружен.");
 // function confirmAction(message) {
 //     return confirm(message);
 // }
+
+// Самопроверка (тест в режиме practice): форма получает подписанный пакет ключа ответов
+// (data-practice-bundle). Результат по каждому вопросу показывается сразу, без запросов
+// к серверу; итог отправляется одним JSON-запросом на data-practice-url, где сервер
+// проверяет подпись пакета и сохраняет попытку. Без JavaScript форма отправляется как обычно.
+
+function decodePracticeBundle(bundle) {
+    // Данные пакета — JSON в base64url до точки (после точки — подпись для сервера)
+    let payload = bundle.split('.')[0].replace(/-/g, '+').replace(/_/g, '/');
+    payload += '='.repeat((4 - payload.length % 4) % 4);
+    const bytes = Uint8Array.from(atob(payload), function (c) { return c.charCodeAt(0); });
+    return JSON.parse(new TextDecoder().decode(bytes));
+}
+
+function initPracticeForm(form) {
+    const bundle = form.dataset.practiceBundle;
+    const answerKey = decodePracticeBundle(bundle).k;  // {ID вопроса: [ID правильных ответов]}
+    const blocks = form.querySelectorAll('.question-block[data-question-id]');
+    const status = document.querySelector('.practice-status');
+    const submitButton = form.querySelector('button[type="submit"]');
+    let answered = 0;
+    let correct = 0;
+
+    function updateStatus() {
+        if (status) {
+            status.hidden = false;
+            status.textContent = 'Отвечено: ' + answered + ' из ' + blocks.length + ', правильно: ' + correct;
+        }
+    }
+
+    blocks.forEach(function (block) {
+        const correctIds = (answerKey[block.dataset.questionId] || []).map(String);
+        const feedback = block.querySelector('.practice-feedback');
+        const radios = block.querySelectorAll('input[type="radio"]');
+
+        radios.forEach(function (radio) {
+            radio.addEventListener('change', function () {
+                const isCorrect = correctIds.indexOf(radio.value) !== -1;
+                answered += 1;
+                if (isCorrect) {
+                    correct += 1;
+                }
+                // Ответ засчитывается с первой попытки: остальные варианты блокируются
+                radios.forEach(function (other) {
+                    if (other !== radio) {
+                        other.disabled = true;
+                    }
+                    if (correctIds.indexOf(other.value) !== -1) {
+                        other.parentElement.classList.add('answer-correct');
+                    }
+                });
+                if (!isCorrect) {
+                    radio.parentElement.classList.add('answer-wrong');
+                }
+                if (feedback) {
+                    feedback.hidden = false;
+                    feedback.className = 'practice-feedback ' + (isCorrect ? 'feedback-correct' : 'feedback-wrong');
+                    feedback.textContent = isCorrect ? 'Верно!' : 'Неверно. Правильный ответ отмечен зеленым.';
+                }
+                updateStatus();
+            });
+        });
+    });
+
+    form.addEventListener('submit', function (event) {
+        event.preventDefault();
+        const answers = {};
+        blocks.forEach(function (block) {
+            const checked = block.querySelector('input[type="radio"]:checked');
+            if (checked) {
+                answers[block.dataset.questionId] = checked.value;
+            }
+        });
+        submitButton.disabled = true;
+
+        fetch(form.dataset.practiceUrl, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({bundle: bundle, answers: answers})
+        })
+            .then(function (response) {
+                return response.json().then(function (data) {
+                    if (!response.ok || data.error) {
+                        throw new Error(data.error || 'Не удалось сохранить результат.');
+                    }
+                    return data;
+                });
+            })
+            .then(function (data) {
+                const percentage = data.total_questions_in_test > 0
+                    ? Math.round(data.score / data.total_questions_in_test * 10000) / 100 : 0;
+                status.hidden = false;
+                status.textContent = 'Тест завершен и сохранен: правильно ' + data.score + ' из '
+                    + data.total_questions_in_test + ' (' + percentage + '%).';
+                submitButton.hidden = true;
+                status.scrollIntoView();
+            })
+            .catch(function (error) {
+                status.hidden = false;
+                status.textContent = error.message;
+                submitButton.disabled = false;  // Можно отправить еще раз: попытка не будет сохранена дважды
+            });
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('form[data-practice-bundle]').forEach(initPracticeForm);
+});
@@ -1,18 +1,20 @@
 from flask import Flask, g
+from jinja2 import FileSystemBytecodeCache
+import click
 import os
 import datetime
 from EngLes.test_generator_app import config
-from EngLes.test_generator_app.models.database_manager import init_db_command, close_db_connection
-import os
-
+from EngLes.test_generator_app.models.database_manager import init_db_command, close_db_connection, ensure_schema
 
-# Импорты блюпринтов будут добавлены позже, когда они будут созданы
-REL_PATH = 'C:/EngLes/EngLes/templates'
 
 def create_app(test_config=None):
-    template_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), REL_PATH)
-    """Фабрика для создания экземпляра приложения Flask."""
-    app = Flask(__name__,template_folder=template_folder, instance_relative_config=True)
+    """
+    Фабрика для создания экземпляра приложения Flask.
+    Тяжелые зависимости (python-docx, NumPy) загружаются при первом использовании,
+    а не при запуске воркера.
+    """
+    app = Flask(__name__, template_folder=config.TEMPLATES_DIR, static_folder=config.STATIC_DIR,
+                instance_relative_config=True)
 
     # Загрузка конфигурации
     if test_config is None:
@@ -28,6 +30,16 @@ def create_app(test_config=None):
     except OSError:
         pass
 
+    # Кэш байткода шаблонов; задается до первого обращения к app.jinja_env
+    bytecode_cache_dir = app.config.get('TEMPLATE_BYTECODE_CACHE_DIR')
+    if bytecode_cache_dir:
+        os.makedirs(bytecode_cache_dir, exist_ok=True)
+        app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(bytecode_cache_dir)}
+
+    # Схема БД: при актуальной версии — одно чтение PRAGMA, без миграций и вывода
+    if app.config.get('SCHEMA_BOOTSTRAP', False):
+        ensure_schema(app)
+
     # Регистрация функции закрытия соединения с БД
     app.teardown_appcontext(close_db_connection)
 
@@ -35,10 +47,135 @@ def create_app(test_config=None):
     # Вызывать из терминала: flask init-db
     @app.cli.command('init-db')
     def init_db_cli_command():
-        """Очищает существующие данные и создает новые таблицы."""
+        """Создает таблицы и применяет к БД недостающие миграции схемы."""
         init_db_command(app)
         # print('Initialized the database.') # Сообщение уже есть в init_db_command
 
+    # Компиляция всех шаблонов в кэш байткода (при выкладке, до запуска воркеров)
+    # Вызывать из терминала: flask compile-templates
+    @app.cli.command('compile-templates')
+    def compile_templates_cli_command():
+        """Компилирует все шаблоны и сохраняет байткод в TEMPLATE_BYTECODE_CACHE_DIR."""
+        if app.jinja_env.bytecode_cache is None:
+            raise click.UsageError('Кэш байткода шаблонов выключен (TEMPLATE_BYTECODE_CACHE_DIR = None).')
+        template_names = app.jinja_env.list_templates()
+        for template_name in template_names:
+            app.jinja_env.get_template(template_name)
+        click.echo(f"Скомпилировано шаблонов: {len(template_names)}")
+
+    # Массовая выгрузка тестов в файл
+    # Вызывать из терминала: flask export-tests --variants 30 --questions 20 -o class.zip
+    # или: flask export-tests --ids 1-30 --format docx -o class.docx
+    @app.cli.command('export-tests')
+    @click.option('--ids', 'raw_ids', default='', help='ID тестов: "1,2,5-8".')
+    @click.option('--variants', default=0, type=int, help='Сгенерировать столько новых вариантов.')
+    @click.option('--questions', default=0, type=int, help='Вопросов в каждом новом варианте.')
+    @click.option('--format', 'export_format', type=click.Choice(['zip', 'docx']), default='zip')
+    @click.option('-o', '--output', required=True, type=click.Path(dir_okay=False, writable=True))
+    def export_tests_cli_command(raw_ids, variants, questions, export_format, output):
+        """Выгружает комплект тестов в ZIP-архив или один DOCX-документ."""
+        from EngLes.test_generator_app.routes.quiz_routes import parse_test_ids
+        from EngLes.test_generator_app.services import quiz_service, export_service
+
+        if raw_ids:
+            try:
+                test_ids = parse_test_ids(raw_ids)
+            except ValueError:
+                raise click.BadParameter(f'некорректный список ID тестов: {raw_ids}', param_hint="'--ids'")
+        else:
+            if variants <= 0 or questions <= 0:
+                raise click.UsageError('Укажите --ids или --variants и --questions.')
+            test_ids = quiz_service.generate_test_variants(variants, questions)
+            click.echo(f"Сгенерировано вариантов: {len(test_ids)}")
+
+        if export_format == 'docx':
+            chunks = export_service.stream_tests_merged_docx(test_ids)
+        else:
+            chunks = export_service.stream_tests_zip(test_ids)
+        with open(output, 'wb') as output_file:
+            for chunk in chunks:
+                output_file.write(chunk)
+        click.echo(f"Тесты ({len(test_ids)}) выгружены в {output}")
+
+    # Массовый импорт и экспорт банка вопросов
+    # Вызывать из терминала: flask import-questions bank.jsonl
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'file_format', type=click.Choice(['auto', 'csv', 'jsonl']), default='auto')
+    @click.option('--batch-size', default=None, type=int, help='Вопросов в одной транзакции.')
+    def import_questions_cli_command(path, file_format, batch_size):
+        """Импортирует вопросы из файла CSV или JSON Lines."""
+        from EngLes.test_generator_app.services import question_transfer_service
+
+        if file_format == 'auto':
+            file_format = question_transfer_service.detect_format(path)
+
+        def show_progress(report):
+            click.echo(f"Обработано: {report['processed']}, импортировано: {report['imported']}, "
+                       f"отклонено: {report['rejected']}")
+
+        with open(path, encoding='utf-8-sig', newline='') as input_file:
+            report = question_transfer_service.import_questions(
+                input_file, file_format, batch_size=batch_size or config.IMPORT_BATCH_SIZE,
+                progress_callback=show_progress)
+        for line_no, reason in report['rejects']:
+            click.echo(f"Строка {line_no}: {reason}", err=True)
+        show_progress(report)
+
+    # Вызывать из терминала: flask export-questions -o bank.csv
+    @app.cli.command('export-questions')
+    @click.option('-o', '--output', required=True, type=click.Path(dir_okay=False, writable=True))
+    @click.option('--format', 'file_format', type=click.Choice(['auto', 'csv', 'jsonl']), default='auto')
+    def export_questions_cli_command(output, file_format):
+        """Выгружает все вопросы в файл CSV или JSON Lines."""
+        from EngLes.test_generator_app.services import question_transfer_service
+
+        if file_format == 'auto':
+            file_format = question_transfer_service.detect_format(output)
+        with open(output, 'w', encoding='utf-8', newline='') as output_file:
+            for chunk in question_transfer_service.export_questions(file_format):
+                output_file.write(chunk)
+        click.echo(f"Вопросы выгружены в {output}")
+
+    # Перепроверка прошлых попыток после исправления ключа ответов
+    # Вызывать из терминала: flask regrade-attempts --questions 12,15 или flask regrade-attempts --all
+    @app.cli.command('regrade-attempts')
+    @click.option('--questions', 'raw_ids', default='', help='ID вопросов: "1,2,5-8".')
+    @click.option('--all', 'all_questions', is_flag=True, help='Все вопросы, на которые есть ответы.')
+    @click.option('--chunk-size', default=None, type=int, help='Ответов попыток в одной порции.')
+    def regrade_attempts_cli_command(raw_ids, all_questions, chunk_size):
+        """Перепроверяет сохраненные попытки по текущему ключу ответов."""
+        from EngLes.test_generator_app.routes.quiz_routes import parse_id_ranges
+        from EngLes.test_generator_app.services import regrade_service
+
+        if all_questions:
+            question_ids = list(regrade_service.iter_all_question_ids())
+        elif raw_ids:
+            try:
+                # Тот же формат списка, что и у тестов; диапазоны ограничиваются существующими вопросами
+                id_ranges = parse_id_ranges(raw_ids)
+            except ValueError:
+                raise click.BadParameter(f'некорректный список ID вопросов: {raw_ids}',
+                                         param_hint="'--questions'")
+            question_ids = list(regrade_service.iter_question_ids_in_ranges(id_ranges))
+        else:
+            raise click.UsageError('Укажите --questions или --all.')
+
+        def show_progress(report):
+            click.echo(f"Вопросов: {report['questions']}/{len(question_ids)}, "
+                       f"проверено ответов: {report['answers_checked']}, исправлено: {report['answers_changed']}, "
+                       f"пересчитано попыток: {report['attempts_rescored']}")
+
+        report = regrade_service.regrade_questions(question_ids, chunk_size=chunk_size or config.REGRADE_CHUNK_SIZE,
+                                                   progress_callback=show_progress)
+        click.echo(f"Обновлен ключ в тестах: {report['tests_refreshed']}; "
+                   f"ответов с устаревшими ID (не проверены): {report['answers_stale']}")
+
+    # Инструментирование: время ответа, SQL-запросы, /metrics (при выключенном — без накладных расходов)
+    if app.config.get('METRICS_ENABLED', False):
+        from EngLes.test_generator_app.services import metrics_service
+        metrics_service.init_app(app)
+
     # Передача текущего года в шаблоны через g
     @app.before_request
     def before_request():
@@ -47,7 +184,7 @@ def create_app(test_config=None):
     # --- Регистрация Blueprints ---
     # Blueprints будут импортированы и зарегистрированы здесь
     # Пример:
-    from EngLes.test_generator_app.routes import admin_routes_bp, quiz_routes_bp  # Создадим эти файлы далее
+    from EngLes.test_generator_app.routes import admin_routes_bp, quiz_routes_bp
     app.register_blueprint(admin_routes_bp, url_prefix='/admin')  # Маршруты админки будут /admin/...
     app.register_blueprint(quiz_routes_bp)  # Маршруты тестов будут корневыми /...
 
@@ -7,9 +7,70 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DATABASE_NAME = 'quiz_database.db'
 DATABASE_PATH = os.path.join(BASE_DIR, 'database', DATABASE_NAME)  # Путь к БД внутри папки database
 
+# Шаблоны и статические файлы лежат в корне проекта, рядом с пакетом приложения
+TEMPLATES_DIR = os.path.join(os.path.dirname(BASE_DIR), 'templates')
+STATIC_DIR = os.path.join(os.path.dirname(BASE_DIR), 'static')
+
+# Кэш байткода скомпилированных шаблонов Jinja: новый воркер не компилирует шаблоны заново.
+# Заполнить заранее (при выкладке): flask compile-templates. None — без кэша
+TEMPLATE_BYTECODE_CACHE_DIR = os.path.join(BASE_DIR, 'template_cache')
+
+# Проверять схему БД при создании приложения: одно чтение PRAGMA user_version, миграции
+# применяются, только если база новая или устарела (flask init-db перед запуском не обязателен)
+SCHEMA_BOOTSTRAP = True
+
 # Секретный ключ для Flask сессий и flash сообщений
 # ВАЖНО: Замените этот ключ на свой собственный, случайный и сложный!
 SECRET_KEY = 'your_very_secret_and_unique_key_for_this_project_change_it_now'
 
 # Режим отладки (True для разработки, False для продакшена)
-DEBUG = True
\ No newline at end of file
+DEBUG = True
+
+# Пул соединений с SQLite (общий для процесса)
+DB_POOL_SIZE = 8  # Максимальное число простаивающих соединений, хранимых в пуле
+DB_POOL_IDLE_TIMEOUT = 300  # Через сколько секунд простоя соединение закрывается
+DB_BUSY_TIMEOUT = 5.0  # Сколько секунд ждать снятия блокировки записи другим соединением
+
+# PRAGMA, применяемые к каждому новому соединению
+SQLITE_JOURNAL_MODE = 'WAL'  # Читатели не блокируются, пока писатель фиксирует изменения
+SQLITE_SYNCHRONOUS = 'NORMAL'  # В режиме WAL безопасно и заметно быстрее FULL
+SQLITE_CACHE_SIZE_KB = 16384  # Размер страничного кэша на соединение (КБ)
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # Объем файла БД, читаемый через mmap (байт)
+
+# Кэш сгенерированных DOCX-файлов тестов
+EXPORT_CACHE_DIR = os.path.join(BASE_DIR, 'export_cache')
+EXPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024  # При превышении удаляются давно не запрашивавшиеся файлы
+EXPORT_WORKERS = min(4, os.cpu_count() or 1)  # Процессов для формирования DOCX при массовой выгрузке
+MAX_BULK_EXPORT_TESTS = 500  # Максимум вариантов в одной массовой выгрузке
+
+# Массовый импорт/экспорт вопросов (CSV, JSON Lines)
+IMPORT_BATCH_SIZE = 1000  # Вопросов в одной транзакции при импорте
+
+# Кэш вопросов и составов тестов в памяти процесса (число записей)
+QUESTION_CACHE_SIZE = 5000
+TEST_CACHE_SIZE = 2000
+
+# Отложенная запись попыток (services/attempt_writer.py): попытка пишется в журнал на диске,
+# а в БД ее сохраняет отдельный поток пачками; при False попытка пишется в БД прямо в запросе
+ATTEMPT_WRITE_BEHIND = True
+ATTEMPT_JOURNAL_DIR = os.path.join(BASE_DIR, 'database', 'attempt_journal')
+ATTEMPT_JOURNAL_FSYNC = True  # fsync журнала до ответа ученику (без него попытка может потеряться при сбое ОС)
+ATTEMPT_QUEUE_SIZE = 10000  # Принятых, но еще не сохраненных в БД попыток на процесс
+ATTEMPT_QUEUE_TIMEOUT = 2.0  # Сколько секунд ждать места в заполненной очереди, затем отказ
+ATTEMPT_WRITER_BATCH_SIZE = 500  # Попыток в одной транзакции
+
+# Самопроверка (services/practice_service.py): срок действия подписанного ключа ответов,
+# который получает страница теста в режиме practice (секунд)
+PRACTICE_KEY_MAX_AGE = 6 * 60 * 60
+
+# Перепроверка попыток после изменения ключа ответов (services/regrade_service.py)
+REGRADE_CHUNK_SIZE = 50000  # Ответов попыток в одной порции (чтение, сравнение и запись)
+
+# Инструментирование (services/metrics_service.py): время ответа по маршрутам, SQL-запросы,
+# журнал медленных запросов и страница /metrics в текстовом формате Prometheus.
+# При False не подключается вовсе: запросы к БД выполняются без замеров
+METRICS_ENABLED = False
+METRICS_ALLOW_REMOTE = False  # /metrics доступен только с localhost
+SLOW_QUERY_MS = 100  # SQL-запросы дольше этого (мс) пишутся в журнал медленных запросов; 0 — не писать
+SLOW_QUERY_LOG_PATH = None  # Файл журнала медленных запросов; None — вывод в консоль
+MAX_QUERIES_PER_REQUEST = 50  # Предупреждать, если HTTP-запрос выполнил больше SQL-запросов (N+1); 0 — нет
\ No newline at end of file
@@ -1,34 +1,124 @@
 import sqlite3
 import os
+import threading
+import time
+from contextlib import contextmanager
 from flask import g  # Используем g для хранения соединения в контексте запроса
 from ..config import DATABASE_PATH  # Импортируем путь к БД из config.py
+from .migrations import apply_migrations, get_schema_version, SCHEMA_VERSION
+from ..config import (DB_POOL_SIZE, DB_POOL_IDLE_TIMEOUT, DB_BUSY_TIMEOUT, SQLITE_JOURNAL_MODE,
+                      SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE)
+
+
+class ConnectionPool:
+    """
+    Пул соединений с SQLite, общий для всех потоков процесса.
+    Соединение настраивается (PRAGMA) один раз при создании и затем
+    переиспользуется между запросами. В пуле хранится не более max_idle
+    простаивающих соединений; соединения, простоявшие дольше idle_timeout
+    секунд, закрываются.
+    """
+
+    def __init__(self, database_path, max_idle=DB_POOL_SIZE, idle_timeout=DB_POOL_IDLE_TIMEOUT):
+        self.database_path = database_path
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle = []  # [(соединение, время возврата в пул)], последние возвращенные — в конце
+        self._lock = threading.Lock()
+        # Убедимся, что директория database существует (один раз на пул, а не на каждый запрос)
+        db_dir = os.path.dirname(database_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database_path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Позволяет обращаться к колонкам по именам
+        conn.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        conn.execute("PRAGMA foreign_keys = ON")  # Иначе ON DELETE CASCADE в схеме не срабатывает
+        conn.execute(f"PRAGMA cache_size = {-int(SQLITE_CACHE_SIZE_KB)}")  # Отрицательное значение — в КБ
+        conn.execute(f"PRAGMA mmap_size = {int(SQLITE_MMAP_SIZE)}")
+        return conn
+
+    def acquire(self):
+        """Выдает соединение из пула или открывает новое."""
+        now = time.monotonic()
+        expired = []
+        conn = None
+        with self._lock:
+            while self._idle:
+                candidate, released_at = self._idle.pop()
+                if now - released_at > self.idle_timeout:
+                    expired.append(candidate)
+                else:
+                    conn = candidate
+                    break
+        for stale in expired:
+            stale.close()
+        return conn if conn is not None else self._connect()
+
+    def release(self, conn):
+        """Возвращает соединение в пул (незафиксированные изменения откатываются)."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def close_all(self):
+        """Закрывает все простаивающие соединения."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """
+    Возвращает пул соединений текущего процесса.
+    После fork (несколько воркеров) каждый процесс создает собственный пул.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(DATABASE_PATH)
+                _pool_pid = pid
+    return _pool
 
 
 def get_db_connection():
     """
-    Устанавливает соединение с базой данных SQLite.
+    Выдает соединение с базой данных SQLite из пула.
     Соединение хранится в g для повторного использования в рамках одного запроса.
     """
     db = getattr(g, '_database', None)
     if db is None:
-        # Убедимся, что директория database существует
-        db_dir = os.path.dirname(DATABASE_PATH)
-        if not os.path.exists(db_dir):
-            os.makedirs(db_dir)
-        db = g._database = sqlite3.connect(DATABASE_PATH)
-        db.row_factory = sqlite3.Row  # Позволяет обращаться к колонкам по именам
+        db = g._database = get_connection_pool().acquire()
     return db
 
 
 def close_db_connection(exception=None):
-    """Закрывает соединение с базой данных, если оно было открыто."""
-    db = getattr(g, '_database', None)
+    """Возвращает соединение с базой данных в пул, если оно было открыто."""
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        get_connection_pool().release(db)
 
 
 def init_db_command(app):
-    """Команда для инициализации БД (создания таблиц)."""
+    """Команда для инициализации БД (создания таблиц и применения миграций)."""
     with app.app_context():  # Нужен контекст приложения для g
         conn = get_db_connection()
         create_tables(conn)
@@ -36,91 +126,143 @@ def init_db_command(app):
         print("База данных инициализирована и таблицы созданы/проверены.")
 
 
-def create_tables(conn):
-    """ Создает таблицы в базе данных, если они еще не существуют """
-    sql_create_questions_table = """
-    CREATE TABLE IF NOT EXISTS questions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        question_text TEXT NOT NULL,
-        topic TEXT
-    );
-    """
-
-    sql_create_answers_table = """
-    CREATE TABLE IF NOT EXISTS answers (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        question_id INTEGER NOT NULL,
-        answer_text TEXT NOT NULL,
-        is_correct INTEGER NOT NULL DEFAULT 0, -- 0 for false, 1 for true
-        FOREIGN KEY (question_id) REFERENCES questions (id) ON DELETE CASCADE
-    );
-    """
-
-    sql_create_generated_tests_table = """
-    CREATE TABLE IF NOT EXISTS generated_tests (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        num_questions INTEGER NOT NULL,
-        creation_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    );
-    """
-
-    sql_create_test_questions_link_table = """
-    CREATE TABLE IF NOT EXISTS test_questions (
-        test_id INTEGER NOT NULL,
-        question_id INTEGER NOT NULL,
-        PRIMARY KEY (test_id, question_id),
-        FOREIGN KEY (test_id) REFERENCES generated_tests (id) ON DELETE CASCADE,
-        FOREIGN KEY (question_id) REFERENCES questions (id) ON DELETE CASCADE
-    );
-    """
-
-    sql_create_user_attempts_table = """
-    CREATE TABLE IF NOT EXISTS user_attempts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        test_instance_id INTEGER NOT NULL,
-        score INTEGER,
-        total_questions_in_test INTEGER,
-        attempt_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (test_instance_id) REFERENCES generated_tests (id) ON DELETE CASCADE
-    );
+def ensure_schema(app):
+    """
+    Приводит схему БД к актуальной версии при создании приложения (config.SCHEMA_BOOTSTRAP).
+    Обычно схема уже актуальна, и это одно чтение PRAGMA user_version без вывода в консоль;
+    миграции применяются, только если база новая или устарела.
     """
+    with app.app_context():
+        conn = get_db_connection()
+        try:
+            if get_schema_version(conn) < SCHEMA_VERSION:
+                create_tables(conn)
+        finally:
+            close_db_connection()
+
 
+def create_tables(conn):
+    """ Создает таблицы в базе данных и обновляет схему до актуальной версии (см. models/migrations.py) """
     try:
-        cursor = conn.cursor()
         print(f"Подключено к БД: {DATABASE_PATH}")
-        print("Создание таблицы 'questions'...")
-        cursor.execute(sql_create_questions_table)
-        print("Создание таблицы 'answers'...")
-        cursor.execute(sql_create_answers_table)
-        print("Создание таблицы 'generated_tests'...")
-        cursor.execute(sql_create_generated_tests_table)
-        print("Создание таблицы 'test_questions'...")
-        cursor.execute(sql_create_test_questions_link_table)
-        print("Создание таблицы 'user_attempts'...")
-        cursor.execute(sql_create_user_attempts_table)
-        conn.commit()
-        print("Таблицы успешно созданы или уже существуют.")
+        old_version, new_version = apply_migrations(conn)
+        if old_version == new_version:
+            print(f"Схема БД актуальна (версия {new_version}).")
+        else:
+            print(f"Схема БД обновлена с версии {old_version} до версии {new_version}.")
     except sqlite3.Error as e:
         print(f"Ошибка при создании таблиц: {e}")
         conn.rollback()  # Откатываем изменения в случае ошибки
     # Соединение будет закрыто через close_db_connection в app.py или init_db_command
 
 
+# Наблюдатель за SQL-запросами: observer(query, args, seconds, many) вызывается после каждого
+# query_db/execute_db/executemany_db (см. services/metrics_service.py); для executemany_db
+# вместо args передается число затронутых строк. None — инструментирование
+# выключено, и запросы выполняются без замеров времени.
+_query_observer = None
+
+
+def set_query_observer(observer):
+    """Устанавливает (или снимает, observer=None) наблюдателя за SQL-запросами процесса."""
+    global _query_observer
+    _query_observer = observer
+
+
 # Функции для непосредственного выполнения запросов (можно вынести в отдельный CRUD модуль, если их станет много)
-def query_db(query, args=(), one=False):
-    """Выполняет SQL-запрос и возвращает результат."""
-    cur = get_db_connection().execute(query, args)
+def query_db(query, args=(), one=False, row_factory=None):
+    """
+    Выполняет SQL-запрос и возвращает результат.
+    row_factory(cursor, row) — фабрика строк вместо sqlite3.Row (например, Question.row_factory
+    из models/question.py): объекты модели создаются сразу, без промежуточных строк.
+    """
+    observer = _query_observer
+    if observer is not None:
+        started = time.perf_counter()
+    cur = get_db_connection().cursor()
+    if row_factory is not None:
+        cur.row_factory = row_factory
+    cur.execute(query, args)
     rv = cur.fetchall()
     cur.close()
+    if observer is not None:
+        observer(query, args, time.perf_counter() - started, False)
     return (rv[0] if rv else None) if one else rv
 
 
 def execute_db(query, args=()):
-    """Выполняет SQL-запрос (INSERT, UPDATE, DELETE) и коммитит изменения."""
+    """
+    Выполняет SQL-запрос (INSERT, UPDATE, DELETE) и коммитит изменения.
+    Внутри блока transaction() коммит откладывается до конца блока.
+    """
+    observer = _query_observer
+    if observer is not None:
+        started = time.perf_counter()
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(query, args)
     last_id = cursor.lastrowid
-    conn.commit()
+    if not in_transaction():
+        conn.commit()
+    cursor.close()
+    if observer is not None:
+        observer(query, args, time.perf_counter() - started, False)
+    return last_id  # Возвращаем ID последней вставленной строки, если применимо
+
+
+def executemany_db(query, seq_of_args):
+    """
+    Выполняет один SQL-запрос для набора параметров (пакетная вставка/обновление).
+    Возвращает количество затронутых строк.
+    Внутри блока transaction() коммит откладывается до конца блока.
+    """
+    observer = _query_observer
+    if observer is not None:
+        started = time.perf_counter()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.executemany(query, seq_of_args)
+    row_count = cursor.rowcount
+    if not in_transaction():
+        conn.commit()
     cursor.close()
-    return last_id  # Возвращаем ID последней вставленной строки, если применимо
\ No newline at end of file
+    if observer is not None:
+        observer(query, row_count, time.perf_counter() - started, True)
+    return row_count
+
+
+def in_transaction():
+    """Возвращает True, если текущий запрос выполняется внутри блока transaction()."""
+    return getattr(g, '_transaction_depth', 0) > 0
+
+
+@contextmanager
+def transaction(immediate=False):
+    """
+    Единица работы: все изменения, сделанные через execute_db/executemany_db
+    внутри блока, фиксируются одним коммитом или целиком откатываются при ошибке.
+    Вложенные блоки присоединяются к внешней транзакции.
+    immediate=True сразу захватывает блокировку записи (BEGIN IMMEDIATE), чтобы
+    прочитанные в блоке данные не изменились другим соединением или процессом
+    до коммита; учитывается только для внешнего блока.
+
+    Пример:
+        with transaction():
+            test_id = execute_db("INSERT INTO generated_tests ...", (...))
+            executemany_db("INSERT INTO test_questions ...", rows)
+    """
+    conn = get_db_connection()
+    depth = getattr(g, '_transaction_depth', 0)
+    if depth == 0 and immediate and not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    g._transaction_depth = depth + 1
+    try:
+        yield conn
+        if depth == 0:
+            conn.commit()
+    except Exception:
+        if depth == 0:
+            conn.rollback()
+        raise
+    finally:
+        g._transaction_depth = depth
@@ -0,0 +1,537 @@
+"""
+Версионированные миграции схемы БД.
+
+Текущая версия схемы хранится в PRAGMA user_version. Команда `flask init-db`
+применяет все миграции с номером больше текущей версии — по одной транзакции
+на миграцию, — поэтому рабочую базу можно обновлять на месте, без выгрузки и
+повторной загрузки данных. Новая миграция добавляется в конец списка MIGRATIONS.
+"""
+
+
+def _migration_base_schema(cursor):
+    """Базовые таблицы: вопросы, ответы, сгенерированные тесты и попытки."""
+    # IF NOT EXISTS: базы, созданные до появления миграций, имеют user_version = 0,
+    # но таблицы в них уже есть
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question_text TEXT NOT NULL,
+        topic TEXT
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS answers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question_id INTEGER NOT NULL,
+        answer_text TEXT NOT NULL,
+        is_correct INTEGER NOT NULL DEFAULT 0, -- 0 for false, 1 for true
+        FOREIGN KEY (question_id) REFERENCES questions (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS generated_tests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        num_questions INTEGER NOT NULL,
+        creation_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS test_questions (
+        test_id INTEGER NOT NULL,
+        question_id INTEGER NOT NULL,
+        PRIMARY KEY (test_id, question_id),
+        FOREIGN KEY (test_id) REFERENCES generated_tests (id) ON DELETE CASCADE,
+        FOREIGN KEY (question_id) REFERENCES questions (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS user_attempts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        test_instance_id INTEGER NOT NULL,
+        score INTEGER,
+        total_questions_in_test INTEGER,
+        attempt_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (test_instance_id) REFERENCES generated_tests (id) ON DELETE CASCADE
+    );
+    """)
+
+
+# Добавление вопроса в конец списка его темы (при NEW.topic IS NULL ничего не делает)
+SQL_TOPIC_ADD_STATEMENTS = """
+    INSERT OR IGNORE INTO topic_stats (topic, question_count) SELECT NEW.topic, 0 WHERE NEW.topic IS NOT NULL;
+    INSERT INTO topic_question_ids (topic, position, question_id)
+        SELECT NEW.topic, question_count, NEW.id FROM topic_stats WHERE topic = NEW.topic;
+    UPDATE topic_stats SET question_count = question_count + 1 WHERE topic = NEW.topic;
+"""
+
+# Удаление вопроса из темы (при OLD.topic IS NULL ничего не делает): последний вопрос темы
+# переносится на освободившуюся позицию. Позиция удаляемой строки временно делается
+# отрицательной, чтобы не нарушить PRIMARY KEY.
+SQL_TOPIC_REMOVE_STATEMENTS = """
+    UPDATE topic_question_ids SET position = -1 - position WHERE question_id = OLD.id;
+    UPDATE topic_question_ids
+        SET position = (SELECT -1 - position FROM topic_question_ids WHERE question_id = OLD.id)
+        WHERE topic = OLD.topic
+          AND position = (SELECT question_count - 1 FROM topic_stats WHERE topic = OLD.topic);
+    DELETE FROM topic_question_ids WHERE question_id = OLD.id;
+    UPDATE topic_stats SET question_count = question_count - 1 WHERE topic = OLD.topic;
+    DELETE FROM topic_stats WHERE topic = OLD.topic AND question_count <= 0;
+"""
+
+
+def _migration_topic_index(cursor):
+    """
+    Индекс questions(topic) и предвычисленный индекс тем: для каждой темы ID вопросов
+    пронумерованы плотно (position = 0..question_count-1), поэтому k случайных вопросов
+    темы выбираются по k случайным позициям без сканирования банка.
+    Таблицы поддерживаются триггерами на questions.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_questions_topic ON questions (topic);")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS topic_stats (
+        topic TEXT PRIMARY KEY NOT NULL,
+        question_count INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS topic_question_ids (
+        topic TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        question_id INTEGER NOT NULL UNIQUE,
+        PRIMARY KEY (topic, position)
+    );
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_topic_insert
+    AFTER INSERT ON questions WHEN NEW.topic IS NOT NULL
+    BEGIN {SQL_TOPIC_ADD_STATEMENTS} END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_topic_delete
+    AFTER DELETE ON questions WHEN OLD.topic IS NOT NULL
+    BEGIN {SQL_TOPIC_REMOVE_STATEMENTS} END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_topic_update
+    AFTER UPDATE OF topic ON questions WHEN OLD.topic IS NOT NEW.topic
+    BEGIN {SQL_TOPIC_REMOVE_STATEMENTS} {SQL_TOPIC_ADD_STATEMENTS} END;
+    """)
+
+    # Заполнение индекса тем для уже существующих вопросов (только если он еще пуст)
+    if cursor.execute("SELECT 1 FROM topic_question_ids LIMIT 1").fetchone() is None:
+        cursor.execute("""
+        INSERT INTO topic_question_ids (topic, position, question_id)
+        SELECT topic, ROW_NUMBER() OVER (PARTITION BY topic ORDER BY id) - 1, id
+        FROM questions
+        WHERE topic IS NOT NULL;
+        """)
+        cursor.execute("DELETE FROM topic_stats")
+        cursor.execute("""
+        INSERT INTO topic_stats (topic, question_count)
+        SELECT topic, COUNT(*) FROM topic_question_ids GROUP BY topic;
+        """)
+
+
+def _migration_foreign_key_indexes(cursor):
+    """
+    Индексы для горячих выборок по внешним ключам (без них каждая выборка ответов,
+    каждое каскадное удаление и поиск попыток — полный просмотр таблицы).
+    Индекс answers(question_id, is_correct, id) покрывающий: ключ ответов теста
+    строится по нему без обращения к самой таблице answers.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_answers_question_correct "
+                   "ON answers (question_id, is_correct, id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_test_questions_question ON test_questions (question_id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_attempts_test ON user_attempts (test_instance_id);")
+
+
+def _migration_free_question_ids(cursor):
+    """
+    Список свободных ID вопросов для выдачи минимального свободного ID за O(log n)
+    вместо поиска пропусков самосоединением таблицы questions.
+    Триггеры возвращают ID удаленного вопроса в список и забирают из него ID вставленного.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS free_question_ids (
+        id INTEGER PRIMARY KEY
+    );
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_free_id_release
+    AFTER DELETE ON questions
+    BEGIN
+        INSERT OR IGNORE INTO free_question_ids (id) VALUES (OLD.id);
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_free_id_claim
+    AFTER INSERT ON questions
+    BEGIN
+        DELETE FROM free_question_ids WHERE id = NEW.id;
+    END;
+    """)
+
+    # Заполнение списка пропусками, которые уже есть в таблице questions (включая 1..MIN(id)-1)
+    cursor.execute("""
+    WITH RECURSIVE
+        gaps (gap_start, gap_end) AS (
+            SELECT prev_id + 1, id - 1
+            FROM (SELECT id, COALESCE(LAG(id) OVER (ORDER BY id), 0) AS prev_id FROM questions)
+            WHERE id - prev_id > 1
+        ),
+        free_ids (id, gap_end) AS (
+            SELECT gap_start, gap_end FROM gaps
+            UNION ALL
+            SELECT id + 1, gap_end FROM free_ids WHERE id < gap_end
+        )
+    INSERT OR IGNORE INTO free_question_ids (id) SELECT id FROM free_ids;
+    """)
+
+
+def _migration_question_listing(cursor):
+    """
+    Поддержка постраничного списка вопросов в админке:
+    - индекс по question_text без учета регистра для поиска по префиксу;
+    - счетчик вопросов question_stats, поддерживаемый триггерами, чтобы общее
+      количество не считалось через COUNT(*) по всей таблице.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_questions_text_nocase "
+                   "ON questions (question_text COLLATE NOCASE);")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS question_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        question_count INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_count_insert
+    AFTER INSERT ON questions
+    BEGIN
+        UPDATE question_stats SET question_count = question_count + 1 WHERE id = 1;
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_count_delete
+    AFTER DELETE ON questions
+    BEGIN
+        UPDATE question_stats SET question_count = question_count - 1 WHERE id = 1;
+    END;
+    """)
+    cursor.execute("INSERT OR REPLACE INTO question_stats (id, question_count) "
+                   "SELECT 1, COUNT(*) FROM questions;")
+
+
+# Пересборка текста ответов вопроса в полнотекстовом индексе
+SQL_FTS_REFRESH_ANSWERS = """
+    UPDATE questions_fts
+    SET answers_text = COALESCE((SELECT group_concat(answer_text, ' ') FROM answers
+                                 WHERE question_id = {ref}.question_id), '')
+    WHERE rowid = {ref}.question_id;
+"""
+
+
+def _migration_full_text_search(cursor):
+    """
+    Полнотекстовый индекс FTS5 по тексту вопроса, теме и текстам ответов
+    (rowid = id вопроса). Поддерживается триггерами на questions и answers.
+    """
+    cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5 (
+        question_text, topic, answers_text,
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_fts_insert
+    AFTER INSERT ON questions
+    BEGIN
+        INSERT INTO questions_fts (rowid, question_text, topic, answers_text)
+        VALUES (NEW.id, NEW.question_text, COALESCE(NEW.topic, ''), '');
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_fts_update
+    AFTER UPDATE OF question_text, topic ON questions
+    BEGIN
+        UPDATE questions_fts SET question_text = NEW.question_text, topic = COALESCE(NEW.topic, '')
+        WHERE rowid = NEW.id;
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_fts_delete
+    AFTER DELETE ON questions
+    BEGIN
+        DELETE FROM questions_fts WHERE rowid = OLD.id;
+    END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_answers_fts_insert
+    AFTER INSERT ON answers
+    BEGIN {SQL_FTS_REFRESH_ANSWERS.format(ref='NEW')} END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_answers_fts_update
+    AFTER UPDATE OF answer_text, question_id ON answers
+    BEGIN {SQL_FTS_REFRESH_ANSWERS.format(ref='OLD')} {SQL_FTS_REFRESH_ANSWERS.format(ref='NEW')} END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_answers_fts_delete
+    AFTER DELETE ON answers
+    BEGIN {SQL_FTS_REFRESH_ANSWERS.format(ref='OLD')} END;
+    """)
+
+    # Индексация уже существующих вопросов
+    cursor.execute("DELETE FROM questions_fts;")
+    cursor.execute("""
+    INSERT INTO questions_fts (rowid, question_text, topic, answers_text)
+    SELECT q.id, q.question_text, COALESCE(q.topic, ''),
+           COALESCE((SELECT group_concat(a.answer_text, ' ') FROM answers a WHERE a.question_id = q.id), '')
+    FROM questions q;
+    """)
+
+
+def _migration_cache_generation(cursor):
+    """
+    Счетчик поколений для кэшей вопросов в памяти процессов: увеличивается триггерами
+    при изменении или удалении вопросов и ответов. Процесс, увидевший новое значение,
+    очищает свои кэши. Вставка новых вопросов кэши не затрагивает и счетчик не меняет.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS cache_generation (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        generation INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    cursor.execute("INSERT OR IGNORE INTO cache_generation (id, generation) VALUES (1, 0);")
+    for table, event in (('questions', 'UPDATE'), ('questions', 'DELETE'),
+                         ('answers', 'UPDATE'), ('answers', 'DELETE')):
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_cache_generation_{event.lower()}
+        AFTER {event} ON {table}
+        BEGIN
+            UPDATE cache_generation SET generation = generation + 1 WHERE id = 1;
+        END;
+        """)
+
+
+def _migration_frozen_test_content(cursor):
+    """
+    Замороженное содержимое теста в generated_tests: порядок вопросов, порядок ответов
+    и ключ ответов упаковываются при генерации, поэтому показ теста — одно чтение по
+    первичному ключу. Для старых тестов заполняется при первом обращении.
+    """
+    cursor.execute("ALTER TABLE generated_tests ADD COLUMN frozen_content BLOB;")
+
+
+def _migration_attempt_submission_id(cursor):
+    """
+    Идентификатор отправки попытки (submission_id) для отложенной записи попыток:
+    по нему повторная запись из журнала (services/attempt_writer.py) не создает дубликатов.
+    """
+    cursor.execute("ALTER TABLE user_attempts ADD COLUMN submission_id TEXT;")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_user_attempts_submission ON user_attempts (submission_id);")
+
+
+# Учет ответа попытки в сводной статистике вопроса и его вариантов ответа ({ref} — NEW или OLD)
+SQL_ATTEMPT_STATS_ADD = """
+    INSERT INTO question_attempt_stats
+        (question_id, attempts, correct, sum_score, sum_score_sq, sum_score_correct)
+    VALUES ({ref}.question_id, 1, {ref}.is_correct, {ref}.attempt_score,
+            {ref}.attempt_score * {ref}.attempt_score, {ref}.is_correct * {ref}.attempt_score)
+    ON CONFLICT (question_id) DO UPDATE SET
+        attempts = attempts + 1,
+        correct = correct + excluded.correct,
+        sum_score = sum_score + excluded.sum_score,
+        sum_score_sq = sum_score_sq + excluded.sum_score_sq,
+        sum_score_correct = sum_score_correct + excluded.sum_score_correct;
+    INSERT INTO answer_selection_stats (answer_id, question_id, selections)
+    SELECT id, question_id, 1 FROM answers WHERE id = {ref}.answer_id AND question_id = {ref}.question_id
+    ON CONFLICT (answer_id) DO UPDATE SET selections = selections + 1;
+"""
+
+SQL_ATTEMPT_STATS_REMOVE = """
+    UPDATE question_attempt_stats SET
+        attempts = attempts - 1,
+        correct = correct - {ref}.is_correct,
+        sum_score = sum_score - {ref}.attempt_score,
+        sum_score_sq = sum_score_sq - {ref}.attempt_score * {ref}.attempt_score,
+        sum_score_correct = sum_score_correct - {ref}.is_correct * {ref}.attempt_score
+    WHERE question_id = {ref}.question_id;
+    UPDATE answer_selection_stats SET selections = selections - 1 WHERE answer_id = {ref}.answer_id;
+"""
+
+
+def _migration_attempt_analytics(cursor):
+    """
+    Ответы попыток по вопросам (attempt_answers) и сводная статистика, которую
+    триггеры обновляют при каждой записи ответа, без пересчета по всем попыткам:
+    - question_attempt_stats: число ответов, число правильных и суммы доли правильных
+      ответов попытки (x, x^2 и x у ответивших верно) — из них считаются доля
+      правильных ответов и точечно-бисериальная корреляция вопроса с результатом теста;
+    - answer_selection_stats: сколько раз выбирали каждый вариант ответа (дистракторы).
+    attempt_score — доля правильных ответов всей попытки (score / total_questions_in_test).
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS attempt_answers (
+        attempt_id INTEGER NOT NULL,
+        question_id INTEGER NOT NULL,
+        answer_id INTEGER,
+        is_correct INTEGER NOT NULL,
+        attempt_score REAL NOT NULL,
+        PRIMARY KEY (attempt_id, question_id),
+        FOREIGN KEY (attempt_id) REFERENCES user_attempts (id) ON DELETE CASCADE,
+        FOREIGN KEY (question_id) REFERENCES questions (id) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attempt_answers_question "
+                   "ON attempt_answers (question_id, answer_id);")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS question_attempt_stats (
+        question_id INTEGER PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0,
+        sum_score REAL NOT NULL DEFAULT 0,
+        sum_score_sq REAL NOT NULL DEFAULT 0,
+        sum_score_correct REAL NOT NULL DEFAULT 0,
+        FOREIGN KEY (question_id) REFERENCES questions (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS answer_selection_stats (
+        answer_id INTEGER PRIMARY KEY,
+        question_id INTEGER NOT NULL,
+        selections INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (answer_id) REFERENCES answers (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_answer_selection_stats_question "
+                   "ON answer_selection_stats (question_id);")
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_attempt_answers_stats_insert
+    AFTER INSERT ON attempt_answers
+    BEGIN
+        {SQL_ATTEMPT_STATS_ADD.format(ref='NEW')}
+    END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_attempt_answers_stats_delete
+    AFTER DELETE ON attempt_answers
+    BEGIN
+        {SQL_ATTEMPT_STATS_REMOVE.format(ref='OLD')}
+    END;
+    """)
+    # Перепроверка попыток меняет is_correct и attempt_score: вычитаем старый вклад, добавляем новый
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_attempt_answers_stats_update
+    AFTER UPDATE OF question_id, answer_id, is_correct, attempt_score ON attempt_answers
+    BEGIN
+        {SQL_ATTEMPT_STATS_REMOVE.format(ref='OLD')}
+        {SQL_ATTEMPT_STATS_ADD.format(ref='NEW')}
+    END;
+    """)
+
+
+def _migration_test_mode(cursor):
+    """
+    Режим теста: exam — проверка только на сервере после отправки всей формы,
+    practice — самопроверка: страница теста получает подписанный ключ ответов и
+    показывает результат по каждому вопросу сразу (см. services/practice_service.py).
+    """
+    cursor.execute("ALTER TABLE generated_tests ADD COLUMN mode TEXT NOT NULL DEFAULT 'exam' "
+                   "CHECK (mode IN ('exam', 'practice'));")
+
+
+# Ключи сортировки страницы статистики (services/analytics_service.py) по столбцам
+# question_attempt_stats. По ним построены индексы миграции 12; запрос использует те же
+# выражения, поэтому сортировка и LIMIT выполняются по индексу, без чтения всей таблицы.
+SQL_CORRECT_RATE_KEY = "(correct * 1.0 / attempts)"
+# Различающая способность r (точечно-бисериальная корреляция, см. analytics_service.point_biserial)
+# как r * |r|: упорядочена так же, как r, но считается без извлечения корня (в SQLite
+# математические функции есть не всегда). Вопросы, для которых r не определена, получают 2
+# (больше любого r * |r|) и оказываются в конце.
+SQL_DISCRIMINATION_KEY = """(CASE
+    WHEN attempts < 2 OR correct <= 0 OR correct >= attempts
+         OR sum_score_sq / attempts - (sum_score / attempts) * (sum_score / attempts) <= 1e-12 THEN 2.0
+    ELSE (sum_score_correct / correct - (sum_score - sum_score_correct) / (attempts - correct))
+         * abs(sum_score_correct / correct - (sum_score - sum_score_correct) / (attempts - correct))
+         * (correct * 1.0 / attempts) * (1 - correct * 1.0 / attempts)
+         / (sum_score_sq / attempts - (sum_score / attempts) * (sum_score / attempts))
+    END)"""
+
+
+def _migration_statistics_sort_indexes(cursor):
+    """
+    Индексы для сортировки страницы статистики вопросов: по числу ответов, доле правильных
+    и различающей способности. Страница читает только показываемые строки (LIMIT),
+    а не всю question_attempt_stats.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_question_attempt_stats_attempts "
+                   "ON question_attempt_stats (attempts);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_question_attempt_stats_correct_rate "
+                   f"ON question_attempt_stats ({SQL_CORRECT_RATE_KEY});")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_question_attempt_stats_discrimination "
+                   f"ON question_attempt_stats ({SQL_DISCRIMINATION_KEY});")
+
+
+# (версия, описание, функция миграции). Номера идут подряд, начиная с 1.
+MIGRATIONS = [
+    (1, "Базовые таблицы", _migration_base_schema),
+    (2, "Индекс тем вопросов", _migration_topic_index),
+    (3, "Индексы внешних ключей", _migration_foreign_key_indexes),
+    (4, "Список свободных ID вопросов", _migration_free_question_ids),
+    (5, "Постраничный список вопросов", _migration_question_listing),
+    (6, "Полнотекстовый поиск по вопросам", _migration_full_text_search),
+    (7, "Счетчик поколений кэша вопросов", _migration_cache_generation),
+    (8, "Замороженное содержимое тестов", _migration_frozen_test_content),
+    (9, "Идентификатор отправки попытки", _migration_attempt_submission_id),
+    (10, "Статистика ответов по вопросам", _migration_attempt_analytics),
+    (11, "Режим теста (экзамен или самопроверка)", _migration_test_mode),
+    (12, "Индексы сортировки статистики вопросов", _migration_statistics_sort_indexes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Возвращает текущую версию схемы БД (PRAGMA user_version)."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn):
+    """
+    Применяет к БД все еще не примененные миграции.
+    Каждая миграция выполняется в отдельной транзакции вместе с обновлением
+    user_version, так что прерванное обновление можно просто запустить повторно.
+    Транзакция захватывает блокировку записи до проверки версии, поэтому несколько
+    одновременно запускаемых воркеров (см. database_manager.ensure_schema) не применят
+    одну миграцию дважды.
+    Возвращает кортеж (версия до обновления, версия после обновления).
+    """
+    if conn.in_transaction:
+        conn.commit()
+
+    old_version = get_schema_version(conn)
+    for version, description, migration in MIGRATIONS:
+        if version <= old_version:
+            continue
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            if get_schema_version(conn) >= version:
+                conn.rollback()  # Уже применена другим процессом
+                continue
+            print(f"Миграция {version}: {description}...")
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    new_version = get_schema_version(conn)
+    if new_version != old_version:
+        # Обновляем статистику планировщика запросов для новых индексов
+        conn.execute("PRAGMA optimize")
+    return old_version, new_version
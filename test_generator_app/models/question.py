@@ -0,0 +1,51 @@
+# Модели вопроса и варианта ответа. Классы со __slots__ (без __dict__ у каждого объекта)
+# создаются прямо фабрикой строк курсора (query_db(..., row_factory=Question.row_factory)),
+# без промежуточных sqlite3.Row и словарей. Шаблоны обращаются к полям как к атрибутам
+# (question.id, answer.answer_text), так что для них модели не отличаются от словарей.
+
+# Порядок колонок в SELECT для фабрик строк
+QUESTION_COLUMNS = "id, question_text, topic"
+ANSWER_COLUMNS = "id, question_id, answer_text, is_correct"
+
+
+class Question:
+    """Вопрос: id, question_text, topic (или None) и список вариантов ответа answers."""
+
+    __slots__ = ('id', 'question_text', 'topic', 'answers')
+
+    def __init__(self, id, question_text, topic, answers=None):
+        self.id = id
+        self.question_text = question_text
+        self.topic = topic
+        self.answers = answers if answers is not None else []
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """Фабрика строк для запроса SELECT {QUESTION_COLUMNS}."""
+        return cls(row[0], row[1], row[2])
+
+    def __repr__(self):
+        return f"Question(id={self.id!r}, topic={self.topic!r}, answers={len(self.answers)})"
+
+
+class Answer:
+    """
+    Вариант ответа: id, question_id, answer_text, is_correct (0/1).
+    is_correct равно None, когда ключ ответов не должен попасть в шаблон (страница теста, DOCX).
+    """
+
+    __slots__ = ('id', 'question_id', 'answer_text', 'is_correct')
+
+    def __init__(self, id, question_id, answer_text, is_correct=None):
+        self.id = id
+        self.question_id = question_id
+        self.answer_text = answer_text
+        self.is_correct = is_correct
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """Фабрика строк для запроса SELECT {ANSWER_COLUMNS}."""
+        return cls(row[0], row[1], row[2], row[3])
+
+    def __repr__(self):
+        return f"Answer(id={self.id!r}, question_id={self.question_id!r}, is_correct={self.is_correct!r})"
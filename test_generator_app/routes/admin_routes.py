@@ -1,5 +1,7 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from ..services import question_service  # Импортируем наш сервис
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, stream_with_context
+from ..services import question_service, question_transfer_service, analytics_service, regrade_service  # Импортируем наши сервисы
+import io
+import sqlite3
 
 # Создаем Blueprint. 'admin_bp' - имя блюпринта, __name__ - имя модуля, template_folder - если шаблоны для этого блюпринта в отдельной папке
 admin_routes_bp = Blueprint('admin_bp', __name__, template_folder='../templates/admin')
@@ -10,9 +12,35 @@ admin_routes_bp = Blueprint('admin_bp', __name__, template_folder='../templates/
 @admin_routes_bp.route('/')  # Будет доступно по /admin/ (т.к. url_prefix='/admin' в app.py)
 @admin_routes_bp.route('/questions')
 def manage_questions_page():
-    questions = question_service.get_all_questions_with_details()
+    # Keyset-пагинация: ?before=<id> — следующая страница, ?after=<id> — предыдущая
+    before_id = request.args.get('before', type=int)
+    after_id = request.args.get('after', type=int)
+    page_size = request.args.get('page_size', default=question_service.DEFAULT_PAGE_SIZE, type=int)
+    topic = request.args.get('topic', '').strip()
+    prefix = request.args.get('q', '').strip()
+
+    page = question_service.get_questions_page(before_id=before_id, after_id=after_id, page_size=page_size,
+                                               topic=topic or None, prefix=prefix or None)
+    topics = question_service.get_topics_with_counts()
+    if topic:
+        total_questions = next((t['question_count'] for t in topics if t['topic'] == topic), 0)
+    else:
+        total_questions = question_service.count_total_questions()
+
     # Указываем путь к шаблону относительно общей папки templates, если template_folder не настроен идеально
-    return render_template('manage_questions.html', questions=questions)
+    return render_template('manage_questions.html', questions=page['questions'], page=page,
+                           page_size=page_size, topics=topics, current_topic=topic, search_prefix=prefix,
+                           total_questions=total_questions)
+
+
+@admin_routes_bp.route('/questions/search')
+def search_questions_page():
+    search_text = request.args.get('q', '').strip()
+    page = request.args.get('page', default=1, type=int)
+    page_size = request.args.get('page_size', default=question_service.DEFAULT_PAGE_SIZE, type=int)
+    results = question_service.search_questions(search_text, page=page, page_size=page_size)
+    return render_template('search_questions.html', results=results, search_text=search_text,
+                           page_size=page_size)
 
 
 @admin_routes_bp.route('/questions/add', methods=['GET', 'POST'])
@@ -90,7 +118,12 @@ def edit_question_page(question_id):
             if ans_text_key in request.form and request.form[ans_text_key].strip():
                 answer_text = request.form[ans_text_key].strip()
                 is_correct = 1 if i == correct_answer_index else 0
-                new_answers_data.append({'text': answer_text, 'is_correct': is_correct})
+                answer_data = {'text': answer_text, 'is_correct': is_correct}
+                # ID существующего ответа: по нему ответ обновляется на месте, а не пересоздается
+                answer_id = request.form.get(f'answer_id_{i}', type=int)
+                if answer_id:
+                    answer_data['id'] = answer_id
+                new_answers_data.append(answer_data)
                 answer_count_from_form += 1
 
         if not question_text:
@@ -127,6 +160,24 @@ def edit_question_page(question_id):
                            question=question)
 
 
+@admin_routes_bp.route('/questions/regrade/<int:question_id>', methods=['POST'])
+def regrade_question_action(question_id):
+    """Перепроверяет прошлые попытки и ключ в уже сгенерированных тестах по текущему ключу вопроса."""
+    try:
+        report = regrade_service.regrade_questions([question_id])
+    except sqlite3.Error as e:
+        print(f"Ошибка в admin_routes.regrade_question_action: {e}")
+        flash('Ошибка при перепроверке попыток.', 'error')
+        return redirect(url_for('admin_bp.edit_question_page', question_id=question_id))
+    flash(f"Перепроверено ответов: {report['answers_checked']}, исправлено: {report['answers_changed']}, "
+          f"пересчитано попыток: {report['attempts_rescored']}, обновлено тестов: {report['tests_refreshed']}.",
+          'success')
+    if report['answers_stale']:
+        flash(f"Ответов, выбранных до пересоздания вариантов ответа, не проверено: {report['answers_stale']}.",
+              'warning')
+    return redirect(url_for('admin_bp.edit_question_page', question_id=question_id))
+
+
 @admin_routes_bp.route('/questions/delete/<int:question_id>', methods=['POST'])
 def delete_question_action(question_id):
     success = question_service.delete_question_by_id(question_id)
@@ -134,4 +185,56 @@ def delete_question_action(question_id):
         flash('Вопрос успешно удален.', 'success')
     else:
         flash('Ошибка при удалении вопроса.', 'error')
-    return redirect(url_for('admin_bp.manage_questions_page'))
\ No newline at end of file
+    return redirect(url_for('admin_bp.manage_questions_page'))
+
+
+@admin_routes_bp.route('/questions/import', methods=['GET', 'POST'])
+def import_questions_page():
+    if request.method == 'POST':
+        uploaded_file = request.files.get('file')
+        if not uploaded_file or not uploaded_file.filename:
+            flash('Выберите файл для импорта.', 'error')
+            return render_template('import_questions.html')
+
+        file_format = request.form.get('file_format', 'auto')
+        if file_format not in question_transfer_service.SUPPORTED_FORMATS:
+            file_format = question_transfer_service.detect_format(uploaded_file.filename)
+        # Файл читается потоком, построчно, без загрузки целиком в память
+        text_stream = io.TextIOWrapper(uploaded_file.stream, encoding='utf-8-sig', newline='')
+        report = question_transfer_service.import_questions(text_stream, file_format)
+
+        if report['imported']:
+            flash(f"Импортировано вопросов: {report['imported']}.", 'success')
+        if report['rejected']:
+            flash(f"Отклонено строк: {report['rejected']}.", 'error')
+        return render_template('import_questions.html', report=report)
+
+    return render_template('import_questions.html')
+
+
+@admin_routes_bp.route('/questions/export')
+def export_questions_action():
+    file_format = request.args.get('format', 'csv')
+    if file_format not in question_transfer_service.SUPPORTED_FORMATS:
+        flash('Неподдерживаемый формат выгрузки.', 'error')
+        return redirect(url_for('admin_bp.manage_questions_page'))
+
+    mimetype = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    body = (chunk.encode('utf-8') for chunk in question_transfer_service.export_questions(file_format))
+    return Response(stream_with_context(body), mimetype=f'{mimetype}; charset=utf-8',
+                    headers={'Content-Disposition': f'attachment; filename="questions.{file_format}"'})
+
+
+@admin_routes_bp.route('/statistics')
+def question_statistics_page():
+    """Статистика вопросов по ответам учеников: сложность, различающая способность, дистракторы."""
+    sort = request.args.get('sort', 'discrimination')
+    if sort not in analytics_service.SORT_ORDERS:
+        sort = 'discrimination'
+    min_attempts = request.args.get('min_attempts', default=analytics_service.DEFAULT_MIN_ATTEMPTS, type=int)
+    topic = request.args.get('topic', '').strip()
+    statistics = analytics_service.get_question_statistics(sort=sort, min_attempts=min_attempts,
+                                                           topic=topic or None)
+    return render_template('question_statistics.html', statistics=statistics, sort=sort,
+                           min_attempts=min_attempts, current_topic=topic,
+                           topics=question_service.get_topics_with_counts())
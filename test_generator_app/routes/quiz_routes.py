@@ -1,8 +1,8 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file
-from ..services import quiz_service, question_service  # Импортируем наши сервисы
-from docx import Document
-from docx.shared import Pt
-from io import BytesIO
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file, Response, \
+    stream_with_context, current_app, jsonify
+from ..services import quiz_service, question_service, export_service, practice_service  # Импортируем наши сервисы
+from ..config import MAX_BULK_EXPORT_TESTS
+import random
 
 quiz_routes_bp = Blueprint('quiz_bp', __name__, template_folder='../templates')
 
@@ -14,22 +14,86 @@ def index_page():
 @quiz_routes_bp.route('/test/start', methods=['GET'])
 def start_new_test_page():
     total_questions = question_service.count_total_questions()
-    return render_template('start_test.html', total_questions=total_questions)
+    topics = question_service.get_topics_with_counts()
+    return render_template('start_test.html', total_questions=total_questions, topics=topics)
 
 
-@quiz_routes_bp.route('/test/generate', methods=['POST'])
-def generate_test_action():
+def _parse_topic_values(form, value_type):
+    """
+    Собирает из формы значения по темам: пары полей topic_name_<i> / topic_value_<i>.
+    Возвращает словарь {тема: значение}; пустые и нулевые значения пропускаются.
+    Бросает ValueError при некорректном или отрицательном значении.
+    """
+    topic_values = {}
+    for key, topic in form.items():
+        if not key.startswith('topic_name_'):
+            continue
+        raw_value = form.get('topic_value_' + key[len('topic_name_'):], '').strip()
+        if not raw_value:
+            continue
+        value = value_type(raw_value)
+        if value < 0:
+            raise ValueError(raw_value)
+        if value > 0:
+            topic_values[topic] = value
+    return topic_values
+
+
+def parse_generation_form(form):
+    """
+    Разбирает форму генерации теста. Возвращает (num_questions, topic_quotas),
+    где topic_quotas — None для выборки из всего банка.
+    Бросает ValueError с текстом для пользователя при некорректных данных.
+    В режиме weights обращается к БД (число вопросов по темам).
+    """
     try:
-        num_questions = int(request.form.get('num_questions', 5))
+        num_questions = int(form.get('num_questions', 5))
     except ValueError:
-        flash('Некорректное количество вопросов.', 'error')
-        return redirect(url_for('quiz_bp.start_new_test_page'))
+        raise ValueError('Некорректное количество вопросов.')
 
     if num_questions <= 0:
-        flash('Количество вопросов должно быть положительным.', 'error')
+        raise ValueError('Количество вопросов должно быть положительным.')
+
+    # Режим генерации: uniform — из всего банка, quotas — точное число вопросов по темам,
+    # weights — num_questions вопросов, распределенных между темами пропорционально весам
+    generation_mode = form.get('generation_mode', 'uniform')
+    topic_quotas = None
+    if generation_mode in ('quotas', 'weights'):
+        try:
+            topic_values = _parse_topic_values(form, int if generation_mode == 'quotas' else float)
+        except ValueError:
+            raise ValueError('Некорректное значение квоты или веса темы.')
+        if generation_mode == 'weights':
+            topic_values = quiz_service.allocate_topic_quotas(num_questions, topic_values)
+        if not topic_values:
+            raise ValueError('Укажите количество вопросов или вес хотя бы для одной темы.')
+        topic_quotas = topic_values
+    return num_questions, topic_quotas
+
+
+def parse_test_mode(form):
+    """Режим нового теста из формы: самопроверка (флажок practice) или экзамен."""
+    return quiz_service.TEST_MODE_PRACTICE if form.get('practice') else quiz_service.TEST_MODE_EXAM
+
+
+def generation_error_message(total_questions):
+    """Текст ошибки, если тест не удалось сгенерировать."""
+    # Проверяем, есть ли вообще вопросы
+    if total_questions == 0:
+        return 'В базе нет вопросов для генерации теста. Пожалуйста, добавьте вопросы.'
+    return 'Ошибка при генерации теста. Возможно, запрошено слишком много вопросов или произошла внутренняя ошибка.'
+
+
+@quiz_routes_bp.route('/test/generate', methods=['POST'])
+def generate_test_action():
+    try:
+        num_questions, topic_quotas = parse_generation_form(request.form)
+    except ValueError as e:
+        flash(str(e), 'error')
         return redirect(url_for('quiz_bp.start_new_test_page'))
 
-    test_instance_id = quiz_service.generate_new_test_instance(num_questions)
+    test_instance_id = quiz_service.generate_new_test_instance(num_questions, topic_quotas=topic_quotas,
+                                                               mode=parse_test_mode(request.form))
 
     if test_instance_id:
         flash(f'Тест №{test_instance_id} успешно сгенерирован!', 'success')
@@ -37,13 +101,7 @@ def generate_test_action():
         session['current_test_instance_id'] = test_instance_id
         return redirect(url_for('quiz_bp.take_test_page', test_instance_id=test_instance_id))
     else:
-        # Проверяем, есть ли вообще вопросы
-        if question_service.count_total_questions() == 0:
-            flash('В базе нет вопросов для генерации теста. Пожалуйста, добавьте вопросы.', 'error')
-        else:
-            flash(
-                'Ошибка при генерации теста. Возможно, запрошено слишком много вопросов или произошла внутренняя ошибка.',
-                'error')
+        flash(generation_error_message(question_service.count_total_questions()), 'error')
         return redirect(url_for('quiz_bp.start_new_test_page'))
 
 
@@ -56,7 +114,10 @@ def take_test_page(test_instance_id):
     #     flash('Ошибка: Попытка доступа к некорректному тесту.', 'error')
     #     return redirect(url_for('quiz_bp.start_new_test_page'))
 
-    questions_for_test = quiz_service.get_test_questions_for_instance(test_instance_id)
+    # Зерно перемешивания попытки: передается в форме, чтобы страница результатов
+    # показала вопросы в том же порядке, что видел ученик
+    shuffle_seed = random.getrandbits(31)
+    questions_for_test = quiz_service.get_test_questions_for_instance(test_instance_id, shuffle_seed=shuffle_seed)
 
     if questions_for_test is None:  # Сервис вернул None, значит тест не найден
         flash(f'Тест с ID {test_instance_id} не найден.', 'error')
@@ -68,9 +129,31 @@ def take_test_page(test_instance_id):
         session.pop('current_test_instance_id', None)
         return redirect(url_for('quiz_bp.start_new_test_page'))
 
+    # Самопроверка: странице передается подписанный ключ ответов, экзамен — без ключа
+    answer_key_bundle = None
+    if quiz_service.get_test_mode(test_instance_id) == quiz_service.TEST_MODE_PRACTICE:
+        answer_key_bundle = practice_service.create_practice_bundle(test_instance_id, current_app.config['SECRET_KEY'])
+
     return render_template('take_test.html',
                            questions_with_answers=questions_for_test,
-                           test_instance_id=test_instance_id)
+                           test_instance_id=test_instance_id,
+                           shuffle_seed=shuffle_seed,
+                           answer_key_bundle=answer_key_bundle)
+
+
+def parse_submitted_answers(form):
+    """Собирает ответы из формы: {question_id: selected_answer_id}. Бросает ValueError при некорректных данных."""
+    user_submitted_answers = {}
+    for key, value in form.items():
+        if key.startswith('question_'):
+            try:
+                # Преобразуем ID вопроса и ответа в int
+                question_id = int(key.split('_')[1])
+                selected_answer_id = int(value)
+            except (ValueError, IndexError):
+                raise ValueError(key)
+            user_submitted_answers[question_id] = selected_answer_id
+    return user_submitted_answers
 
 
 @quiz_routes_bp.route('/test/<int:test_instance_id>/submit', methods=['POST'])
@@ -81,17 +164,11 @@ def submit_test_action(test_instance_id):
     #     flash('Ошибка: Попытка отправки результатов некорректного теста.', 'error')
     #     return redirect(url_for('quiz_bp.start_new_test_page'))
 
-    user_submitted_answers = {}  # {question_id: selected_answer_id}
-    for key, value in request.form.items():
-        if key.startswith('question_'):
-            try:
-                # Преобразуем ID вопроса и ответа в int
-                question_id = int(key.split('_')[1])
-                selected_answer_id = int(value)
-                user_submitted_answers[question_id] = selected_answer_id
-            except (ValueError, IndexError):
-                flash('Обнаружены некорректные данные в отправленных ответах.', 'error')
-                return redirect(url_for('quiz_bp.take_test_page', test_instance_id=test_instance_id))
+    try:
+        user_submitted_answers = parse_submitted_answers(request.form)
+    except ValueError:
+        flash('Обнаружены некорректные данные в отправленных ответах.', 'error')
+        return redirect(url_for('quiz_bp.take_test_page', test_instance_id=test_instance_id))
 
     if not user_submitted_answers:
         flash('Вы не ответили ни на один вопрос.', 'warning')
@@ -102,45 +179,150 @@ def submit_test_action(test_instance_id):
     if evaluation_result and 'error' not in evaluation_result:
         flash('Тест успешно завершен!', 'success')
         session.pop('current_test_instance_id', None)  # Очищаем ID теста из сессии после успешной сдачи
-        return render_template('test_results.html', attempt=evaluation_result)
+        # Вопросы в порядке попытки (то же зерно, что и на странице теста) для разбора по вопросам
+        shuffle_seed = request.form.get('shuffle_seed', type=int)
+        questions = quiz_service.get_test_questions_for_instance(test_instance_id, shuffle_seed=shuffle_seed) \
+            if shuffle_seed is not None else None
+        return render_template('test_results.html', attempt=evaluation_result, questions=questions)
     else:
         error_message = evaluation_result.get('error',
                                               'Произошла неизвестная ошибка при проверке теста.') if evaluation_result else 'Не удалось обработать результаты теста.'
         flash(error_message, 'error')
         return redirect(url_for('quiz_bp.take_test_page', test_instance_id=test_instance_id))
 
+@quiz_routes_bp.route('/test/<int:test_instance_id>/practice/submit', methods=['POST'])
+def practice_submit_action(test_instance_id):
+    """
+    Итог самопроверки (JSON от static/js/script.js): {"bundle": подписанный ключ ответов,
+    "answers": {question_id: answer_id}}. Ответы проверяются по ключу из пакета, без чтения
+    теста; в ответ — JSON с результатом или {"error": ...}.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Ожидался JSON-объект с ответами.'}), 400
+    bundle = data.get('bundle')
+    try:
+        user_submitted_answers = {int(question_id): int(answer_id)
+                                  for question_id, answer_id in (data.get('answers') or {}).items()}
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'error': 'Обнаружены некорректные данные в отправленных ответах.'}), 400
+    if not bundle or not user_submitted_answers:
+        return jsonify({'error': 'Вы не ответили ни на один вопрос.'}), 400
+
+    try:
+        result = practice_service.submit_practice_attempt(test_instance_id, bundle, user_submitted_answers,
+                                                          current_app.config['SECRET_KEY'])
+    except practice_service.InvalidAnswerKeyBundle:
+        return jsonify({'error': 'Ключ ответов недействителен или устарел. Обновите страницу теста.'}), 403
+    if 'error' in result:
+        status = 503 if result['error'].startswith('Too many') else 400
+        return jsonify(result), status
+    session.pop('current_test_instance_id', None)
+    return jsonify(result)
+
+
 @quiz_routes_bp.route('/test/<int:test_instance_id>/download', methods=['GET'])
 def download_test_docx(test_instance_id):
     """
-    Генерирует тест в формате .docx для распечатки
+    Отдает тест в формате .docx для распечатки.
+    Документ формируется один раз и берется из дискового кэша (см. export_service);
+    файл отдается потоком, с ETag и поддержкой условных запросов (304 Not Modified).
     """
-    questions = quiz_service.get_test_questions_for_instance(test_instance_id)
-    if not questions:
+    export = export_service.get_test_docx(test_instance_id)
+    if not export:
         flash("Невозможно найти вопросы для этого теста.", "error")
         return redirect(url_for('quiz_bp.start_new_test_page'))
 
-    doc = Document()
-    doc.add_heading(f'Тест №{test_instance_id}', 0)
-
-    for idx, q in enumerate(questions, start=1):
-        p = doc.add_paragraph(f"{idx}. {q['question_text']}")
-        p.runs[0].font.size = Pt(12)
-        if q.get('topic'):
-            doc.add_paragraph(f"(Тема: {q['topic']})", style="Intense Quote")
-        for a_idx, ans in enumerate(q['answers'], start=1):
-            doc.add_paragraph(f"   {chr(96+a_idx)}) {ans['answer_text']}", style='List Bullet')
-
-        doc.add_paragraph("")  # Пустая строка между вопросами
-
-    # Сохраняем в память
-    doc_io = BytesIO()
-    doc.save(doc_io)
-    doc_io.seek(0)
-
+    path, etag = export
     filename = f"test_{test_instance_id}.docx"
     return send_file(
-        doc_io,
+        path,
         as_attachment=True,
         download_name=filename,
-        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-    )
\ No newline at end of file
+        mimetype=export_service.DOCX_MIMETYPE,
+        etag=etag,
+        conditional=True
+    )
+
+
+def parse_id_ranges(raw_ids):
+    """
+    Разбирает список ID вида "1, 2, 5-8" в список диапазонов [(1, 1), (2, 2), (5, 8)],
+    не разворачивая их. Бросает ValueError при некорректном вводе.
+    """
+    ranges = []
+    for part in raw_ids.replace(';', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = (int(bound) for bound in part.split('-', 1))
+            if last < first:
+                raise ValueError(part)
+            ranges.append((first, last))
+        else:
+            ranges.append((int(part), int(part)))
+    return ranges
+
+
+def parse_id_list(raw_ids, max_range=None):
+    """
+    Разбирает список ID вида "1, 2, 5-8". max_range — наибольшая длина одного диапазона
+    (None — без ограничения). Бросает ValueError при некорректном вводе.
+    """
+    ids = []
+    for first, last in parse_id_ranges(raw_ids):
+        if max_range is not None and last - first >= max_range:
+            raise ValueError(f'{first}-{last}')  # Не разворачиваем заведомо слишком большой диапазон
+        ids.extend(range(first, last + 1))
+    return ids
+
+
+def parse_test_ids(raw_ids):
+    """Список ID тестов для выгрузки: диапазон не длиннее MAX_BULK_EXPORT_TESTS."""
+    return parse_id_list(raw_ids, max_range=MAX_BULK_EXPORT_TESTS)
+
+
+def bulk_export_response(test_ids, export_format):
+    """Потоковый ответ с комплектом тестов: ZIP с отдельными файлами или один DOCX."""
+    if export_format == 'docx':
+        body = export_service.stream_tests_merged_docx(test_ids)
+        mimetype, filename = export_service.DOCX_MIMETYPE, 'tests.docx'
+    else:
+        body = export_service.stream_tests_zip(test_ids)
+        mimetype, filename = export_service.ZIP_MIMETYPE, 'tests.zip'
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@quiz_routes_bp.route('/tests/export', methods=['POST'])
+def bulk_export_action():
+    """
+    Выгрузка комплекта тестов одним файлом: либо по списку ID (test_ids),
+    либо с генерацией num_variants новых вариантов по num_questions вопросов.
+    """
+    export_format = request.form.get('export_format', 'zip')
+    try:
+        if request.form.get('test_ids', '').strip():
+            test_ids = parse_test_ids(request.form['test_ids'])
+        else:
+            num_variants = int(request.form.get('num_variants', 0))
+            num_questions = int(request.form.get('num_questions', 0))
+            if num_variants <= 0 or num_questions <= 0:
+                raise ValueError(num_variants)
+            if num_variants > MAX_BULK_EXPORT_TESTS:
+                flash(f'За один раз можно выгрузить не больше {MAX_BULK_EXPORT_TESTS} вариантов.', 'error')
+                return redirect(url_for('quiz_bp.start_new_test_page'))
+            test_ids = quiz_service.generate_test_variants(num_variants, num_questions)
+    except ValueError:
+        flash('Некорректный список тестов или параметры вариантов.', 'error')
+        return redirect(url_for('quiz_bp.start_new_test_page'))
+
+    if not test_ids:
+        flash('Нет тестов для выгрузки. Возможно, в базе нет вопросов.', 'error')
+        return redirect(url_for('quiz_bp.start_new_test_page'))
+    if len(test_ids) > MAX_BULK_EXPORT_TESTS:
+        flash(f'За один раз можно выгрузить не больше {MAX_BULK_EXPORT_TESTS} вариантов.', 'error')
+        return redirect(url_for('quiz_bp.start_new_test_page'))
+
+    return bulk_export_response(test_ids, export_format)
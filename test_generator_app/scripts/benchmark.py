@@ -0,0 +1,273 @@
+"""
+Воспроизводимый бенчмарк сценария ученика: генерация теста -> прохождение -> отправка -> DOCX.
+Создает во временной папке БД с синтетическим банком вопросов заданного размера (разные темы
+и число вариантов ответа), прогоняет сценарий через тестовый клиент Flask с фиксированным
+числом потоков и выводит JSON: пропускную способность, перцентили задержек и число SQL-запросов
+по шагам. Результаты разных коммитов сравнимы при одинаковых параметрах.
+
+Пример (из папки, где лежит пакет EngLes):
+    python EngLes/test_generator_app/scripts/benchmark.py --questions 100000 --students 500 -o bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from load_test import TEST_URL_RE, SEED_RE, ANSWER_RE, _percentile
+
+STEPS = ('generate', 'take', 'submit', 'download')
+SEED_BATCH_SIZE = 10000  # Вопросов в одной транзакции при заполнении банка
+
+
+def _configure(work_dir, args):
+    """
+    Направляет БД, кэш DOCX и журнал попыток во временную папку. Должна вызываться
+    до импорта модулей приложения: они читают настройки из config при импорте.
+    """
+    # Пакет EngLes — папка на два уровня выше scripts/
+    package_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    sys.path.insert(0, os.path.dirname(package_root))
+    from EngLes.test_generator_app import config
+
+    config.DATABASE_PATH = os.path.join(work_dir, 'benchmark.db')
+    config.EXPORT_CACHE_DIR = os.path.join(work_dir, 'export_cache')
+    config.ATTEMPT_JOURNAL_DIR = os.path.join(work_dir, 'attempt_journal')
+    config.ATTEMPT_WRITE_BEHIND = not args.sync_attempts
+    config.METRICS_ENABLED = False  # Запросы считает сам бенчмарк
+    config.DEBUG = False
+    return config
+
+
+def seed_question_bank(database_path, num_questions, num_topics, rng):
+    """
+    Заполняет банк синтетическими вопросами: темы распределены неравномерно (по Ципфу),
+    у вопроса от 2 до 6 вариантов ответа, один правильный. Возвращает число ответов.
+    """
+    topics = [f"Тема {index + 1}" for index in range(num_topics)]
+    topic_weights = [1 / (index + 1) for index in range(num_topics)]
+    conn = sqlite3.connect(database_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA synchronous = OFF")  # Временная БД: надежность записи не нужна
+    answer_total = 0
+    try:
+        for start in range(1, num_questions + 1, SEED_BATCH_SIZE):
+            questions, answers = [], []
+            for question_id in range(start, min(start + SEED_BATCH_SIZE, num_questions + 1)):
+                questions.append((question_id, f"Синтетический вопрос {question_id}: выберите верный вариант",
+                                  rng.choices(topics, topic_weights)[0]))
+                answer_count = rng.randint(2, 6)
+                correct_index = rng.randrange(answer_count)
+                answers.extend((question_id, f"Вариант {index + 1} вопроса {question_id}",
+                                1 if index == correct_index else 0) for index in range(answer_count))
+            with conn:
+                conn.executemany("INSERT INTO questions (id, question_text, topic) VALUES (?, ?, ?)", questions)
+                conn.executemany("INSERT INTO answers (question_id, answer_text, is_correct) VALUES (?, ?, ?)",
+                                 answers)
+            answer_total += len(answers)
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    return answer_total
+
+
+class StepRecorder:
+    """Задержки, ошибки и число SQL-запросов по шагам сценария (потокобезопасно)."""
+
+    def __init__(self):
+        self._data = {step: {'latencies': [], 'queries': [], 'errors': 0} for step in STEPS}
+        self._lock = threading.Lock()
+
+    def record(self, step, seconds, queries, ok):
+        with self._lock:
+            data = self._data[step]
+            data['latencies'].append(seconds)
+            data['queries'].append(queries)
+            if not ok:
+                data['errors'] += 1
+
+    def summary(self):
+        result = {}
+        for step, data in self._data.items():
+            latencies, queries = sorted(data['latencies']), data['queries']
+            if not latencies:
+                continue
+            ms = lambda value: round(value * 1000, 2)
+            result[step] = {
+                'requests': len(latencies),
+                'errors': data['errors'],
+                'mean_ms': ms(sum(latencies) / len(latencies)),
+                'p50_ms': ms(_percentile(latencies, 0.50)),
+                'p95_ms': ms(_percentile(latencies, 0.95)),
+                'p99_ms': ms(_percentile(latencies, 0.99)),
+                'max_ms': ms(latencies[-1]),
+                'mean_queries': round(sum(queries) / len(queries), 2),
+                'max_queries': max(queries),
+            }
+        return result
+
+
+_query_counter = threading.local()
+
+
+def _count_query(query, args, seconds, many):
+    """Наблюдатель database_manager: считает SQL-запросы текущего потока."""
+    _query_counter.count = getattr(_query_counter, 'count', 0) + 1
+
+
+def _timed(recorder, step, call, check):
+    """Выполняет запрос тестового клиента, записывает задержку и число SQL-запросов."""
+    _query_counter.count = 0
+    started = time.perf_counter()
+    response = call()
+    elapsed = time.perf_counter() - started
+    ok = check(response)
+    recorder.record(step, elapsed, _query_counter.count, ok)
+    return response if ok else None
+
+
+def run_student(client, recorder, test_size, rng, download):
+    """Сценарий одного ученика. Возвращает True, если тест отправлен успешно."""
+    response = _timed(recorder, 'generate',
+                      lambda: client.post('/test/generate', data={'num_questions': test_size,
+                                                                  'generation_mode': 'uniform'}),
+                      lambda r: r.status_code == 302 and TEST_URL_RE.search(r.headers.get('Location', '')))
+    if response is None:
+        return False
+    test_id = TEST_URL_RE.search(response.headers['Location']).group(1)
+
+    response = _timed(recorder, 'take', lambda: client.get(f'/test/{test_id}/take'),
+                      lambda r: r.status_code == 200)
+    if response is None:
+        return False
+    page = response.get_data(as_text=True)
+    form = {}
+    for question_id, answer_id in ANSWER_RE.findall(page):
+        form.setdefault(f'question_{question_id}', [])
+        form[f'question_{question_id}'].append(answer_id)
+    form = {name: rng.choice(answer_ids) for name, answer_ids in form.items()}
+    seed = SEED_RE.search(page)
+    if seed:
+        form['shuffle_seed'] = seed.group(1)
+
+    response = _timed(recorder, 'submit', lambda: client.post(f'/test/{test_id}/submit', data=form),
+                      lambda r: r.status_code == 200)
+    if response is None:
+        return False
+
+    if download:
+        _timed(recorder, 'download', lambda: client.get(f'/test/{test_id}/download'),
+               lambda r: r.status_code == 200 and r.data[:2] == b'PK')
+    return True
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix='engles-bench-')
+    close_attempt_writer = None
+    try:
+        config = _configure(work_dir, args)
+        from EngLes.test_generator_app.app import create_app
+        from EngLes.test_generator_app.models.database_manager import init_db_command, set_query_observer
+        from EngLes.test_generator_app.services.attempt_writer import flush_attempts, close_attempt_writer
+
+        app = create_app()
+        app.config['TESTING'] = True
+        init_db_command(app)
+
+        rng = random.Random(args.seed)
+        random.seed(args.seed)  # Выборка вопросов в сервисах использует модуль random
+        started = time.perf_counter()
+        answer_total = seed_question_bank(config.DATABASE_PATH, args.questions, args.topics, rng)
+        seed_seconds = time.perf_counter() - started
+
+        download = not args.no_download
+        if download:
+            try:
+                import docx  # noqa: F401
+            except ImportError:
+                download = False  # Без python-docx шаг выгрузки пропускается
+
+        set_query_observer(_count_query)
+        recorder = StepRecorder()
+        worker_clients = threading.local()
+
+        def student(index):
+            if not hasattr(worker_clients, 'client'):
+                worker_clients.client = app.test_client()
+            return run_student(worker_clients.client, recorder, args.test_size,
+                               random.Random(args.seed * 1000003 + index), download)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            completed = sum(executor.map(student, range(args.students)))
+        elapsed = time.perf_counter() - started
+        with app.app_context():
+            flush_started = time.perf_counter()
+            flush_attempts()
+            flush_seconds = time.perf_counter() - flush_started
+        set_query_observer(None)
+
+        return {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'parameters': {'questions': args.questions, 'topics': args.topics, 'students': args.students,
+                           'concurrency': args.concurrency, 'test_size': args.test_size, 'seed': args.seed,
+                           'attempt_write_behind': config.ATTEMPT_WRITE_BEHIND, 'download': download},
+            'bank': {'questions': args.questions, 'answers': answer_total, 'seed_seconds': round(seed_seconds, 2)},
+            'completed': completed,
+            'elapsed_seconds': round(elapsed, 3),
+            'students_per_second': round(completed / elapsed, 2) if elapsed else None,
+            'attempt_flush_seconds': round(flush_seconds, 3),
+            'steps': recorder.summary(),
+        }
+    finally:
+        if close_attempt_writer is not None:
+            # Журнал писателя попыток лежит в work_dir: писатель останавливается до удаления папки
+            close_attempt_writer()
+        if args.keep_db:
+            print(f"Файлы бенчмарка оставлены в {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк сценария генерация -> прохождение -> отправка -> DOCX.')
+    parser.add_argument('--questions', type=int, default=10000, help='Размер банка вопросов (10 тыс. — 1 млн).')
+    parser.add_argument('--topics', type=int, default=50, help='Число тем.')
+    parser.add_argument('--students', type=int, default=200, help='Сколько раз пройти сценарий.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Потоков, одновременно проходящих сценарий.')
+    parser.add_argument('--test-size', type=int, default=20, help='Вопросов в тесте.')
+    parser.add_argument('--seed', type=int, default=42, help='Зерно генератора банка и ответов.')
+    parser.add_argument('--sync-attempts', action='store_true', help='Писать попытки в БД прямо в запросе.')
+    parser.add_argument('--no-download', action='store_true', help='Пропустить шаг выгрузки DOCX.')
+    parser.add_argument('--keep-db', action='store_true', help='Не удалять временную БД.')
+    parser.add_argument('-o', '--output', help='Файл для JSON с результатами (по умолчанию — вывод на экран).')
+    args = parser.parse_args()
+
+    result = json.dumps(run_benchmark(args), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(result + '\n')
+    else:
+        print(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Проверка времени запуска воркера: импорт приложения и create_app() под `python -X importtime`.
+Завершается с кодом 1, если суммарное время импортов превышает бюджет или код приложения
+напрямую импортирует при запуске модуль, который должен загружаться только при использовании
+(python-docx, NumPy, asyncio, пул процессов). Модули, которые
+импортирует сама Flask или другие библиотеки, нарушением не считаются.
+
+Приложение создается на временной БД: рабочая база при проверке не меняется.
+Бюджет проверяется и тестом tests/test_import_time.py.
+
+Пример (из папки, где лежит пакет EngLes):
+    python EngLes/test_generator_app/scripts/check_import_time.py --budget-ms 400
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+APP_PACKAGE = 'EngLes.test_generator_app'
+
+# Модули, которые код приложения не должен импортировать при запуске синхронного воркера
+DEFERRED_MODULES = (
+    'docx',
+    'numpy',
+    'asyncio',
+    'multiprocessing',
+    'concurrent.futures',
+    'zipfile',
+    APP_PACKAGE + '.services.metrics_service',
+)
+
+DEFAULT_BUDGET_MS = 400
+
+# Настройки меняются до импорта остальных модулей приложения: они читают config при импорте
+CHILD_CODE = (f"from {APP_PACKAGE} import config; config.DATABASE_PATH = {{database_path!r}}; "
+              f"from {APP_PACKAGE}.app import create_app; create_app()")
+
+IMPORT_LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def run_importtime(database_path):
+    """
+    Запускает импорт приложения в отдельном процессе (БД — database_path),
+    возвращает строки вывода -X importtime.
+    """
+    package_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(package_root), env.get('PYTHONPATH')]))
+    child_code = CHILD_CODE.format(database_path=database_path)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', child_code],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Не удалось импортировать приложение (код {result.returncode}).")
+    return result.stderr.splitlines()
+
+
+def parse_importtime(lines):
+    """
+    Разбирает вывод -X importtime: [(имя модуля, собственное время мкс, суммарное мкс, импортер)].
+    Модуль печатается после всех своих вложенных импортов, поэтому импортер — ближайшая
+    следующая строка с меньшим отступом.
+    """
+    entries = []
+    for line in lines:
+        match = IMPORT_LINE_RE.match(line)
+        if match:
+            entries.append([match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)), None])
+    pending = []  # Индексы модулей, для которых импортер еще не встретился
+    for index, entry in enumerate(entries):
+        depth = entry[3]
+        while pending and entries[pending[-1]][3] > depth:
+            entries[pending.pop()][4] = entry[0]
+        pending.append(index)
+    return [(name, self_us, cumulative_us, importer) for name, self_us, cumulative_us, _, importer in entries]
+
+
+def _is_deferred(name):
+    return any(name == module or name.startswith(module + '.') for module in DEFERRED_MODULES)
+
+
+def check(entries, budget_ms):
+    """Возвращает (суммарное время импортов в мс, список нарушений)."""
+    total_ms = sum(self_us for _, self_us, _, _ in entries) / 1000
+    problems = []
+    if budget_ms and total_ms > budget_ms:
+        problems.append(f"время импортов {total_ms:.1f} мс больше бюджета {budget_ms} мс")
+    for name, _, cumulative_us, importer in entries:
+        # Нарушение — отложенный модуль, импортированный самим кодом приложения
+        if _is_deferred(name) and importer and importer.startswith(APP_PACKAGE) and not _is_deferred(importer):
+            problems.append(f"{importer} импортирует при запуске {name} ({cumulative_us / 1000:.1f} мс)")
+    return total_ms, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка времени импорта приложения (python -X importtime).')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='Допустимое суммарное время импортов, мс (0 — не проверять).')
+    parser.add_argument('--top', type=int, default=15, help='Сколько самых долгих модулей показать.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        entries = parse_importtime(run_importtime(os.path.join(work_dir, 'quiz.db')))
+    total_ms, problems = check(entries, args.budget_ms)
+
+    print(f"Суммарное время импортов: {total_ms:.1f} мс (модулей: {len(entries)}, бюджет: {args.budget_ms} мс)")
+    print("Самые долгие модули (собственное время):")
+    for name, self_us, cumulative_us, importer in sorted(entries, key=lambda entry: -entry[1])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} мс  {name}  (импортер: {importer or '-'})")
+    if problems:
+        print("Нарушения:")
+        for problem in problems:
+            print(f"  {problem}")
+        raise SystemExit(1)
+    print("Проверка пройдена.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Нагрузочный тест «начало экзамена»: все ученики одновременно генерируют тест,
+открывают его и отправляют ответы. Позволяет сравнить несколько запущенных серверов
+(например, разное число воркеров или потоков) на одном и том же наборе данных.
+
+Пример:
+    flask run --port 5000 --with-threads
+    flask run --port 5001 --without-threads
+    python load_test.py http://127.0.0.1:5000 http://127.0.0.1:5001 --students 200 --concurrency 50
+
+Использует только стандартную библиотеку; каждому ученику — своя cookie-сессия.
+"""
+import argparse
+import http.cookiejar
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+STEPS = ('generate', 'take', 'submit')
+TEST_URL_RE = re.compile(r'/test/(\d+)/take')
+SEED_RE = re.compile(r'name="shuffle_seed" value="(\d+)"')
+ANSWER_RE = re.compile(r'name="question_(\d+)"\s+value="(\d+)"')
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class StepStats:
+    """Задержки и ошибки одного шага сценария (потокобезопасно)."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.latencies.append(seconds)
+            if not ok:
+                self.errors += 1
+
+    def fail(self):
+        with self._lock:
+            self.errors += 1
+
+    def summary(self):
+        values = sorted(self.latencies)
+        ms = lambda value: round(value * 1000, 1) if value is not None else None
+        return {'requests': len(values), 'errors': self.errors,
+                'p50_ms': ms(_percentile(values, 0.50)), 'p95_ms': ms(_percentile(values, 0.95)),
+                'p99_ms': ms(_percentile(values, 0.99)), 'max_ms': ms(values[-1] if values else None)}
+
+
+def _request(opener, stats, url, data=None, timeout=60):
+    """Выполняет запрос, записывает задержку; возвращает (итоговый URL, тело) или None при ошибке."""
+    body = urllib.parse.urlencode(data).encode() if data is not None else None
+    started = time.perf_counter()
+    try:
+        with opener.open(url, data=body, timeout=timeout) as response:
+            text = response.read().decode('utf-8', errors='replace')
+            stats.record(time.perf_counter() - started, True)
+            return response.geturl(), text
+    except (urllib.error.URLError, OSError):
+        stats.record(time.perf_counter() - started, False)
+        return None
+
+
+def run_student(base_url, num_questions, stats, wait_start):
+    """Сценарий одного ученика: сгенерировать тест, открыть его, отправить ответы."""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    wait_start()
+
+    # Генерация с переходом (редирект) на страницу прохождения учитывается как шаг generate
+    result = _request(opener, stats['generate'], base_url + '/test/generate',
+                      {'num_questions': num_questions, 'generation_mode': 'uniform'})
+    match = result and TEST_URL_RE.search(result[0])
+    if not match:
+        return False
+    test_id = match.group(1)
+
+    # Отдельное открытие страницы теста (ученик обновил страницу)
+    result = _request(opener, stats['take'], f'{base_url}/test/{test_id}/take')
+    if not result:
+        return False
+    seed = SEED_RE.search(result[1])
+    answers = {}
+    for question_id, answer_id in ANSWER_RE.findall(result[1]):
+        answers.setdefault(f'question_{question_id}', answer_id)  # Первый вариант ответа
+    if not answers:
+        stats['take'].fail()
+        return False
+    if seed:
+        answers['shuffle_seed'] = seed.group(1)
+
+    result = _request(opener, stats['submit'], f'{base_url}/test/{test_id}/submit', answers)
+    return result is not None and '/take' not in result[0]
+
+
+def run_load_test(base_url, students, concurrency, num_questions):
+    """Прогоняет students сценариев с concurrency одновременными учениками. Возвращает сводку."""
+    base_url = base_url.rstrip('/')
+    stats = {step: StepStats() for step in STEPS}
+    # Первая волна из concurrency учеников стартует одновременно (наплыв в начале экзамена)
+    barrier = threading.Barrier(min(concurrency, students))
+    released = threading.Event()
+
+    def wait_start():
+        if not released.is_set():
+            barrier.wait()
+            released.set()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        completed = sum(executor.map(lambda _: run_student(base_url, num_questions, stats, wait_start),
+                                     range(students)))
+    elapsed = time.perf_counter() - started
+    return {
+        'url': base_url,
+        'students': students,
+        'concurrency': concurrency,
+        'questions': num_questions,
+        'completed': completed,
+        'elapsed_s': round(elapsed, 2),
+        'students_per_s': round(completed / elapsed, 2) if elapsed else None,
+        'steps': {step: stats[step].summary() for step in STEPS},
+    }
+
+
+def print_report(report):
+    print(f"{report['url']}: {report['completed']}/{report['students']} учеников за {report['elapsed_s']} с "
+          f"({report['students_per_s']} учеников/с, одновременно {report['concurrency']})")
+    print(f"  {'шаг':<10}{'запросов':>10}{'ошибок':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'max мс':>10}")
+    for step, summary in report['steps'].items():
+        print(f"  {step:<10}{summary['requests']:>10}{summary['errors']:>8}"
+              + ''.join(f"{str(summary[key]):>10}" for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест прохождения тестов (синхронный и ASGI-режимы).')
+    parser.add_argument('urls', nargs='+', help='Адреса запущенных серверов, например http://127.0.0.1:5000')
+    parser.add_argument('--students', type=int, default=200, help='Всего учеников (сценариев).')
+    parser.add_argument('--concurrency', type=int, default=50, help='Учеников одновременно.')
+    parser.add_argument('--questions', type=int, default=10, help='Вопросов в тесте.')
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON.')
+    args = parser.parse_args()
+
+    reports = [run_load_test(url, args.students, args.concurrency, args.questions) for url in args.urls]
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+    else:
+        for report in reports:
+            print_report(report)
+
+
+if __name__ == '__main__':
+    main()
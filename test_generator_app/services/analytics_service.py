@@ -0,0 +1,133 @@
+from ..models.database_manager import query_db
+from ..models.migrations import SQL_CORRECT_RATE_KEY, SQL_DISCRIMINATION_KEY
+from .question_sampler import MAX_IN_PARAMS
+import math
+
+# Запись ответа попытки; статистику по вопросу и вариантам ответа обновляют триггеры
+# (см. models/migrations.py, миграция 10). Повторная запись того же ответа игнорируется.
+# Ответ на вопрос, удаленный после генерации теста (в замороженном тесте он остался),
+# пропускается: иначе внешний ключ на questions отклонил бы всю попытку.
+# Параметры те же, что в строках attempt_answer_rows.
+SQL_INSERT_ATTEMPT_ANSWER = """
+    INSERT OR IGNORE INTO attempt_answers (attempt_id, question_id, answer_id, is_correct, attempt_score)
+    SELECT ?1, id, ?3, ?4, ?5 FROM questions WHERE id = ?2
+"""
+
+# Пороги для пометок на странице статистики
+DEFAULT_MIN_ATTEMPTS = 5  # Вопросы с меньшим числом ответов не показываются
+EASY_THRESHOLD = 0.9  # Доля правильных ответов, выше которой вопрос слишком легкий
+HARD_THRESHOLD = 0.2  # Доля правильных ответов, ниже которой вопрос слишком сложный
+LOW_DISCRIMINATION = 0.2  # Корреляция с результатом теста, ниже которой вопрос плохо различает учеников
+MAX_STATISTICS_ROWS = 500
+
+SORT_ORDERS = ('discrimination', 'easiest', 'hardest', 'attempts')
+
+# ORDER BY для каждого порядка сортировки; выражения совпадают с индексами миграции 12,
+# ID вопроса (rowid) упорядочивает равные значения и тоже берется из индекса
+SQL_SORT_ORDERS = {
+    'discrimination': f"{SQL_DISCRIMINATION_KEY}, s.question_id",  # Сначала худшие
+    'easiest': f"{SQL_CORRECT_RATE_KEY} DESC, s.question_id DESC",
+    'hardest': f"{SQL_CORRECT_RATE_KEY}, s.question_id",
+    'attempts': "s.attempts DESC, s.question_id DESC",
+}
+
+
+def attempt_answer_rows(attempt_id, answers, score, total_questions_in_test):
+    """
+    Строки attempt_answers для попытки.
+    answers: [(question_id, selected_answer_id, is_correct), ...]
+    """
+    attempt_score = score / total_questions_in_test if total_questions_in_test else 0.0
+    return [(attempt_id, question_id, answer_id, 1 if is_correct else 0, attempt_score)
+            for question_id, answer_id, is_correct in answers]
+
+
+def point_biserial(attempts, correct, sum_score, sum_score_sq, sum_score_correct):
+    """
+    Точечно-бисериальная корреляция правильности ответа на вопрос с долей правильных
+    ответов попытки, по накопленным суммам. None, если ее нельзя посчитать
+    (мало ответов, все ответили одинаково или у всех одинаковый результат).
+    """
+    if attempts < 2 or correct <= 0 or correct >= attempts:
+        return None
+    mean = sum_score / attempts
+    variance = sum_score_sq / attempts - mean * mean
+    if variance <= 1e-12:
+        return None
+    mean_correct = sum_score_correct / correct
+    mean_incorrect = (sum_score - sum_score_correct) / (attempts - correct)
+    p = correct / attempts
+    return (mean_correct - mean_incorrect) / math.sqrt(variance) * math.sqrt(p * (1 - p))
+
+
+def _question_flags(correct_rate, discrimination):
+    flags = []
+    if correct_rate >= EASY_THRESHOLD:
+        flags.append('слишком легкий')
+    elif correct_rate <= HARD_THRESHOLD:
+        flags.append('слишком сложный')
+    if discrimination is not None:
+        if discrimination < 0:
+            flags.append('сильные ученики ошибаются чаще — проверьте ключ')
+        elif discrimination < LOW_DISCRIMINATION:
+            flags.append('плохо различает учеников')
+    return flags
+
+
+def get_question_statistics(sort='discrimination', min_attempts=DEFAULT_MIN_ATTEMPTS, topic=None,
+                            limit=MAX_STATISTICS_ROWS):
+    """
+    Статистика вопросов по сводным таблицам (без чтения attempt_answers): число ответов,
+    доля правильных, различающая способность, пометки и выбор каждого варианта ответа.
+    sort: discrimination (сначала худшие), easiest, hardest, attempts.
+    Сортировка и ограничение выполняются в SQL по индексам (миграция 12).
+    Возвращает список словарей, не длиннее limit.
+    """
+    where, params = "s.attempts >= ?", [max(1, min_attempts)]
+    if topic:
+        where += " AND q.topic = ?"
+        params.append(topic)
+    params.append(max(1, min(limit, MAX_STATISTICS_ROWS)))
+    rows = query_db(f"""
+        SELECT s.question_id, s.attempts, s.correct, s.sum_score, s.sum_score_sq, s.sum_score_correct,
+               q.question_text, q.topic
+        FROM question_attempt_stats s JOIN questions q ON q.id = s.question_id
+        WHERE {where}
+        ORDER BY {SQL_SORT_ORDERS.get(sort, SQL_SORT_ORDERS['discrimination'])}
+        LIMIT ?
+    """, params)
+
+    statistics = []
+    for row in rows:
+        correct_rate = row['correct'] / row['attempts']
+        discrimination = point_biserial(row['attempts'], row['correct'], row['sum_score'],
+                                        row['sum_score_sq'], row['sum_score_correct'])
+        statistics.append({
+            'question_id': row['question_id'],
+            'question_text': row['question_text'],
+            'topic': row['topic'],
+            'attempts': row['attempts'],
+            'correct': row['correct'],
+            'correct_rate': correct_rate,
+            'discrimination': discrimination,
+            'flags': _question_flags(correct_rate, discrimination),
+            'answers': [],
+        })
+
+    # Выбор вариантов ответа для показанных вопросов
+    by_id = {item['question_id']: item for item in statistics}
+    ids = list(by_id)
+    for start in range(0, len(ids), MAX_IN_PARAMS):
+        chunk = ids[start:start + MAX_IN_PARAMS]
+        placeholders = ','.join('?' * len(chunk))
+        for ans in query_db(f"""
+            SELECT a.id, a.question_id, a.answer_text, a.is_correct, COALESCE(s.selections, 0) AS selections
+            FROM answers a LEFT JOIN answer_selection_stats s ON s.answer_id = a.id
+            WHERE a.question_id IN ({placeholders})
+            ORDER BY a.question_id, a.id
+        """, chunk):
+            item = by_id[ans['question_id']]
+            item['answers'].append({'id': ans['id'], 'answer_text': ans['answer_text'],
+                                    'is_correct': bool(ans['is_correct']), 'selections': ans['selections'],
+                                    'share': ans['selections'] / item['attempts']})
+    return statistics
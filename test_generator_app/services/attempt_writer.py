@@ -0,0 +1,365 @@
+from ..models.database_manager import get_connection_pool
+from .analytics_service import attempt_answer_rows, SQL_INSERT_ATTEMPT_ANSWER
+from ..config import (ATTEMPT_QUEUE_SIZE, ATTEMPT_QUEUE_TIMEOUT, ATTEMPT_WRITER_BATCH_SIZE,
+                      ATTEMPT_JOURNAL_DIR, ATTEMPT_JOURNAL_FSYNC)
+from contextlib import suppress
+import atexit
+import datetime
+import glob
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Отложенная запись попыток (write-behind): обработчик запроса проверяет ответы, записывает
+# попытку в журнал на диске (fsync) и сразу возвращает результат; отдельный поток-писатель
+# процесса забирает попытки из очереди и сохраняет их в БД пачками, одной транзакцией на пачку.
+# Журнал — сегменты attempts-<pid>-<метка>-<номер>.jsonl в ATTEMPT_JOURNAL_DIR, по попытке на строку
+# и не больше batch_size попыток в сегменте. Сегмент удаляется, как только все записанные в него
+# попытки сохранены в БД, поэтому журнал не растет и при непрерывной нагрузке (текущий сегмент
+# в этом случае очищается). Журналы завершившихся аварийно процессов дописываются в БД при старте
+# писателя в любом процессе (повтор безопасен: submission_id уникален).
+# Попытки, которые не удалось сохранить (ошибка в данных или БД заблокирована слишком долго),
+# дописываются в журнал отказов DEAD_LETTER_FILE в том же формате с полем error; чтобы повторить
+# их запись, файл достаточно переименовать в attempts-<что угодно>.jsonl.
+
+JOURNAL_PREFIX = 'attempts-'
+DEAD_LETTER_FILE = 'failed-attempts.jsonl'
+
+SQL_INSERT_ATTEMPT = """
+    INSERT OR IGNORE INTO user_attempts
+        (submission_id, test_instance_id, score, total_questions_in_test, attempt_timestamp)
+    VALUES (:submission_id, :test_instance_id, :score, :total_questions_in_test, :submitted_at)
+"""
+
+MAX_RETRY_DELAY = 2.0  # Максимальная пауза (с) между повторами записи пачки при блокировке БД
+MAX_WRITE_ATTEMPTS = 8  # Попыток записи пачки при блокировке БД, затем она уходит в журнал отказов
+
+
+class AttemptQueueFullError(Exception):
+    """Очередь записи попыток заполнена: попытка не принята, ее нужно отправить повторно."""
+
+
+def _lock_journal(journal_file, blocking):
+    """Эксклюзивная блокировка файла журнала. Возвращает False, если файл держит другой процесс."""
+    try:
+        if fcntl:
+            fcntl.flock(journal_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        else:
+            journal_file.seek(0)
+            msvcrt.locking(journal_file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _is_busy_error(error):
+    """Блокировка БД другим соединением: ошибка временная, запись стоит повторить."""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def _read_journal(journal_file):
+    """Читает записи журнала; недописанная последняя строка (сбой во время записи) пропускается."""
+    journal_file.seek(0)
+    records = []
+    for line in journal_file:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+
+def _insert_attempts(conn, records):
+    """
+    Сохраняет пачку попыток и их ответов по вопросам одной транзакцией.
+    Повторная запись той же попытки (по submission_id) игнорируется.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        answer_rows = []
+        for record in records:
+            try:
+                cursor = conn.execute(SQL_INSERT_ATTEMPT, record)
+            except sqlite3.IntegrityError as e:
+                # Например, тест удален после отправки
+                print(f"Попытка {record['submission_id']} не сохранена: {e}")
+                continue
+            if cursor.rowcount == 1:
+                answer_rows.extend(attempt_answer_rows(cursor.lastrowid, record.get('answers', ()),
+                                                       record['score'], record['total_questions_in_test']))
+        # Ответы на удаленные вопросы пропускает сам запрос (как и при синхронной записи)
+        conn.executemany(SQL_INSERT_ATTEMPT_ANSWER, answer_rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+class AttemptWriter:
+    """
+    Писатель попыток процесса: журнал, ограниченная очередь и поток, сохраняющий
+    попытки в БД пачками до batch_size штук. Если в очереди queue_size попыток,
+    submit ждет освобождения места не дольше queue_timeout секунд, затем бросает
+    AttemptQueueFullError.
+    """
+
+    def __init__(self, journal_dir=ATTEMPT_JOURNAL_DIR, queue_size=ATTEMPT_QUEUE_SIZE,
+                 queue_timeout=ATTEMPT_QUEUE_TIMEOUT, batch_size=ATTEMPT_WRITER_BATCH_SIZE,
+                 fsync=ATTEMPT_JOURNAL_FSYNC):
+        self.journal_dir = journal_dir
+        self.queue_timeout = queue_timeout
+        self.batch_size = batch_size
+        self.fsync = fsync
+        os.makedirs(journal_dir, exist_ok=True)
+        # Метка отличает сегменты этого писателя от журналов завершившегося процесса с тем же pid
+        self.segment_prefix = f'{JOURNAL_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}-'
+        self._segment_number = 0
+        self._segment_path = None  # Сегмент, в который пишутся новые попытки (создается при первой)
+        self._segment_records = 0  # Попыток, записанных в текущий сегмент
+        self._segments = {}  # Путь сегмента -> [открытый и заблокированный файл, попыток еще не в БД]
+        self._journal_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='attempt-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, test_instance_id, score, total_questions_in_test, answers=(), submission_id=None):
+        """
+        Принимает попытку: записывает ее в журнал и ставит в очередь на сохранение.
+        answers: [(question_id, selected_answer_id, is_correct), ...] для статистики по вопросам.
+        submission_id — идентификатор, выданный клиенту заранее (иначе создается новый);
+        попытка с уже сохраненным submission_id в БД не дублируется.
+        После возврата попытка не потеряется и при аварийном завершении процесса.
+        Возвращает submission_id попытки.
+        """
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise AttemptQueueFullError()
+        record = {
+            'submission_id': submission_id or uuid.uuid4().hex,
+            'test_instance_id': test_instance_id,
+            'score': score,
+            'total_questions_in_test': total_questions_in_test,
+            # В том же формате, что и CURRENT_TIMESTAMP в схеме (UTC)
+            'submitted_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            'answers': [[question_id, answer_id, bool(is_correct)] for question_id, answer_id, is_correct in answers],
+        }
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        try:
+            with self._journal_lock:
+                segment_path = self._write_journal(line)
+        except OSError:
+            self._slots.release()
+            raise
+        self._queue.put((segment_path, record))
+        return record['submission_id']
+
+    def _write_journal(self, line):
+        """Дописывает строку в текущий сегмент журнала (под _journal_lock). Возвращает путь сегмента."""
+        if self._segment_path is None:
+            self._segment_number += 1
+            path = os.path.join(self.journal_dir, f'{self.segment_prefix}{self._segment_number}.jsonl')
+            segment_file = open(path, 'a+', encoding='utf-8')
+            _lock_journal(segment_file, blocking=True)
+            self._segments[path] = [segment_file, 0]
+            self._segment_path, self._segment_records = path, 0
+        segment = self._segments[self._segment_path]
+        segment[0].write(line)
+        segment[0].flush()
+        if self.fsync:
+            os.fsync(segment[0].fileno())
+        segment[1] += 1
+        path = self._segment_path
+        self._segment_records += 1
+        if self._segment_records >= self.batch_size:
+            self._segment_path = None  # Следующая попытка начнет новый сегмент
+        return path
+
+    def _release_journal(self, segment_paths):
+        """
+        Отмечает попытки сохраненными (под _journal_lock): сегмент, все попытки которого в БД,
+        удаляется, а текущий сегмент очищается и продолжает заполняться.
+        """
+        for path in segment_paths:
+            self._segments[path][1] -= 1
+        for path in set(segment_paths):
+            segment_file, pending = self._segments[path]
+            if pending:
+                continue
+            if path == self._segment_path:
+                segment_file.seek(0)
+                segment_file.truncate()
+                self._segment_records = 0
+            else:
+                del self._segments[path]
+                segment_file.close()
+                with suppress(FileNotFoundError):
+                    os.remove(path)
+
+    def flush(self):
+        """Ждет, пока все принятые попытки будут сохранены в БД."""
+        self._queue.join()
+
+    def close(self, timeout=10):
+        """Сохраняет оставшиеся попытки и останавливает поток; пустые сегменты журнала удаляются."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return  # Не успели: попытки остаются в журнале и будут дописаны при следующем старте
+        with self._journal_lock:
+            self._segment_path = None
+            for path, (segment_file, pending) in list(self._segments.items()):
+                segment_file.close()
+                if pending == 0:
+                    del self._segments[path]
+                    with suppress(FileNotFoundError):  # Папку журнала могли уже удалить
+                        os.remove(path)
+
+    def _run(self):
+        conn = get_connection_pool().acquire()
+        try:
+            self._recover_journals(conn)
+            stopping = False
+            while not stopping:
+                batch = []
+                item = self._queue.get()
+                while item is not None:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if item is None:
+                    stopping = True
+                    self._queue.task_done()
+                if batch:
+                    self._write_batch(conn, batch)
+        finally:
+            get_connection_pool().release(conn)
+
+    def _save(self, conn, records):
+        """
+        Сохраняет попытки в БД. При блокировке БД запись повторяется до MAX_WRITE_ATTEMPTS раз
+        с растущей паузой; при другой ошибке попытки пишутся по одной, чтобы одна некорректная
+        запись не задерживала остальные. Несохраненные попытки уходят в журнал отказов.
+        """
+        delay = 0.05
+        for attempt in range(1, MAX_WRITE_ATTEMPTS + 1):
+            try:
+                _insert_attempts(conn, records)
+                return
+            except Exception as e:
+                error = e
+                if not _is_busy_error(e) or attempt == MAX_WRITE_ATTEMPTS:
+                    break
+                print(f"Ошибка в attempt_writer при сохранении попыток ({len(records)}), повтор через {delay} с: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+        if len(records) > 1 and not _is_busy_error(error):
+            for record in records:
+                self._save(conn, [record])
+            return
+        self._dead_letter(records, error)
+
+    def _dead_letter(self, records, error):
+        """Дописывает несохраненные попытки в журнал отказов (если не удалось — в вывод процесса)."""
+        print(f"Ошибка в attempt_writer: попытки ({len(records)}) не сохранены в БД "
+              f"и записаны в {DEAD_LETTER_FILE}: {error}")
+        lines = [json.dumps({**record, 'error': str(error)}, ensure_ascii=False) + '\n' for record in records]
+        try:
+            with open(os.path.join(self.journal_dir, DEAD_LETTER_FILE), 'a', encoding='utf-8') as dead_letter:
+                dead_letter.writelines(lines)
+                dead_letter.flush()
+                if self.fsync:
+                    os.fsync(dead_letter.fileno())
+        except OSError as e:
+            print(f"Ошибка в attempt_writer при записи журнала отказов: {e}")
+            for line in lines:
+                print(line, end='')
+
+    def _write_batch(self, conn, batch):
+        """Сохраняет пачку [(сегмент журнала, попытка)] (см. _save), затем освобождает место в очереди."""
+        self._save(conn, [record for _, record in batch])
+        with self._journal_lock:
+            self._release_journal([segment_path for segment_path, _ in batch])
+        for _ in batch:
+            self._slots.release()
+            self._queue.task_done()
+
+    def _recover_journals(self, conn):
+        """Дописывает в БД попытки из журналов процессов, завершившихся до их сохранения."""
+        for path in glob.glob(os.path.join(self.journal_dir, f'{JOURNAL_PREFIX}*.jsonl')):
+            if os.path.basename(path).startswith(self.segment_prefix):
+                continue
+            try:
+                journal_file = open(path, 'r+', encoding='utf-8')
+            except OSError:
+                continue
+            try:
+                if not _lock_journal(journal_file, blocking=False):
+                    continue  # Журнал работающего процесса
+                records = _read_journal(journal_file)
+                for start in range(0, len(records), self.batch_size):
+                    self._save(conn, records[start:start + self.batch_size])
+                print(f"Восстановлено попыток из журнала {os.path.basename(path)}: {len(records)}")
+            finally:
+                journal_file.close()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_attempt_writer():
+    """Возвращает писателя попыток текущего процесса (после fork создается новый)."""
+    global _writer, _writer_pid
+    pid = os.getpid()
+    if _writer is None or _writer_pid != pid:
+        with _writer_lock:
+            if _writer is None or _writer_pid != pid:
+                _writer = AttemptWriter()
+                _writer_pid = pid
+                atexit.register(_writer.close)
+    return _writer
+
+
+def record_attempt(test_instance_id, score, total_questions_in_test, answers=(), submission_id=None):
+    """Принимает попытку к сохранению (см. AttemptWriter.submit). Возвращает submission_id."""
+    return get_attempt_writer().submit(test_instance_id, score, total_questions_in_test, answers,
+                                       submission_id=submission_id)
+
+
+def close_attempt_writer():
+    """Сохраняет принятые попытки и останавливает писателя процесса (если он запущен)."""
+    global _writer
+    with _writer_lock:
+        writer = _writer if _writer_pid == os.getpid() else None
+        _writer = None
+    if writer is not None:
+        atexit.unregister(writer.close)
+        writer.close()
+
+
+def flush_attempts():
+    """Ждет сохранения в БД всех принятых в этом процессе попыток (если писатель запущен)."""
+    if _writer is not None and _writer_pid == os.getpid():
+        _writer.flush()
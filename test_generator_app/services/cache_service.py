@@ -0,0 +1,120 @@
+from ..models.database_manager import query_db, execute_db
+from ..config import QUESTION_CACHE_SIZE, TEST_CACHE_SIZE
+from collections import OrderedDict
+from flask import g
+import threading
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш с ограничением числа записей и счетчиками попаданий/промахов.
+    Значения должны быть неизменяемыми (кортежи), так как отдаются всем запросам.
+    """
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Возвращает значение или None при промахе."""
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_many(self, keys):
+        """Возвращает словарь {ключ: значение} для найденных в кэше ключей."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._data.get(key)
+                if value is None:
+                    self.misses += 1
+                    continue
+                self._data.move_to_end(key)
+                self.hits += 1
+                found[key] = value
+        return found
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'name': self.name, 'size': len(self._data), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+# Вопрос с ответами: question_id -> (id, question_text, topic, ((answer_id, answer_text, is_correct), ...))
+question_cache = LRUCache('questions', QUESTION_CACHE_SIZE)
+# Замороженное содержимое экземпляра теста: test_instance_id -> кортеж вопросов в том же формате
+test_cache = LRUCache('tests', TEST_CACHE_SIZE)
+
+_local_generation = None
+_generation_lock = threading.Lock()
+
+
+def check_generation():
+    """
+    Сверяет кэши процесса со счетчиком поколений в БД (таблица cache_generation,
+    увеличивается триггерами при изменении или удалении вопросов и ответов любым
+    процессом, а при добавлении ответа к существующему вопросу — bump_generation).
+    Если счетчик изменился, кэши очищаются. Выполняется один раз за запрос.
+    """
+    global _local_generation
+    if getattr(g, '_cache_generation_checked', False):
+        return
+    g._cache_generation_checked = True
+
+    row = query_db("SELECT generation FROM cache_generation WHERE id = 1", one=True)
+    generation = row['generation'] if row else 0
+    with _generation_lock:
+        if generation != _local_generation:
+            question_cache.clear()
+            test_cache.clear()
+            _local_generation = generation
+
+
+def bump_generation():
+    """
+    Увеличивает счетчик поколений: кэши всех процессов будут очищены при следующем запросе.
+    Нужна там, где триггеров нет: при добавлении ответов к существующему вопросу (триггер на
+    вставку ответов срабатывал бы и при добавлении каждого нового вопроса и при импорте).
+    Внутри блока transaction() изменение фиксируется вместе с остальными.
+    """
+    execute_db("UPDATE cache_generation SET generation = generation + 1 WHERE id = 1")
+
+
+def invalidate_question(question_id, deleted=False):
+    """
+    Сбрасывает кэш вопроса после изменения в этом процессе. При удалении меняется
+    состав тестов, поэтому кэш составов очищается целиком.
+    """
+    question_cache.invalidate(question_id)
+    if deleted:
+        test_cache.clear()
+
+
+def get_cache_stats():
+    """Счетчики попаданий/промахов и размеры кэшей."""
+    return [question_cache.stats(), test_cache.stats()]
@@ -0,0 +1,272 @@
+from ..models.database_manager import query_db
+from ..config import EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES, EXPORT_WORKERS
+from .quiz_service import get_test_questions_for_instance
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+ZIP_MIMETYPE = 'application/zip'
+
+# Размер блока при потоковой отдаче файлов
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Увеличить при изменении оформления документа, чтобы старые файлы в кэше не использовались
+EXPORT_FORMAT_VERSION = 1
+
+
+def _cache_file_name(test_instance_id, etag):
+    return f"test_{test_instance_id}_{etag}.docx"
+
+
+def _content_etag(test_instance_id, questions):
+    """ETag документа: хэш содержимого теста в порядке вывода и версии оформления."""
+    content = [[q.id, q.question_text, q.topic, [[ans.id, ans.answer_text] for ans in q.answers]] for q in questions]
+    payload = json.dumps([EXPORT_FORMAT_VERSION, test_instance_id, content], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:20]
+
+
+def _add_test_to_document(doc, test_instance_id, questions):
+    """Добавляет в документ python-docx заголовок теста и его вопросы (список Question)."""
+    from docx.shared import Pt
+
+    doc.add_heading(f'Тест №{test_instance_id}', 0)
+
+    for idx, q in enumerate(questions, start=1):
+        p = doc.add_paragraph(f"{idx}. {q.question_text}")
+        p.runs[0].font.size = Pt(12)
+        if q.topic:
+            doc.add_paragraph(f"(Тема: {q.topic})", style="Intense Quote")
+        for a_idx, ans in enumerate(q.answers, start=1):
+            doc.add_paragraph(f"   {chr(96+a_idx)}) {ans.answer_text}", style='List Bullet')
+
+        doc.add_paragraph("")  # Пустая строка между вопросами
+
+
+def render_test_docx(test_instance_id, questions, stream):
+    """Формирует тест в формате .docx для распечатки и записывает его в stream."""
+    # python-docx импортируется только здесь: модуль используется и для инвалидации кэша из админки
+    from docx import Document
+
+    doc = Document()
+    _add_test_to_document(doc, test_instance_id, questions)
+    doc.save(stream)
+
+
+def _render_test_docx_file(task):
+    """
+    Формирует DOCX-файл теста по пути path (через временный файл и атомарное переименование:
+    параллельные запросы не увидят недописанный файл). Не обращается к БД, поэтому
+    может выполняться в отдельном процессе. task: (test_instance_id, questions, path).
+    """
+    test_instance_id, questions, path = task
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            render_test_docx(test_instance_id, questions, tmp_file)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def _prepare_export(test_instance_id):
+    """
+    Загружает тест с детерминированным порядком (seed = ID теста) и вычисляет etag и путь
+    к файлу в кэше. Возвращает (questions, etag, path) или None, если у теста нет вопросов.
+    """
+    questions = get_test_questions_for_instance(test_instance_id, shuffle_seed=test_instance_id)
+    if not questions:
+        return None
+    etag = _content_etag(test_instance_id, questions)
+    return questions, etag, os.path.join(EXPORT_CACHE_DIR, _cache_file_name(test_instance_id, etag))
+
+
+def _touch(path):
+    """Отмечает использование файла кэша для LRU-вытеснения. Возвращает False, если файла нет."""
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+
+def get_test_docx(test_instance_id):
+    """
+    Возвращает (путь к файлу, etag) для DOCX-версии теста или None, если у теста нет вопросов.
+    Порядок вопросов и ответов детерминирован (seed = ID теста), поэтому каждый тест
+    формируется один раз и затем отдается из дискового кэша. Ключ кэша — хэш содержимого,
+    так что правка вопроса автоматически приводит к новому файлу.
+    """
+    prepared = _prepare_export(test_instance_id)
+    if not prepared:
+        return None
+
+    questions, etag, path = prepared
+    if _touch(path):
+        return path, etag
+
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    _render_test_docx_file((test_instance_id, questions, path))
+    evict_export_cache(keep=path)
+    return path, etag
+
+
+def iter_test_docx_files(test_instance_ids, max_workers=EXPORT_WORKERS):
+    """
+    Генератор пар (test_instance_id, путь к DOCX-файлу) в порядке test_instance_ids.
+    Недостающие в кэше файлы формируются пулом процессов; тесты обрабатываются
+    порциями, так что в памяти одновременно находится не больше 2 * max_workers тестов.
+    Тесты без вопросов пропускаются.
+    """
+    # Импорт пула процессов тянет multiprocessing; нужен только массовой выгрузке
+    from concurrent.futures import ProcessPoolExecutor
+
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    batch_size = max(1, max_workers) * 2
+    pool = ProcessPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+    try:
+        for start in range(0, len(test_instance_ids), batch_size):
+            batch = []  # [(test_instance_id, path)]
+            tasks = []
+            for test_instance_id in test_instance_ids[start:start + batch_size]:
+                prepared = _prepare_export(test_instance_id)
+                if not prepared:
+                    continue
+                questions, _, path = prepared
+                batch.append((test_instance_id, path))
+                if not _touch(path):
+                    tasks.append((test_instance_id, questions, path))
+
+            if pool and len(tasks) > 1:
+                list(pool.map(_render_test_docx_file, tasks))
+            else:
+                for task in tasks:
+                    _render_test_docx_file(task)
+
+            for test_instance_id, path in batch:
+                yield test_instance_id, path
+    finally:
+        if pool:
+            pool.shutdown()
+    evict_export_cache()
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Не поддерживающий seek буфер: zipfile пишет в него, а генератор забирает накопленные байты."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_tests_zip(test_instance_ids, max_workers=EXPORT_WORKERS):
+    """
+    Генератор байтов ZIP-архива с DOCX-файлами тестов (test_<id>.docx).
+    Архив пишется потоком (без seek), в памяти держится не больше одного файла.
+    """
+    import zipfile
+
+    buffer = _ChunkBuffer()
+    # DOCX уже сжат, повторное сжатие только тратит CPU
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for test_instance_id, path in iter_test_docx_files(test_instance_ids, max_workers=max_workers):
+            arcname = f"test_{test_instance_id}.docx"
+            try:
+                archive.write(path, arcname=arcname)
+            except FileNotFoundError:
+                # Файл успели вытеснить из кэша параллельным запросом — формируем заново
+                archive.write(get_test_docx(test_instance_id)[0], arcname=arcname)
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+def stream_tests_merged_docx(test_instance_ids):
+    """
+    Генератор байтов одного DOCX-документа со всеми тестами, каждый с новой страницы.
+    Документ собирается во временном файле и отдается блоками по STREAM_CHUNK_SIZE.
+    python-docx держит собираемый документ в памяти целиком, поэтому для больших
+    комплектов лучше подходит ZIP (stream_tests_zip).
+    """
+    from docx import Document
+
+    doc = Document()
+    has_content = False
+    for test_instance_id in test_instance_ids:
+        prepared = _prepare_export(test_instance_id)
+        if not prepared:
+            continue
+        if has_content:
+            doc.add_page_break()
+        _add_test_to_document(doc, test_instance_id, prepared[0])
+        has_content = True
+
+    with tempfile.TemporaryFile() as tmp_file:
+        doc.save(tmp_file)
+        del doc
+        tmp_file.seek(0)
+        while True:
+            chunk = tmp_file.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def evict_export_cache(keep=None, max_bytes=EXPORT_CACHE_MAX_BYTES):
+    """Удаляет из кэша давно не запрашивавшиеся файлы, пока его размер превышает max_bytes."""
+    try:
+        entries = [entry for entry in os.scandir(EXPORT_CACHE_DIR)
+                   if entry.is_file() and entry.name.endswith('.docx')]
+    except FileNotFoundError:
+        return
+    stats = [(entry.path, entry.stat()) for entry in entries]
+    total_size = sum(st.st_size for _, st in stats)
+    for path, st in sorted(stats, key=lambda item: item[1].st_mtime):
+        if total_size <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total_size -= st.st_size
+        except FileNotFoundError:
+            pass
+
+
+def invalidate_test_exports(test_instance_ids):
+    """Удаляет из кэша все версии DOCX-файлов указанных тестов."""
+    prefixes = tuple(f"test_{test_id}_" for test_id in test_instance_ids)
+    if not prefixes:
+        return
+    try:
+        entries = list(os.scandir(EXPORT_CACHE_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.name.startswith(prefixes):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def get_tests_containing_question(question_id):
+    """Возвращает ID тестов, в которые входит вопрос (по индексу test_questions(question_id))."""
+    rows = query_db("SELECT test_id FROM test_questions WHERE question_id = ?", (question_id,))
+    return [row['test_id'] for row in rows]
@@ -0,0 +1,227 @@
+from ..models.database_manager import set_query_observer
+from ..config import SLOW_QUERY_MS, SLOW_QUERY_LOG_PATH, MAX_QUERIES_PER_REQUEST, METRICS_ALLOW_REMOTE
+from .cache_service import get_cache_stats
+from collections import Counter
+from flask import g, request, Response, abort, has_request_context
+import datetime
+import functools
+import re
+import threading
+import time
+
+# Инструментирование приложения (config.METRICS_ENABLED, подключается в create_app через init_app):
+# - гистограммы времени ответа, числа SQL-запросов и суммарного времени SQL по маршрутам;
+# - сводка по SQL-запросам (число вызовов, суммарное и максимальное время, форма параметров);
+# - журнал медленных запросов и предупреждение о слишком большом числе запросов (N+1);
+# - страница /metrics в текстовом формате Prometheus.
+# Метрики хранятся в памяти процесса: при нескольких воркерах у каждого свои.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SQL_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+MAX_TRACKED_STATEMENTS = 500  # Различных SQL-запросов в сводке; остальные учитываются вместе
+OTHER_STATEMENTS = '(прочие)'
+SLOWEST_STATEMENTS_EXPORTED = 20  # Самых медленных запросов на странице /metrics
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин для набора значений меток (потокобезопасно)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._series = {}  # метки -> [счетчики по корзинам, сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self, name, help_text, label_names):
+        """Строки в текстовом формате Prometheus (корзины накопительные)."""
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        with self._lock:
+            series_items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        for labels, (bucket_counts, total, count) in series_items:
+            label_text = _format_labels(label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{label_text}}} {total}")
+            lines.append(f"{name}_count{{{label_text}}} {count}")
+        return lines
+
+
+class StatementStats:
+    """Сводка по SQL-запросам: вызовы, суммарное и максимальное время, форма параметров самого долгого вызова."""
+
+    def __init__(self, max_statements=MAX_TRACKED_STATEMENTS):
+        self.max_statements = max_statements
+        self._stats = {}  # запрос -> [вызовы, суммарное время, максимальное время, форма параметров]
+        self._lock = threading.Lock()
+
+    def record(self, statement, shape, seconds):
+        with self._lock:
+            stats = self._stats.get(statement)
+            if stats is None:
+                if len(self._stats) >= self.max_statements:
+                    statement, shape = OTHER_STATEMENTS, ''
+                    stats = self._stats.get(statement)
+                if stats is None:
+                    stats = self._stats[statement] = [0, 0.0, 0.0, shape]
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds >= stats[2]:
+                stats[2] = seconds
+                stats[3] = shape
+
+    def slowest(self, limit=SLOWEST_STATEMENTS_EXPORTED):
+        """Запросы с наибольшим суммарным временем: [(запрос, вызовы, сумма, максимум, форма параметров)]."""
+        with self._lock:
+            items = [(statement, *stats) for statement, stats in self._stats.items()]
+        items.sort(key=lambda item: item[2], reverse=True)
+        return items[:limit]
+
+
+request_latency = Histogram(LATENCY_BUCKETS)
+request_sql_queries = Histogram(QUERY_COUNT_BUCKETS)
+request_sql_seconds = Histogram(SQL_TIME_BUCKETS)
+statement_stats = StatementStats()
+_slow_log_lock = threading.Lock()
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_names, labels):
+    return ','.join(f'{name}="{_escape_label(value)}"' for name, value in zip(label_names, labels))
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_statement(query):
+    """Текст запроса без лишних пробелов; списки плейсхолдеров IN (?, ?, ...) сворачиваются."""
+    statement = ' '.join(query.split())
+    return re.sub(r'\?(?:\s*,\s*\?)+', '?, ...', statement)
+
+
+def _param_shape(args, many):
+    """Форма параметров без значений: типы позиционных параметров, имена именованных или число строк."""
+    if many:
+        return f"executemany: {args} строк"
+    if isinstance(args, dict):
+        return 'именованные: ' + ', '.join(sorted(args))
+    if len(args) > 8:
+        return f"{len(args)} параметров"
+    return '(' + ', '.join(type(value).__name__ for value in args) + ')'
+
+
+def _log_slow_query(statement, shape, seconds):
+    endpoint = request.endpoint if has_request_context() else '-'
+    line = (f"{datetime.datetime.now().isoformat(timespec='seconds')} медленный запрос {seconds * 1000:.1f} мс "
+            f"[{endpoint}] {statement} {shape}")
+    if SLOW_QUERY_LOG_PATH is None:
+        print(line)
+        return
+    with _slow_log_lock:
+        with open(SLOW_QUERY_LOG_PATH, 'a', encoding='utf-8') as log_file:
+            log_file.write(line + '\n')
+
+
+def record_query(query, args, seconds, many):
+    """Наблюдатель за SQL-запросами для database_manager.set_query_observer."""
+    statement = normalize_statement(query)
+    shape = _param_shape(args, many)
+    statement_stats.record(statement, shape, seconds)
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        _log_slow_query(statement, shape, seconds)
+
+    if not has_request_context() or getattr(g, '_metrics_sql_count', None) is None:
+        return  # Запрос вне HTTP-запроса (команды CLI, фоновые потоки)
+    g._metrics_sql_count += 1
+    g._metrics_sql_seconds += seconds
+    if MAX_QUERIES_PER_REQUEST:
+        g._metrics_statements[statement] += 1
+        if g._metrics_sql_count == MAX_QUERIES_PER_REQUEST + 1:
+            repeated, repeats = g._metrics_statements.most_common(1)[0]
+            print(f"Предупреждение: {request.method} {request.path} выполнил больше {MAX_QUERIES_PER_REQUEST} "
+                  f"SQL-запросов (возможна проблема N+1); чаще всего, {repeats} раз: {repeated}")
+
+
+def _start_request():
+    g._metrics_started = time.perf_counter()
+    g._metrics_sql_count = 0
+    g._metrics_sql_seconds = 0.0
+    g._metrics_statements = Counter() if MAX_QUERIES_PER_REQUEST else None
+
+
+def _finish_request(exception=None):
+    started = g.pop('_metrics_started', None)
+    if started is None:
+        return
+    labels = (request.endpoint or 'not_found', request.method)
+    request_latency.observe(labels, time.perf_counter() - started)
+    request_sql_queries.observe(labels, g.pop('_metrics_sql_count', 0))
+    request_sql_seconds.observe(labels, g.pop('_metrics_sql_seconds', 0.0))
+    g.pop('_metrics_statements', None)
+
+
+def render_metrics():
+    """Все метрики процесса в текстовом формате Prometheus."""
+    label_names = ('endpoint', 'method')
+    lines = []
+    lines += request_latency.render('engles_request_duration_seconds', 'Время обработки HTTP-запроса.',
+                                    label_names)
+    lines += request_sql_queries.render('engles_request_sql_queries', 'Число SQL-запросов на HTTP-запрос.',
+                                        label_names)
+    lines += request_sql_seconds.render('engles_request_sql_seconds', 'Суммарное время SQL на HTTP-запрос.',
+                                        label_names)
+
+    slowest = statement_stats.slowest()
+    statement_labels = ('statement', 'params')
+    lines.append("# HELP engles_sql_statement_calls_total Вызовы SQL-запроса.")
+    lines.append("# TYPE engles_sql_statement_calls_total counter")
+    lines += [f"engles_sql_statement_calls_total{{{_format_labels(statement_labels, (s, shape))}}} {calls}"
+              for s, calls, total, longest, shape in slowest]
+    lines.append("# HELP engles_sql_statement_seconds_total Суммарное время SQL-запроса.")
+    lines.append("# TYPE engles_sql_statement_seconds_total counter")
+    lines += [f"engles_sql_statement_seconds_total{{{_format_labels(statement_labels, (s, shape))}}} {total}"
+              for s, calls, total, longest, shape in slowest]
+    lines.append("# HELP engles_sql_statement_max_seconds Самый долгий вызов SQL-запроса (params — его форма).")
+    lines.append("# TYPE engles_sql_statement_max_seconds gauge")
+    lines += [f"engles_sql_statement_max_seconds{{{_format_labels(statement_labels, (s, shape))}}} {longest}"
+              for s, calls, total, longest, shape in slowest]
+
+    cache_stats = get_cache_stats()
+    for metric, key, metric_type in (('engles_cache_hits_total', 'hits', 'counter'),
+                                     ('engles_cache_misses_total', 'misses', 'counter'),
+                                     ('engles_cache_entries', 'size', 'gauge')):
+        lines.append(f"# TYPE {metric} {metric_type}")
+        lines += [f'{metric}{{cache="{stats["name"]}"}} {stats[key]}' for stats in cache_stats]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_endpoint():
+    if not METRICS_ALLOW_REMOTE and request.remote_addr not in LOCAL_ADDRESSES:
+        abort(403)
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    """Подключает инструментирование к приложению: замеры запросов, SQL и маршрут /metrics."""
+    set_query_observer(record_query)
+    app.before_request(_start_request)
+    app.teardown_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
@@ -0,0 +1,102 @@
+from .quiz_service import get_answer_key_for_instance, evaluate_answers, save_attempt
+from ..config import PRACTICE_KEY_MAX_AGE
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+
+# Самопроверка (тесты в режиме practice). Страница теста получает пакет ключа ответов:
+# JSON {t: ID теста, k: {ID вопроса: [ID правильных ответов]}, n: идентификатор отправки,
+# e: срок действия}, подписанный HMAC-SHA256 на секретном ключе приложения.
+# static/js/script.js показывает результат по каждому вопросу сразу, без запросов к серверу,
+# а в конце отправляет ответы вместе с пакетом одним запросом: сервер проверяет подпись,
+# считает балл по ключу из пакета (без чтения теста из БД и кэша) и сохраняет попытку.
+# Подпись не скрывает ключ (при самопроверке ученик и так видит правильные ответы),
+# а гарантирует, что ключ выдан сервером для этого теста и не изменен. n становится
+# submission_id попытки, поэтому повторная отправка того же пакета не создает вторую попытку.
+# Экзаменационные тесты пакет не получают.
+
+BUNDLE_SALT = b'engles-practice-answer-key'
+
+
+class InvalidAnswerKeyBundle(Exception):
+    """Пакет ключа ответов поврежден, подписан другим ключом, выдан для другого теста или просрочен."""
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _signature(secret_key, payload):
+    if isinstance(secret_key, str):
+        secret_key = secret_key.encode('utf-8')
+    return hmac.new(secret_key, BUNDLE_SALT + b'.' + payload, hashlib.sha256).digest()
+
+
+def sign_answer_key(test_instance_id, answer_key, secret_key, max_age=PRACTICE_KEY_MAX_AGE):
+    """
+    Упаковывает ключ ответов {question_id: множество ID правильных ответов} в подписанный
+    пакет — строку "<данные base64url>.<подпись base64url>" для страницы теста.
+    """
+    payload = json.dumps({
+        't': test_instance_id,
+        'k': {str(question_id): sorted(answer_ids) for question_id, answer_ids in answer_key.items()},
+        'n': secrets.token_hex(16),
+        'e': int(time.time()) + int(max_age),
+    }, separators=(',', ':')).encode('utf-8')
+    return f"{_b64encode(payload)}.{_b64encode(_signature(secret_key, payload))}"
+
+
+def load_answer_key(bundle, test_instance_id, secret_key):
+    """
+    Проверяет подписанный пакет и возвращает (ключ ответов {question_id: множество ID}, submission_id).
+    Бросает InvalidAnswerKeyBundle, если пакет не прошел проверку.
+    """
+    try:
+        payload_text, signature_text = bundle.split('.')
+        payload, signature = _b64decode(payload_text), _b64decode(signature_text)
+    except (AttributeError, ValueError):
+        raise InvalidAnswerKeyBundle('некорректный формат')
+    if not hmac.compare_digest(signature, _signature(secret_key, payload)):
+        raise InvalidAnswerKeyBundle('неверная подпись')
+
+    data = json.loads(payload)
+    if data['t'] != test_instance_id:
+        raise InvalidAnswerKeyBundle('пакет выдан для другого теста')
+    if data['e'] < time.time():
+        raise InvalidAnswerKeyBundle('срок действия истек')
+    answer_key = {int(question_id): set(answer_ids) for question_id, answer_ids in data['k'].items()}
+    return answer_key, data['n']
+
+
+def create_practice_bundle(test_instance_id, secret_key):
+    """Подписанный пакет ключа ответов теста (ключ берется из замороженного содержимого) или None."""
+    answer_key = get_answer_key_for_instance(test_instance_id)
+    if not answer_key:
+        return None
+    return sign_answer_key(test_instance_id, answer_key, secret_key)
+
+
+def submit_practice_attempt(test_instance_id, bundle, user_submitted_answers, secret_key):
+    """
+    Проверяет итог самопроверки по ключу из подписанного пакета и сохраняет попытку.
+    user_submitted_answers: словарь {question_id: selected_answer_id}
+    Возвращает словарь результата (как submit_and_evaluate_test) или словарь с ключом 'error'.
+    Бросает InvalidAnswerKeyBundle, если пакет не прошел проверку.
+    """
+    answer_key, submission_id = load_answer_key(bundle, test_instance_id, secret_key)
+    evaluation = evaluate_answers(answer_key, user_submitted_answers)
+    if evaluation is None:
+        return {'error': 'Mismatch in submitted answers and actual test questions. Please answer all questions.'}
+    question_results, score, answers = evaluation
+
+    result = save_attempt(test_instance_id, score, len(answer_key), answers, submission_id=submission_id)
+    if 'error' not in result:
+        result['question_results'] = question_results
+    return result
@@ -0,0 +1,135 @@
+from ..models.database_manager import query_db
+import random
+
+# Сколько раз повторять выборку кандидатов, прежде чем перейти к полному списку ID
+MAX_SAMPLING_ROUNDS = 8
+# Максимум параметров в одном запросе IN (...) (ограничение SQLite на число переменных)
+MAX_IN_PARAMS = 500
+
+
+def _existing_ids(candidate_ids):
+    """Возвращает множество ID из candidate_ids, которые есть в таблице questions."""
+    candidate_ids = list(candidate_ids)
+    found = set()
+    for start in range(0, len(candidate_ids), MAX_IN_PARAMS):
+        chunk = candidate_ids[start:start + MAX_IN_PARAMS]
+        placeholders = ','.join('?' * len(chunk))
+        rows = query_db(f"SELECT id FROM questions WHERE id IN ({placeholders})", chunk)
+        found.update(row['id'] for row in rows)
+    return found
+
+
+def _sample_from_all_ids(k):
+    """Запасной путь: равномерная выборка по полному списку ID (O(размер банка))."""
+    all_ids = [row['id'] for row in query_db("SELECT id FROM questions")]
+    return random.sample(all_ids, min(k, len(all_ids)))
+
+
+def sample_question_ids(k):
+    """
+    Возвращает список из не более чем k случайных различных ID вопросов.
+
+    Используется выборка по диапазону rowid с отбраковкой: случайные числа из
+    [1, MAX(id)] проверяются на существование одним запросом на раунд, пропуски
+    (удаленные вопросы) отбрасываются и повторно не выбираются. Каждый
+    существующий вопрос выбирается с одинаковой вероятностью, а стоимость —
+    O(k), пока ID заполнены плотно (add_new_question заполняет пропуски).
+    Если банк слишком разрежен или в нем меньше k вопросов, используется
+    выборка по полному списку ID.
+    """
+    if k <= 0:
+        return []
+
+    row = query_db("SELECT MAX(id) AS max_id FROM questions", one=True)
+    max_id = row['max_id'] if row else None
+    if not max_id or max_id < 1:
+        return []
+    if k >= max_id:
+        return _sample_from_all_ids(k)
+
+    selected = []
+    tried = set()  # ID, которые уже проверялись (выбранные и пропуски)
+    density = 1.0  # Оценка доли существующих ID в диапазоне
+    for _ in range(MAX_SAMPLING_ROUNDS):
+        remaining = k - len(selected)
+        untried = max_id - len(tried)
+        if remaining <= 0 or untried < remaining * 2:
+            break  # Выборка собрана или диапазон почти исчерпан
+
+        want = min(untried, int(remaining / density) + 8)
+        candidates = set()
+        while len(candidates) < want:
+            candidate = random.randint(1, max_id)
+            if candidate not in tried:
+                candidates.add(candidate)
+        tried.update(candidates)
+
+        found = _existing_ids(candidates)
+        density = max(len(found) / len(candidates), 0.01)
+        # Из найденных берем случайное подмножество нужного размера
+        found = list(found)
+        random.shuffle(found)
+        selected.extend(found[:remaining])
+
+    if len(selected) < k:
+        return _sample_from_all_ids(k)
+    return selected
+
+
+def sample_question_ids_by_topic(topic_quotas):
+    """
+    Стратифицированная выборка: для каждой темы из topic_quotas ({тема: количество})
+    выбирает случайные различные вопросы этой темы.
+    Использует предвычисленный индекс topic_question_ids (плотные позиции внутри темы),
+    поэтому стоимость — O(k) обращений по первичному ключу, без сканирования банка.
+    Если в теме меньше вопросов, чем запрошено, берутся все вопросы темы.
+    Возвращает список ID вопросов.
+    """
+    selected = []
+    for topic, quota in topic_quotas.items():
+        if quota <= 0:
+            continue
+        row = query_db("SELECT question_count FROM topic_stats WHERE topic = ?", (topic,), one=True)
+        topic_count = row['question_count'] if row else 0
+        if topic_count <= 0:
+            continue
+
+        positions = random.sample(range(topic_count), min(quota, topic_count))
+        for start in range(0, len(positions), MAX_IN_PARAMS):
+            chunk = positions[start:start + MAX_IN_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            rows = query_db(f"SELECT question_id FROM topic_question_ids "
+                            f"WHERE topic = ? AND position IN ({placeholders})", [topic, *chunk])
+            selected.extend(row['question_id'] for row in rows)
+    return selected
+
+
+def allocate_by_weights(total, topic_weights, topic_counts):
+    """
+    Распределяет total вопросов между темами пропорционально весам
+    (метод наибольших остатков) с учетом количества доступных вопросов в теме.
+    topic_weights: {тема: вес}, topic_counts: {тема: доступно вопросов}.
+    Возвращает словарь {тема: количество}.
+    """
+    weights = {topic: float(weight) for topic, weight in topic_weights.items()
+               if weight > 0 and topic_counts.get(topic, 0) > 0}
+    quotas = {topic: 0 for topic in weights}
+    remaining = min(total, sum(topic_counts[topic] for topic in weights))
+
+    # Темы, которые заполнены целиком, выбывают, а их доля перераспределяется между остальными
+    while remaining > 0 and weights:
+        weight_sum = sum(weights.values())
+        shares = {topic: remaining * weight / weight_sum for topic, weight in weights.items()}
+        portions = {topic: int(share) for topic, share in shares.items()}
+        leftover = remaining - sum(portions.values())
+        for topic in sorted(shares, key=lambda t: shares[t] - portions[t], reverse=True)[:leftover]:
+            portions[topic] += 1
+
+        for topic, portion in portions.items():
+            free = topic_counts[topic] - quotas[topic]
+            granted = min(portion, free)
+            quotas[topic] += granted
+            remaining -= granted
+            if quotas[topic] >= topic_counts[topic]:
+                del weights[topic]
+    return {topic: count for topic, count in quotas.items() if count > 0}
@@ -1,92 +1,245 @@
-from ..models.database_manager import query_db, execute_db  # Используем наши обертки для БД
+from ..models.database_manager import query_db, execute_db, executemany_db, transaction  # Используем наши обертки для БД
+from .export_service import get_tests_containing_question, invalidate_test_exports
+from .cache_service import invalidate_question, bump_generation
+from ..models.question import Question, Answer, QUESTION_COLUMNS, ANSWER_COLUMNS
 import sqlite3  # Для обработки специфичных ошибок SQLite
 
+# Размер страницы списка вопросов в админке по умолчанию и максимальный
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
 
 def get_all_questions_with_details():
-    """Возвращает список всех вопросов с их темами."""
-    sql = "SELECT id, question_text, topic FROM questions ORDER BY id DESC"
-    questions_raw = query_db(sql)
-    return [dict(q) for q in questions_raw] if questions_raw else []
+    """Возвращает список всех вопросов (Question, без ответов) с их темами."""
+    sql = f"SELECT {QUESTION_COLUMNS} FROM questions ORDER BY id DESC"
+    return query_db(sql, row_factory=Question.row_factory)
+
+
+def get_questions_page(before_id=None, after_id=None, page_size=DEFAULT_PAGE_SIZE, topic=None, prefix=None):
+    """
+    Возвращает одну страницу списка вопросов (по убыванию id) с keyset-пагинацией:
+    before_id — следующая страница (вопросы с id меньше before_id),
+    after_id — предыдущая страница (вопросы с id больше after_id).
+    topic — фильтр по теме (индекс idx_questions_topic),
+    prefix — поиск по началу текста вопроса без учета регистра латиницы
+    (индекс idx_questions_text_nocase).
+    Стоимость не зависит от номера страницы и размера банка: в памяти только одна страница.
+    Возвращает словарь: questions (Question, без ответов), has_next, has_prev, first_id, last_id.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    conditions = []
+    args = []
+    if topic:
+        conditions.append("topic = ?")
+        args.append(topic)
+    if prefix:
+        # Диапазон [prefix, prefix + максимальный символ) — то же, что LIKE 'prefix%', но по индексу
+        conditions.append("question_text >= ? COLLATE NOCASE AND question_text < ? COLLATE NOCASE")
+        args.extend([prefix, prefix + '\U0010ffff'])
+
+    backwards = after_id is not None and before_id is None
+    if backwards:
+        conditions.append("id > ?")
+        args.append(after_id)
+    elif before_id is not None:
+        conditions.append("id < ?")
+        args.append(before_id)
+
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order_sql = "ORDER BY id ASC" if backwards else "ORDER BY id DESC"
+    # Запрашиваем на одну строку больше, чтобы узнать, есть ли следующая страница
+    sql = f"SELECT {QUESTION_COLUMNS} FROM questions {where_sql} {order_sql} LIMIT ?"
+    questions = query_db(sql, (*args, page_size + 1), row_factory=Question.row_factory)
+
+    has_more = len(questions) > page_size
+    del questions[page_size:]
+    if backwards:
+        questions.reverse()
+
+    return {
+        'questions': questions,
+        'has_next': has_more if not backwards else True,
+        'has_prev': (before_id is not None) if not backwards else has_more,
+        'first_id': questions[0].id if questions else None,
+        'last_id': questions[-1].id if questions else None,
+    }
+
+
+def _build_fts_query(search_text):
+    """
+    Превращает пользовательский ввод в запрос FTS5: каждое слово ищется как префикс,
+    все слова должны присутствовать. Кавычки и операторы FTS5 из ввода не используются,
+    поэтому синтаксических ошибок MATCH не бывает.
+    """
+    words = [word.replace('"', '') for word in search_text.split()]
+    return ' '.join(f'"{word}"*' for word in words if word)
+
+
+def search_questions(search_text, page=1, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Полнотекстовый поиск по тексту вопросов, темам и текстам ответов (индекс FTS5 questions_fts).
+    Результаты упорядочены по релевантности (bm25), page нумеруется с 1.
+    Возвращает словарь: questions (Question, без ответов), page, has_next.
+    """
+    page = max(1, int(page))
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    fts_query = _build_fts_query(search_text or '')
+    if not fts_query:
+        return {'questions': [], 'page': page, 'has_next': False}
+
+    sql = """
+    SELECT q.id, q.question_text, q.topic
+    FROM questions_fts
+    JOIN questions q ON q.id = questions_fts.rowid
+    WHERE questions_fts MATCH ?
+    ORDER BY bm25(questions_fts)
+    LIMIT ? OFFSET ?
+    """
+    questions = query_db(sql, (fts_query, page_size + 1, (page - 1) * page_size), row_factory=Question.row_factory)
+    has_next = len(questions) > page_size
+    del questions[page_size:]
+    return {
+        'questions': questions,
+        'page': page,
+        'has_next': has_next,
+    }
 
 
 def get_question_by_id_with_answers(question_id):
-    """Возвращает один вопрос по ID вместе с его вариантами ответов."""
-    question_sql = "SELECT * FROM questions WHERE id = ?"
-    question_raw = query_db(question_sql, (question_id,), one=True)
+    """Возвращает один вопрос по ID (Question) вместе с его вариантами ответов (Answer) или None."""
+    question_sql = f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = ?"
+    question = query_db(question_sql, (question_id,), one=True, row_factory=Question.row_factory)
 
-    if not question_raw:
+    if not question:
         return None
 
-    answers_sql = "SELECT * FROM answers WHERE question_id = ? ORDER BY id"
-    answers_raw = query_db(answers_sql, (question_id,))
+    answers_sql = f"SELECT {ANSWER_COLUMNS} FROM answers WHERE question_id = ? ORDER BY id"
+    question.answers = query_db(answers_sql, (question_id,), row_factory=Answer.row_factory)
+    return question
+
 
-    question_dict = dict(question_raw)
-    question_dict['answers'] = [dict(ans) for ans in answers_raw] if answers_raw else []
-    return question_dict
+def allocate_question_ids(count=1):
+    """
+    Возвращает count минимальных свободных положительных ID для вставки в поле id
+    (по возрастанию). Пропуски берутся из таблицы free_question_ids, которую
+    поддерживают триггеры на questions, остальные ID — после MAX(id); оба запроса
+    идут по индексу, т.е. O(log n) на ID.
+    Вызывать внутри transaction(immediate=True) и вставлять вопросы в той же
+    транзакции: блокировка записи не даст другому запросу или процессу получить
+    те же ID.
+    """
+    free_rows = query_db("SELECT id FROM free_question_ids ORDER BY id LIMIT ?", (count,))
+    ids = [row['id'] for row in free_rows]
+    if len(ids) < count:
+        row = query_db("SELECT MAX(id) AS max_id FROM questions", one=True)
+        next_id = max((row['max_id'] or 0) if row else 0, ids[-1] if ids else 0) + 1
+        ids.extend(range(next_id, next_id + count - len(ids)))
+    return ids
 
 
 def get_min_free_id():
     """
     Возвращает минимальное свободное положительное число для вставки в поле id.
-    Если таблица пуста — возвращает 1.
+    Если таблица пуста — возвращает 1. См. allocate_question_ids.
     """
-    sql = """
-    SELECT 
-        COALESCE(
-            (SELECT MIN(t.id + 1) 
-             FROM questions t 
-             LEFT JOIN questions t2 ON t2.id = t.id + 1 
-             WHERE t2.id IS NULL),
-            1
-        ) AS free_id
-    """
-    row = query_db(sql, one=True)
-    return row['free_id'] if row else 1
+    return allocate_question_ids(1)[0]
 
 def add_new_question(question_text, topic, answers_data):
     """
     Добавляет новый вопрос и его ответы, используя минимальный свободный ID.
+    Вопрос и все ответы записываются одной транзакцией.
     """
     if not question_text or len(answers_data) < 2:
         return None
 
     try:
-        min_id = get_min_free_id()
-        # ВАЖНО: Поле id в таблице questions НЕ ДОЛЖНО быть AUTOINCREMENT.
-        question_id = execute_db("INSERT INTO questions (id, question_text, topic) VALUES (?, ?, ?)",
-                                 (min_id, question_text, topic if topic else None))
-        if question_id:
-            for ans_data in answers_data:
-                execute_db("INSERT INTO answers (question_id, answer_text, is_correct) VALUES (?, ?, ?)",
-                           (min_id, ans_data['text'], ans_data['is_correct']))
-            return min_id
+        with transaction(immediate=True):
+            min_id = get_min_free_id()
+            # ВАЖНО: Поле id в таблице questions НЕ ДОЛЖНО быть AUTOINCREMENT.
+            execute_db("INSERT INTO questions (id, question_text, topic) VALUES (?, ?, ?)",
+                       (min_id, question_text, topic if topic else None))
+            executemany_db("INSERT INTO answers (question_id, answer_text, is_correct) VALUES (?, ?, ?)",
+                           [(min_id, ans_data['text'], ans_data['is_correct']) for ans_data in answers_data])
+        return min_id
     except sqlite3.Error as e:
         print(f"Ошибка в question_service.add_new_question: {e}")
         return None
-    return None
+
+
+def _diff_answers(old_answers, new_answers_data):
+    """
+    Сопоставляет старые ответы вопроса (Answer) с новыми, чтобы сохранить ID ответов.
+    Новый ответ сопоставляется со старым: по 'id' (если передан и принадлежит вопросу),
+    затем по совпадающему тексту, затем — только если ID не переданы ни для одного
+    ответа — по порядку среди оставшихся (исправление опечатки сохраняет ID).
+    Возвращает (updates [(text, is_correct, id)], inserts [(text, is_correct)], deletes [id]);
+    в updates попадают только действительно изменившиеся ответы.
+    """
+    old_by_id = {ans.id: ans for ans in old_answers}
+    matched = {}  # индекс нового ответа -> старый ответ
+    for index, ans_data in enumerate(new_answers_data):
+        old = old_by_id.get(ans_data.get('id'))
+        if old is not None:
+            matched[index] = old_by_id.pop(old.id)
+    for index, ans_data in enumerate(new_answers_data):
+        if index in matched:
+            continue
+        old = next((ans for ans in old_by_id.values() if ans.answer_text == ans_data['text']), None)
+        if old is not None:
+            matched[index] = old_by_id.pop(old.id)
+    remaining = list(old_by_id.values())  # В порядке ID
+    if not any(ans_data.get('id') for ans_data in new_answers_data):
+        for index in range(len(new_answers_data)):
+            if index not in matched and remaining:
+                matched[index] = remaining.pop(0)
+
+    updates, inserts = [], []
+    for index, ans_data in enumerate(new_answers_data):
+        is_correct = 1 if ans_data['is_correct'] else 0
+        old = matched.get(index)
+        if old is None:
+            inserts.append((ans_data['text'], is_correct))
+        elif old.answer_text != ans_data['text'] or old.is_correct != is_correct:
+            updates.append((ans_data['text'], is_correct, old.id))
+    return updates, inserts, [ans.id for ans in remaining]
 
 
 def update_existing_question(question_id, question_text, topic, new_answers_data):
     """
     Обновляет существующий вопрос и его ответы.
-    new_answers_data: полный новый список ответов для этого вопроса.
+    new_answers_data: полный новый список ответов для этого вопроса
+    (словари text, is_correct и, для существующих ответов, id).
+    Ответы не пересоздаются: выполняются только нужные UPDATE/INSERT/DELETE (см. _diff_answers),
+    поэтому ID ответов не меняются и уже открытые тесты и история попыток остаются корректными.
+    Все изменения выполняются одной транзакцией.
     Возвращает True в случае успеха, False в случае ошибки.
     """
     if not question_text or len(new_answers_data) < 2:
         return False
 
     try:
-        # Обновляем сам вопрос
-        execute_db("UPDATE questions SET question_text = ?, topic = ? WHERE id = ?",
-                   (question_text, topic if topic else None, question_id))
-
-        # Удаляем старые ответы
-        execute_db("DELETE FROM answers WHERE question_id = ?", (question_id,))
-
-        # Добавляем новые ответы
-        for ans_data in new_answers_data:
-            execute_db("INSERT INTO answers (question_id, answer_text, is_correct) VALUES (?, ?, ?)",
-                       (question_id, ans_data['text'], ans_data['is_correct']))
+        with transaction(immediate=True):
+            # Обновляем сам вопрос, только если он изменился (иначе триггеры тем и поиска срабатывают зря)
+            execute_db("UPDATE questions SET question_text = ?, topic = ? "
+                       "WHERE id = ? AND (question_text IS NOT ? OR topic IS NOT ?)",
+                       (question_text, topic if topic else None, question_id,
+                        question_text, topic if topic else None))
+            old_answers = query_db(f"SELECT {ANSWER_COLUMNS} FROM answers WHERE question_id = ? ORDER BY id",
+                                   (question_id,), row_factory=Answer.row_factory)
+            updates, inserts, deletes = _diff_answers(old_answers, new_answers_data)
+            if deletes:
+                executemany_db("DELETE FROM answers WHERE id = ?", [(answer_id,) for answer_id in deletes])
+            if updates:
+                executemany_db("UPDATE answers SET answer_text = ?, is_correct = ? WHERE id = ?", updates)
+            if inserts:
+                executemany_db("INSERT INTO answers (question_id, answer_text, is_correct) VALUES (?, ?, ?)",
+                               [(question_id, text, is_correct) for text, is_correct in inserts])
+                # Триггеры счетчика поколений на вставку ответов не срабатывают: если текст и тема
+                # не менялись, без этого другие процессы продолжили бы отдавать вопрос из кэша
+                bump_generation()
+        # Кэш вопроса и сохраненные DOCX-версии тестов с этим вопросом устарели
+        invalidate_question(question_id)
+        invalidate_test_exports(get_tests_containing_question(question_id))
         return True
     except sqlite3.Error as e:
         print(f"Ошибка в question_service.update_existing_question: {e}")
@@ -99,8 +252,12 @@ def delete_question_by_id(question_id):
     Возвращает True в случае успеха, False в случае ошибки.
     """
     try:
+        # Тесты с этим вопросом нужно узнать до удаления: каскад удалит записи в test_questions
+        affected_test_ids = get_tests_containing_question(question_id)
         # ON DELETE CASCADE в схеме должен удалить связанные ответы и записи в test_questions
         execute_db("DELETE FROM questions WHERE id = ?", (question_id,))
+        invalidate_question(question_id, deleted=True)
+        invalidate_test_exports(affected_test_ids)
         return True
     except sqlite3.Error as e:
         print(f"Ошибка в question_service.delete_question_by_id: {e}")
@@ -108,6 +265,12 @@ def delete_question_by_id(question_id):
 
 
 def count_total_questions():
-    """Возвращает общее количество вопросов в базе."""
-    result = query_db("SELECT COUNT(id) as count FROM questions", one=True)
-    return result['count'] if result else 0
\ No newline at end of file
+    """Возвращает общее количество вопросов в базе (из счетчика question_stats, без COUNT по таблице)."""
+    result = query_db("SELECT question_count AS count FROM question_stats WHERE id = 1", one=True)
+    return result['count'] if result else 0
+
+
+def get_topics_with_counts():
+    """Возвращает список тем с количеством вопросов в каждой (из предвычисленной таблицы topic_stats)."""
+    topics_raw = query_db("SELECT topic, question_count FROM topic_stats ORDER BY topic")
+    return [dict(t) for t in topics_raw] if topics_raw else []
\ No newline at end of file
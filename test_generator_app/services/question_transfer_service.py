@@ -0,0 +1,223 @@
+from ..models.database_manager import query_db, executemany_db, transaction
+from ..models.question import Question, Answer, QUESTION_COLUMNS, ANSWER_COLUMNS
+from ..config import IMPORT_BATCH_SIZE
+from .question_service import allocate_question_ids
+import csv
+import io
+import json
+import sqlite3
+
+# Форматы файлов с вопросами:
+# - JSON Lines: по объекту на строку
+#   {"question_text": "...", "topic": "...", "answers": [{"text": "...", "is_correct": true}, ...]}
+# - CSV: колонки question_text, topic, correct (номера правильных ответов с 1 через ';', например 1;3),
+#   answer_1, answer_2, ...
+SUPPORTED_FORMATS = ('csv', 'jsonl')
+
+# Разделитель номеров правильных ответов в колонке correct CSV
+CSV_CORRECT_SEPARATOR = ';'
+
+# Сколько отклоненных строк хранить в отчете (остальные только считаются)
+MAX_REPORTED_REJECTS = 1000
+
+
+def detect_format(filename, default='jsonl'):
+    """Определяет формат по расширению файла."""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return default
+
+
+def _is_true(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'да', '+')
+    return bool(value)
+
+
+def _iter_jsonl_records(text_stream):
+    """Генератор (номер строки, запись или текст ошибки) для JSON Lines."""
+    for line_no, line in enumerate(text_stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            yield line_no, f"некорректный JSON: {e}"
+            continue
+        if not isinstance(item, dict):
+            yield line_no, "ожидался JSON-объект"
+            continue
+        answers = item.get('answers') or []
+        if not isinstance(answers, list):
+            yield line_no, "поле answers должно быть списком"
+            continue
+        yield line_no, {
+            'question_text': str(item.get('question_text') or '').strip(),
+            'topic': str(item.get('topic') or '').strip(),
+            'answers': [{'text': str(ans.get('text') or '').strip(), 'is_correct': 1 if _is_true(ans.get('is_correct')) else 0}
+                        for ans in answers if isinstance(ans, dict)],
+        }
+
+
+def _iter_csv_records(text_stream):
+    """Генератор (номер строки, запись или текст ошибки) для CSV."""
+    reader = csv.DictReader(text_stream)
+    answer_columns = sorted((name for name in (reader.fieldnames or []) if name.startswith('answer_')),
+                            key=lambda name: int(name[len('answer_'):]) if name[len('answer_'):].isdigit() else 0)
+    for row in reader:
+        line_no = reader.line_num
+        try:
+            correct_indexes = {int(part) - 1 for part in (row.get('correct') or '').split(CSV_CORRECT_SEPARATOR)}
+        except ValueError:
+            yield line_no, "в колонке correct должны быть номера правильных ответов через ';'"
+            continue
+        answers = []
+        for column_index, column in enumerate(answer_columns):
+            text = (row.get(column) or '').strip()
+            if text:
+                answers.append({'text': text, 'is_correct': 1 if column_index in correct_indexes else 0})
+        yield line_no, {
+            'question_text': (row.get('question_text') or '').strip(),
+            'topic': (row.get('topic') or '').strip(),
+            'answers': answers,
+        }
+
+
+def _validate_record(record):
+    """Возвращает текст ошибки или None, если запись можно импортировать."""
+    if not record['question_text']:
+        return "пустой текст вопроса"
+    if len(record['answers']) < 2:
+        return "меньше двух вариантов ответа"
+    if any(not ans['text'] for ans in record['answers']):
+        return "пустой текст ответа"
+    if not any(ans['is_correct'] for ans in record['answers']):
+        return "не отмечен правильный ответ"
+    return None
+
+
+def _insert_batch(records):
+    """Вставляет пачку вопросов с ответами одной транзакцией."""
+    with transaction(immediate=True):
+        question_ids = allocate_question_ids(len(records))
+        executemany_db("INSERT INTO questions (id, question_text, topic) VALUES (?, ?, ?)",
+                       [(question_id, record['question_text'], record['topic'] or None)
+                        for question_id, record in zip(question_ids, records)])
+        executemany_db("INSERT INTO answers (question_id, answer_text, is_correct) VALUES (?, ?, ?)",
+                       [(question_id, ans['text'], ans['is_correct'])
+                        for question_id, record in zip(question_ids, records)
+                        for ans in record['answers']])
+
+
+def import_questions(text_stream, file_format, batch_size=IMPORT_BATCH_SIZE, progress_callback=None):
+    """
+    Потоково импортирует вопросы из текстового потока в формате CSV или JSON Lines.
+    Строки разбираются по одной, проверяются и вставляются пачками по batch_size
+    (одна транзакция на пачку), так что память не зависит от размера файла.
+    progress_callback(report) вызывается после каждой пачки.
+    Возвращает отчет: processed, imported, rejected, rejects — список (номер строки, причина).
+    """
+    if file_format not in SUPPORTED_FORMATS:
+        raise ValueError(f"Неподдерживаемый формат: {file_format}")
+    records = _iter_csv_records(text_stream) if file_format == 'csv' else _iter_jsonl_records(text_stream)
+    report = {'processed': 0, 'imported': 0, 'rejected': 0, 'rejects': []}
+
+    def reject(line_no, reason):
+        report['rejected'] += 1
+        if len(report['rejects']) < MAX_REPORTED_REJECTS:
+            report['rejects'].append((line_no, reason))
+
+    def flush(batch):
+        try:
+            _insert_batch([record for _, record in batch])
+            report['imported'] += len(batch)
+        except sqlite3.Error as e:
+            print(f"Ошибка в question_transfer_service.import_questions: {e}")
+            for line_no, _ in batch:
+                reject(line_no, f"ошибка записи в БД: {e}")
+        if progress_callback:
+            progress_callback(report)
+
+    batch = []
+    try:
+        for line_no, record in records:
+            report['processed'] += 1
+            error = record if isinstance(record, str) else _validate_record(record)
+            if error:
+                reject(line_no, error)
+                continue
+            batch.append((line_no, record))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    except (csv.Error, UnicodeDecodeError) as e:
+        reject(report['processed'] + 1, f"файл не удалось прочитать: {e}")
+    if batch:
+        flush(batch)
+    return report
+
+
+def _iter_questions_with_answers(batch_size):
+    """
+    Генератор всех вопросов (Question с заполненными answers) по возрастанию id.
+    Читает пачками по batch_size с keyset-пагинацией: два запроса на пачку.
+    """
+    last_id = 0
+    while True:
+        questions = query_db(f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id > ? ORDER BY id LIMIT ?",
+                             (last_id, batch_size), row_factory=Question.row_factory)
+        if not questions:
+            return
+        first_id, last_id = questions[0].id, questions[-1].id
+        by_id = {question.id: question for question in questions}
+        for ans in query_db(f"SELECT {ANSWER_COLUMNS} FROM answers "
+                            "WHERE question_id BETWEEN ? AND ? ORDER BY question_id, id", (first_id, last_id),
+                            row_factory=Answer.row_factory):
+            by_id[ans.question_id].answers.append(ans)
+        yield from questions
+
+
+def export_questions(file_format, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Генератор строк файла со всеми вопросами банка в формате CSV или JSON Lines
+    (тот же формат, что принимает import_questions). Вопросы читаются пачками,
+    поэтому память не зависит от размера банка.
+    """
+    if file_format not in SUPPORTED_FORMATS:
+        raise ValueError(f"Неподдерживаемый формат: {file_format}")
+
+    if file_format == 'jsonl':
+        for question in _iter_questions_with_answers(batch_size):
+            yield json.dumps({
+                'question_text': question.question_text,
+                'topic': question.topic or '',
+                'answers': [{'text': ans.answer_text, 'is_correct': bool(ans.is_correct)} for ans in question.answers],
+            }, ensure_ascii=False) + '\n'
+        return
+
+    # Для CSV число колонок ответов должно быть известно заранее
+    row = query_db("SELECT MAX(answer_count) AS max_answers FROM "
+                   "(SELECT COUNT(*) AS answer_count FROM answers GROUP BY question_id)", one=True)
+    max_answers = max(2, (row['max_answers'] or 0) if row else 0)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    writer.writerow(['question_text', 'topic', 'correct'] + [f'answer_{i}' for i in range(1, max_answers + 1)])
+    yield take()
+    for question in _iter_questions_with_answers(batch_size):
+        correct = CSV_CORRECT_SEPARATOR.join(str(index) for index, ans in enumerate(question.answers, start=1)
+                                             if ans.is_correct)
+        writer.writerow([question.question_text, question.topic or '', correct]
+                        + [ans.answer_text for ans in question.answers])
+        yield take()
@@ -1,95 +1,271 @@
-from ..models.database_manager import query_db, execute_db
+from ..models.database_manager import query_db, execute_db, executemany_db, transaction
+from .question_sampler import sample_question_ids, sample_question_ids_by_topic, allocate_by_weights, MAX_IN_PARAMS
+from .cache_service import question_cache, test_cache, check_generation
+from .attempt_writer import record_attempt, AttemptQueueFullError
+from .analytics_service import attempt_answer_rows, SQL_INSERT_ATTEMPT_ANSWER
+from ..models.question import Question, Answer
+from ..config import ATTEMPT_WRITE_BEHIND
+import json
 import random
 import sqlite3
+import zlib
 
+# Версия формата замороженного содержимого теста (generated_tests.frozen_content)
+FROZEN_CONTENT_VERSION = 1
 
-def generate_new_test_instance(num_questions_to_generate):
+# Режимы теста (generated_tests.mode): экзамен — ключ ответов не покидает сервер,
+# самопроверка — страница теста получает подписанный ключ (см. practice_service)
+TEST_MODE_EXAM = 'exam'
+TEST_MODE_PRACTICE = 'practice'
+TEST_MODES = (TEST_MODE_EXAM, TEST_MODE_PRACTICE)
+
+
+def generate_new_test_instance(num_questions_to_generate, topic_quotas=None, mode=TEST_MODE_EXAM):
     """
-    Генерирует новый экземпляр теста:
-    1. Выбирает случайные вопросы.
-    2. Создает запись в generated_tests.
+    Генерирует новый экземпляр теста в режиме mode (TEST_MODE_EXAM или TEST_MODE_PRACTICE):
+    1. Выбирает случайные вопросы (из всего банка или по квотам тем
+       topic_quotas = {тема: количество}; тогда num_questions_to_generate не используется).
+    2. Создает запись в generated_tests с замороженным содержимым теста: порядок вопросов,
+       порядок ответов и ключ ответов упакованы в frozen_content (см. pack_test_content).
     3. Создает связи в test_questions.
+    Шаги 2 и 3 выполняются одной транзакцией.
     Возвращает ID нового экземпляра теста или None в случае ошибки.
     """
-    all_question_ids_raw = query_db("SELECT id FROM questions")
-    if not all_question_ids_raw:
-        return None  # Нет вопросов для генерации
-
-    all_question_ids = [q['id'] for q in all_question_ids_raw]
-
-    if num_questions_to_generate <= 0:
+    if topic_quotas:
+        # Стратифицированная выборка по предвычисленному индексу тем
+        selected_question_ids = sample_question_ids_by_topic(topic_quotas)
+    elif num_questions_to_generate > 0:
+        # Выборка за O(k), без загрузки всех ID вопросов
+        selected_question_ids = sample_question_ids(num_questions_to_generate)
+    else:
         return None  # Некорректное количество
 
-    actual_num_to_select = min(num_questions_to_generate, len(all_question_ids))
+    actual_num_to_select = len(selected_question_ids)
     if actual_num_to_select == 0:
-        return None
+        return None  # Нет вопросов для генерации
 
-    selected_question_ids = random.sample(all_question_ids, actual_num_to_select)
+    frozen_content = pack_test_content(_build_test_snapshot(selected_question_ids, random))
 
     try:
-        test_instance_id = execute_db("INSERT INTO generated_tests (num_questions) VALUES (?)",
-                                      (actual_num_to_select,))
-        if test_instance_id:
-            for q_id in selected_question_ids:
-                execute_db("INSERT INTO test_questions (test_id, question_id) VALUES (?, ?)",
-                           (test_instance_id, q_id))
-            return test_instance_id
+        with transaction():
+            test_instance_id = execute_db("INSERT INTO generated_tests (num_questions, frozen_content, mode) "
+                                          "VALUES (?, ?, ?)", (actual_num_to_select, frozen_content, mode))
+            executemany_db("INSERT INTO test_questions (test_id, question_id) VALUES (?, ?)",
+                           [(test_instance_id, q_id) for q_id in selected_question_ids])
+        return test_instance_id
     except sqlite3.Error as e:
         print(f"Ошибка в quiz_service.generate_new_test_instance: {e}")
         return None
-    return None
 
 
-def get_test_questions_for_instance(test_instance_id):
+def generate_test_variants(num_variants, num_questions_to_generate, topic_quotas=None):
     """
-    Получает все вопросы и варианты ответов для данного экземпляра теста.
+    Генерирует num_variants экземпляров теста (например, комплект вариантов для класса).
+    Возвращает список ID созданных тестов (пустой, если вопросов нет).
+    """
+    test_instance_ids = []
+    for _ in range(num_variants):
+        test_instance_id = generate_new_test_instance(num_questions_to_generate, topic_quotas=topic_quotas)
+        if not test_instance_id:
+            break
+        test_instance_ids.append(test_instance_id)
+    return test_instance_ids
+
+
+def allocate_topic_quotas(total_questions, topic_weights):
+    """
+    Переводит веса тем ({тема: вес}) в квоты ({тема: количество}) для теста
+    из total_questions вопросов с учетом числа доступных вопросов в каждой теме.
+    """
+    topic_counts = {row['topic']: row['question_count']
+                    for row in query_db("SELECT topic, question_count FROM topic_stats")}
+    return allocate_by_weights(total_questions, topic_weights, topic_counts)
+
+
+def _load_questions(question_ids):
+    """
+    Возвращает словарь {question_id: (id, question_text, topic, ((answer_id, answer_text, is_correct), ...))}.
+    Вопросы, которых нет в кэше, загружаются двумя запросами и кэшируются.
+    """
+    check_generation()
+    questions = question_cache.get_many(question_ids)
+    missing_ids = [q_id for q_id in question_ids if q_id not in questions]
+
+    for start in range(0, len(missing_ids), MAX_IN_PARAMS):
+        chunk = missing_ids[start:start + MAX_IN_PARAMS]
+        placeholders = ','.join('?' * len(chunk))
+        answers_by_question = {}
+        for ans in query_db(f"SELECT id, question_id, answer_text, is_correct FROM answers "
+                            f"WHERE question_id IN ({placeholders}) ORDER BY id", chunk):
+            answers_by_question.setdefault(ans['question_id'], []).append(
+                (ans['id'], ans['answer_text'], ans['is_correct']))
+        for q in query_db(f"SELECT id, question_text, topic FROM questions WHERE id IN ({placeholders})", chunk):
+            payload = (q['id'], q['question_text'], q['topic'], tuple(answers_by_question.get(q['id'], ())))
+            question_cache.put(q['id'], payload)
+            questions[q['id']] = payload
+    return questions
+
+
+def _build_test_snapshot(question_ids, rng):
     """
-    # Проверяем, существует ли тест
-    test_instance = query_db("SELECT id FROM generated_tests WHERE id = ?", (test_instance_id,), one=True)
+    Собирает содержимое теста из текущих вопросов: кортеж вопросов в формате _load_questions
+    с базовым порядком вопросов и ответов, перемешанным генератором rng.
+    """
+    questions = _load_questions(question_ids)
+    snapshot = []
+    for q_id in sorted(questions):
+        q_id, question_text, topic, answers = questions[q_id]
+        answers = list(answers)
+        rng.shuffle(answers)
+        snapshot.append((q_id, question_text, topic, tuple(answers)))
+    rng.shuffle(snapshot)
+    return tuple(snapshot)
+
+
+def pack_test_content(snapshot):
+    """Упаковывает содержимое теста в компактный blob (JSON, сжатый zlib)."""
+    payload = [FROZEN_CONTENT_VERSION, [[q_id, text, topic, [list(ans) for ans in answers]]
+                                        for q_id, text, topic, answers in snapshot]]
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def unpack_test_content(blob):
+    """Распаковывает blob из pack_test_content обратно в кортеж вопросов."""
+    version, questions = json.loads(zlib.decompress(blob).decode('utf-8'))
+    if version != FROZEN_CONTENT_VERSION:
+        raise ValueError(f"Неизвестная версия содержимого теста: {version}")
+    return tuple((q_id, text, topic, tuple(tuple(ans) for ans in answers))
+                 for q_id, text, topic, answers in questions)
+
+
+def _load_test_snapshot(test_instance_id):
+    """
+    Возвращает замороженное содержимое экземпляра теста: одно чтение generated_tests
+    по первичному ключу (или кэш процесса). None — тест не найден.
+    Тесты, созданные до появления frozen_content, замораживаются при первом обращении.
+    """
+    check_generation()
+    snapshot = test_cache.get(test_instance_id)
+    if snapshot is not None:
+        return snapshot
+
+    test_instance = query_db("SELECT frozen_content FROM generated_tests WHERE id = ?", (test_instance_id,), one=True)
     if not test_instance:
         return None  # Тест не найден
 
-    sql_get_questions = """
-    SELECT q.id, q.question_text, q.topic
-    FROM questions q
-    JOIN test_questions tq ON q.id = tq.question_id
-    WHERE tq.test_id = ?
-    ORDER BY RANDOM() 
+    if test_instance['frozen_content'] is not None:
+        snapshot = unpack_test_content(test_instance['frozen_content'])
+    else:
+        rows = query_db("SELECT question_id FROM test_questions WHERE test_id = ?", (test_instance_id,))
+        snapshot = _build_test_snapshot([row['question_id'] for row in rows], random.Random(test_instance_id))
+        try:
+            execute_db("UPDATE generated_tests SET frozen_content = ? WHERE id = ?",
+                       (pack_test_content(snapshot), test_instance_id))
+        except sqlite3.Error as e:
+            # Не страшно: тест будет заморожен при следующем обращении
+            print(f"Ошибка в quiz_service._load_test_snapshot: {e}")
+
+    test_cache.put(test_instance_id, snapshot)
+    return snapshot
+
+
+def refresh_frozen_answer_keys(question_ids, batch_size=MAX_IN_PARAMS):
+    """
+    Переносит текущий ключ ответов (is_correct) вопросов question_ids в замороженное
+    содержимое всех тестов с этими вопросами, чтобы новые отправки проверялись по
+    исправленному ключу. Тексты вопросов в тестах не меняются. Ответы сопоставляются
+    по ID, поэтому ответы, которых в вопросе больше нет, остаются как были.
+    Тесты обрабатываются пачками по batch_size, по транзакции на пачку.
+    Возвращает число обновленных тестов.
     """
-    questions_raw = query_db(sql_get_questions, (test_instance_id,))
+    question_ids = list(question_ids)
+    if not question_ids:
+        return 0
+    placeholders = ','.join('?' * len(question_ids))
+    answer_key = {}  # {question_id: {answer_id: is_correct}}
+    for ans in query_db(f"SELECT id, question_id, is_correct FROM answers WHERE question_id IN ({placeholders})",
+                        question_ids):
+        answer_key.setdefault(ans['question_id'], {})[ans['id']] = ans['is_correct']
+    test_ids = [row['test_id'] for row in query_db(
+        f"SELECT DISTINCT test_id FROM test_questions WHERE question_id IN ({placeholders})", question_ids)]
 
-    if not questions_raw:
-        return []  # Нет вопросов для этого теста (маловероятно, если тест создан)
+    refreshed = 0
+    for start in range(0, len(test_ids), batch_size):
+        chunk = test_ids[start:start + batch_size]
+        updates = []
+        for test in query_db(f"SELECT id, frozen_content FROM generated_tests "
+                             f"WHERE id IN ({','.join('?' * len(chunk))}) AND frozen_content IS NOT NULL", chunk):
+            snapshot = unpack_test_content(test['frozen_content'])
+            new_snapshot = tuple(
+                (q_id, text, topic,
+                 tuple((ans_id, ans_text, answer_key[q_id].get(ans_id, is_correct)) for ans_id, ans_text, is_correct
+                       in answers) if q_id in answer_key else answers)
+                for q_id, text, topic, answers in snapshot)
+            if new_snapshot != snapshot:
+                updates.append((pack_test_content(new_snapshot), test['id']))
+        if updates:
+            with transaction():
+                executemany_db("UPDATE generated_tests SET frozen_content = ? WHERE id = ?", updates)
+                # Кэши составов тестов в других процессах сбрасываются по счетчику поколений
+                execute_db("UPDATE cache_generation SET generation = generation + 1 WHERE id = 1")
+            for _, test_id in updates:
+                test_cache.invalidate(test_id)
+            refreshed += len(updates)
+    return refreshed
 
+
+def get_test_questions_for_instance(test_instance_id, shuffle_seed=None):
+    """
+    Получает все вопросы и варианты ответов для данного экземпляра теста.
+    Содержимое теста заморожено при генерации (одно чтение по первичному ключу или кэш),
+    поверх его базового порядка применяется перемешивание генератором с зерном shuffle_seed:
+    одинаковый seed всегда дает одинаковый порядок (страница попытки, проверка, DOCX).
+    Без shuffle_seed используется случайное зерно.
+    Возвращает список Question с ответами Answer; ключ ответов не передается (is_correct = None).
+    """
+    snapshot = _load_test_snapshot(test_instance_id)
+    if snapshot is None:
+        return None  # Тест не найден
+
+    rng = random.Random(shuffle_seed)
     questions_with_answers = []
-    for q_raw in questions_raw:
-        question_dict = dict(q_raw)
-        answers_raw = query_db("SELECT id, answer_text FROM answers WHERE question_id = ? ORDER BY RANDOM()",
-                               (question_dict['id'],))
-        question_dict['answers'] = [dict(ans_raw) for ans_raw in answers_raw] if answers_raw else []
-        questions_with_answers.append(question_dict)
+    for q_id, question_text, topic, answers in snapshot:
+        answers = [Answer(ans_id, q_id, ans_text) for ans_id, ans_text, _ in answers]
+        rng.shuffle(answers)
+        questions_with_answers.append(Question(q_id, question_text, topic, answers))
 
-    return questions_with_answers
+    rng.shuffle(questions_with_answers)
+    return questions_with_answers  # Пустой список, если в тесте нет вопросов
 
 
-def submit_and_evaluate_test(test_instance_id, user_submitted_answers):
+def get_test_mode(test_instance_id):
+    """Возвращает режим экземпляра теста (TEST_MODE_EXAM или TEST_MODE_PRACTICE) или None, если теста нет."""
+    row = query_db("SELECT mode FROM generated_tests WHERE id = ?", (test_instance_id,), one=True)
+    return row['mode'] if row else None
+
+
+def get_answer_key_for_instance(test_instance_id):
     """
-    Проверяет ответы пользователя, сохраняет попытку и возвращает результат.
-    user_submitted_answers: словарь {question_id: selected_answer_id}
-    Возвращает словарь с результатами или None в случае ошибки.
+    Возвращает ключ ответов экземпляра теста: словарь {question_id: множество ID правильных ответов}.
+    Берется из замороженного содержимого теста, поэтому не требует запросов к вопросам и ответам.
+    Пустой словарь, если тест не найден или в нем нет вопросов.
     """
-    test_instance = query_db("SELECT id, num_questions FROM generated_tests WHERE id = ?",
-                             (test_instance_id,), one=True)
-    if not test_instance:
-        return {'error': 'Test instance not found.'}
+    snapshot = _load_test_snapshot(test_instance_id)
+    if not snapshot:
+        return {}
+    return {q_id: {ans_id for ans_id, _, is_correct in answers if is_correct}
+            for q_id, _, _, answers in snapshot}
 
-    # Получаем ID вопросов, которые действительно были в этом тесте
-    test_question_ids_raw = query_db("SELECT question_id FROM test_questions WHERE test_id = ?",
-                                     (test_instance_id,))
-    if not test_question_ids_raw:
-        return {'error': 'No questions found for this test instance.'}
 
-    actual_test_question_ids = {tq['question_id'] for tq in test_question_ids_raw}
+def evaluate_answers(answer_key, user_submitted_answers):
+    """
+    Проверяет ответы пользователя по ключу {question_id: множество ID правильных ответов}.
+    user_submitted_answers: словарь {question_id: selected_answer_id}
+    Возвращает (question_results {question_id: True/False}, score, answers) или None,
+    если ответы не соответствуют вопросам теста. answers — [(question_id, selected_answer_id,
+    is_correct)] для сохранения попытки и статистики по вопросам.
+    """
+    actual_test_question_ids = set(answer_key)
 
     # Проверка, что пользователь ответил на все вопросы теста
     # Это можно сделать и на клиенте, но серверная проверка обязательна
@@ -99,33 +275,98 @@ def submit_and_evaluate_test(test_instance_id, user_submitted_answers):
         submitted_q_ids = set(user_submitted_answers.keys())
         if not submitted_q_ids.issubset(actual_test_question_ids) or not actual_test_question_ids.issubset(
                 submitted_q_ids):
-            return {'error': 'Mismatch in submitted answers and actual test questions. Please answer all questions.'}
+            return None
 
-    score = 0
+    question_results = {}  # {question_id: True/False}
     for question_id, selected_answer_id in user_submitted_answers.items():
-        if question_id not in actual_test_question_ids:
+        if question_id not in answer_key:
             # Пропускаем ответ, если вопрос не из этого теста (доп. проверка)
             continue
+        question_results[question_id] = selected_answer_id in answer_key[question_id]
 
-        correct_answer_info = query_db("SELECT is_correct FROM answers WHERE id = ? AND question_id = ?",
-                                       (selected_answer_id, question_id), one=True)
-        if correct_answer_info and correct_answer_info['is_correct'] == 1:
-            score += 1
+    score = sum(1 for is_correct in question_results.values() if is_correct)
+    # Ответы по вопросам для статистики: (question_id, selected_answer_id, is_correct)
+    answers = [(question_id, user_submitted_answers[question_id], is_correct)
+               for question_id, is_correct in question_results.items()]
+    return question_results, score, answers
 
-    total_questions_in_test_attempt = len(actual_test_question_ids)
+
+def save_attempt(test_instance_id, score, total_questions_in_test, answers, submission_id=None):
+    """
+    Сохраняет проверенную попытку. При ATTEMPT_WRITE_BEHIND попытка сохраняется в БД позже
+    (см. attempt_writer): attempt_id в результате — None, вместо него есть submission_id.
+    submission_id — идентификатор отправки, выданный заранее (самопроверка): повторная
+    отправка с тем же submission_id не создает вторую попытку.
+    Возвращает словарь attempt_id, submission_id, test_instance_id, score, total_questions_in_test
+    или словарь с ключом 'error'.
+    """
+    if ATTEMPT_WRITE_BEHIND:
+        try:
+            submission_id = record_attempt(test_instance_id, score, total_questions_in_test, answers,
+                                           submission_id=submission_id)
+        except AttemptQueueFullError:
+            return {'error': 'Too many submissions at the moment. Please submit again in a few seconds.'}
+        except OSError as e:
+            print(f"Ошибка в quiz_service.save_attempt при записи журнала попыток: {e}")
+            return {'error': 'Failed to save test attempt.'}
+        return {
+            'attempt_id': None,
+            'submission_id': submission_id,
+            'test_instance_id': test_instance_id,
+            'score': score,
+            'total_questions_in_test': total_questions_in_test,
+        }
 
     try:
-        attempt_id = execute_db("""
-            INSERT INTO user_attempts (test_instance_id, score, total_questions_in_test) 
-            VALUES (?, ?, ?)
-        """, (test_instance_id, score, total_questions_in_test_attempt))
+        # С submission_id блокировка записи берется сразу: проверка и вставка не должны разойтись
+        with transaction(immediate=bool(submission_id)):
+            existing = query_db("SELECT id FROM user_attempts WHERE submission_id = ?", (submission_id,),
+                                one=True) if submission_id else None
+            if existing:
+                attempt_id = existing['id']  # Повторная отправка: попытка уже сохранена
+            else:
+                attempt_id = execute_db("""
+                    INSERT INTO user_attempts (test_instance_id, score, total_questions_in_test, submission_id)
+                    VALUES (?, ?, ?, ?)
+                """, (test_instance_id, score, total_questions_in_test, submission_id))
+                executemany_db(SQL_INSERT_ATTEMPT_ANSWER,
+                               attempt_answer_rows(attempt_id, answers, score, total_questions_in_test))
 
         return {
             'attempt_id': attempt_id,
+            'submission_id': submission_id,
             'test_instance_id': test_instance_id,
             'score': score,
-            'total_questions_in_test': total_questions_in_test_attempt
+            'total_questions_in_test': total_questions_in_test,
         }
     except sqlite3.Error as e:
-        print(f"Ошибка в quiz_service.submit_and_evaluate_test при сохранении попытки: {e}")
-        return {'error': 'Failed to save test attempt.'}
\ No newline at end of file
+        print(f"Ошибка в quiz_service.save_attempt при сохранении попытки: {e}")
+        return {'error': 'Failed to save test attempt.'}
+
+
+def submit_and_evaluate_test(test_instance_id, user_submitted_answers):
+    """
+    Проверяет ответы пользователя, сохраняет попытку и возвращает результат.
+    user_submitted_answers: словарь {question_id: selected_answer_id}
+    Возвращает словарь с результатами (включая question_results —
+    {question_id: True/False} по каждому вопросу) или None в случае ошибки.
+    При ATTEMPT_WRITE_BEHIND попытка сохраняется в БД позже (см. attempt_writer):
+    attempt_id в результате — None, вместо него есть submission_id.
+    """
+    # Ключ ответов теста (из кэша): все вопросы теста и их правильные ответы
+    answer_key = get_answer_key_for_instance(test_instance_id)
+    if not answer_key:
+        test_instance = query_db("SELECT id FROM generated_tests WHERE id = ?", (test_instance_id,), one=True)
+        if not test_instance:
+            return {'error': 'Test instance not found.'}
+        return {'error': 'No questions found for this test instance.'}
+
+    evaluation = evaluate_answers(answer_key, user_submitted_answers)
+    if evaluation is None:
+        return {'error': 'Mismatch in submitted answers and actual test questions. Please answer all questions.'}
+    question_results, score, answers = evaluation
+
+    result = save_attempt(test_instance_id, score, len(answer_key), answers)
+    if 'error' not in result:
+        result['question_results'] = question_results
+    return result
\ No newline at end of file
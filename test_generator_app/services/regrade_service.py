@@ -0,0 +1,143 @@
+from ..models.database_manager import query_db, executemany_db, transaction
+from ..config import REGRADE_CHUNK_SIZE
+from .attempt_writer import flush_attempts
+from .question_sampler import MAX_IN_PARAMS
+from .quiz_service import refresh_frozen_answer_keys
+
+# Перепроверка прошлых попыток после изменения ключа ответов вопроса.
+# Ответы попыток (attempt_answers) читаются по вопросу порциями по chunk_size строк
+# (keyset по индексу idx_attempt_answers_question), сравниваются с текущим ключом
+# векторно (NumPy) и записываются обратно одной транзакцией на порцию: исправленный
+# is_correct, балл попытки и доля правильных ответов попытки. Сводную статистику
+# вопросов (миграция 10) при этом обновляют триггеры. Память не зависит от числа попыток.
+# Ответы, ID которых в вопросе больше нет (вопрос редактировался до сохранения ID ответов),
+# не перепроверяются и учитываются в отчете как stale.
+
+SQL_SELECT_ATTEMPT_ANSWERS_CHUNK = """
+    SELECT attempt_id, answer_id, is_correct FROM attempt_answers
+    WHERE question_id = ? AND answer_id IS NOT NULL AND (answer_id, attempt_id) > (?, ?)
+    ORDER BY answer_id, attempt_id
+    LIMIT ?
+"""
+
+
+def _regrade_chunk(rows, valid_answer_ids, correct_answer_ids):
+    """
+    Сравнивает порцию ответов с ключом. rows — строки (attempt_id, answer_id, is_correct).
+    Возвращает (изменения [(новый is_correct, attempt_id)], изменения балла [(разница, attempt_id)], число stale).
+    """
+    import numpy as np  # Нужен только для перепроверки
+
+    columns = np.array([tuple(row) for row in rows], dtype=np.int64).reshape(-1, 3)
+    attempt_ids, answer_ids, old_correct = columns[:, 0], columns[:, 1], columns[:, 2]
+    known = np.isin(answer_ids, valid_answer_ids)
+    new_correct = np.isin(answer_ids, correct_answer_ids).astype(np.int64)
+    changed = known & (new_correct != old_correct)
+    # В пределах одного вопроса попытка встречается один раз, поэтому разница балла — по строке
+    changed_attempts = attempt_ids[changed].tolist()
+    new_values = new_correct[changed].tolist()
+    deltas = (new_correct[changed] - old_correct[changed]).tolist()
+    return (list(zip(new_values, changed_attempts)), list(zip(deltas, changed_attempts)),
+            int(np.count_nonzero(~known)))
+
+
+def _write_back(question_id, changes, score_deltas):
+    """Записывает исправления одной порции одной транзакцией."""
+    with transaction(immediate=True):
+        executemany_db("UPDATE attempt_answers SET is_correct = ? WHERE attempt_id = ? AND question_id = ?",
+                       [(new_value, attempt_id, question_id) for new_value, attempt_id in changes])
+        executemany_db("UPDATE user_attempts SET score = score + ? WHERE id = ?", score_deltas)
+        executemany_db("UPDATE attempt_answers SET attempt_score = "
+                       "(SELECT CAST(score AS REAL) / total_questions_in_test FROM user_attempts WHERE id = ?) "
+                       "WHERE attempt_id = ?",
+                       [(attempt_id, attempt_id) for _, attempt_id in score_deltas])
+
+
+def regrade_question(question_id, chunk_size=REGRADE_CHUNK_SIZE, report=None):
+    """Перепроверяет все сохраненные ответы на вопрос по его текущему ключу. Дополняет и возвращает отчет."""
+    if report is None:
+        report = _new_report()
+    key_rows = query_db("SELECT id, is_correct FROM answers WHERE question_id = ?", (question_id,))
+    if not key_rows:
+        return report  # Вопрос удален
+    valid_answer_ids = [row['id'] for row in key_rows]
+    correct_answer_ids = [row['id'] for row in key_rows if row['is_correct']]
+    report['questions'] += 1
+
+    last_answer_id, last_attempt_id = -1, -1
+    while True:
+        rows = query_db(SQL_SELECT_ATTEMPT_ANSWERS_CHUNK,
+                        (question_id, last_answer_id, last_attempt_id, chunk_size))
+        if not rows:
+            break
+        last_answer_id, last_attempt_id = rows[-1]['answer_id'], rows[-1]['attempt_id']
+        changes, score_deltas, stale = _regrade_chunk(rows, valid_answer_ids, correct_answer_ids)
+        report['answers_checked'] += len(rows)
+        report['answers_stale'] += stale
+        if changes:
+            _write_back(question_id, changes, score_deltas)
+            report['answers_changed'] += len(changes)
+            report['attempts_rescored'] += len(score_deltas)
+    return report
+
+
+def _new_report():
+    return {'questions': 0, 'tests_refreshed': 0, 'answers_checked': 0, 'answers_changed': 0,
+            'answers_stale': 0, 'attempts_rescored': 0}
+
+
+def regrade_questions(question_ids, chunk_size=REGRADE_CHUNK_SIZE, progress_callback=None):
+    """
+    Перепроверка после изменения ключа ответов вопросов question_ids:
+    1) ключ переносится в замороженное содержимое тестов с этими вопросами (новые отправки);
+    2) сохраненные ответы прошлых попыток сравниваются с ключом, баллы исправляются.
+    Повторный запуск безопасен (исправлять будет нечего).
+    progress_callback(report) вызывается после каждого вопроса.
+    Возвращает отчет: questions, tests_refreshed, answers_checked, answers_changed,
+    answers_stale, attempts_rescored.
+    """
+    question_ids = list(question_ids)
+    report = _new_report()
+    for start in range(0, len(question_ids), MAX_IN_PARAMS):
+        report['tests_refreshed'] += refresh_frozen_answer_keys(question_ids[start:start + MAX_IN_PARAMS])
+    # Попытки этого процесса, принятые до обновления ключа, должны попасть в БД до перепроверки
+    flush_attempts()
+    for question_id in question_ids:
+        regrade_question(question_id, chunk_size=chunk_size, report=report)
+        if progress_callback:
+            progress_callback(report)
+    return report
+
+
+def iter_question_ids_in_ranges(ranges, batch_size=MAX_IN_PARAMS):
+    """
+    Генератор ID существующих вопросов из диапазонов [(first, last), ...] (см. quiz_routes.parse_id_ranges),
+    без повторов. Диапазоны не разворачиваются: ID читаются из questions пачками по batch_size,
+    поэтому опечатка вроде 1-1000000000 стоит столько же, сколько выбор всего банка.
+    """
+    seen = set()
+    for first, last in ranges:
+        last_id = first - 1
+        while True:
+            rows = query_db("SELECT id FROM questions WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                            (last_id, last, batch_size))
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            for row in rows:
+                if row['id'] not in seen:
+                    seen.add(row['id'])
+                    yield row['id']
+
+
+def iter_all_question_ids(batch_size=MAX_IN_PARAMS):
+    """Генератор ID всех вопросов, по которым есть сохраненные ответы попыток."""
+    last_id = 0
+    while True:
+        rows = query_db("SELECT question_id FROM question_attempt_stats WHERE question_id > ? "
+                        "ORDER BY question_id LIMIT ?", (last_id, batch_size))
+        if not rows:
+            return
+        last_id = rows[-1]['question_id']
+        for row in rows:
+            yield row['question_id']
@@ -0,0 +1,62 @@
+"""
+Общие фикстуры тестов.
+Пакет приложения импортируется как EngLes.test_generator_app, поэтому в sys.path
+добавляется папка, в которой лежит репозиторий (папка EngLes). Запуск из этой папки:
+    python -m pytest EngLes/tests
+БД, кэш DOCX и журнал попыток направляются во временную папку до импорта модулей
+приложения: они читают настройки из config при импорте.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(REPO_ROOT))
+
+from EngLes.test_generator_app import config  # noqa: E402
+
+WORK_DIR = tempfile.mkdtemp(prefix='engles-tests-')
+config.DATABASE_PATH = os.path.join(WORK_DIR, 'quiz.db')
+config.EXPORT_CACHE_DIR = os.path.join(WORK_DIR, 'export_cache')
+config.ATTEMPT_JOURNAL_DIR = os.path.join(WORK_DIR, 'attempt_journal')
+config.ATTEMPT_WRITE_BEHIND = False  # Попытки пишутся в БД сразу; писателя тесты создают сами
+config.TEMPLATE_BYTECODE_CACHE_DIR = None
+config.SCHEMA_BOOTSTRAP = False
+config.METRICS_ENABLED = False
+
+from EngLes.test_generator_app.app import create_app  # noqa: E402
+from EngLes.test_generator_app.models import database_manager  # noqa: E402
+from EngLes.test_generator_app.services import cache_service  # noqa: E402
+
+
+@pytest.fixture
+def database_path(tmp_path, monkeypatch):
+    """Путь к новой БД теста; пул соединений и кэши процесса начинают с чистого листа."""
+    path = str(tmp_path / 'quiz.db')
+    monkeypatch.setattr(database_manager, 'DATABASE_PATH', path)
+    monkeypatch.setattr(database_manager, '_pool', None)
+    monkeypatch.setattr(cache_service, '_local_generation', None)
+    cache_service.question_cache.clear()
+    cache_service.test_cache.clear()
+    yield path
+    database_manager.get_connection_pool().close_all()
+
+
+@pytest.fixture
+def app(database_path):
+    """Приложение на пустой БД с актуальной схемой."""
+    app = create_app()
+    app.config['TESTING'] = True
+    database_manager.init_db_command(app)
+    return app
+
+
+def add_questions(count, topic=None, correct=('a',), wrong=('b', 'c')):
+    """Добавляет count вопросов q0, q1, ... (нужен контекст приложения). Возвращает их ID."""
+    from EngLes.test_generator_app.services import question_service
+
+    answers = ([{'text': text, 'is_correct': 1} for text in correct]
+               + [{'text': text, 'is_correct': 0} for text in wrong])
+    return [question_service.add_new_question(f'q{index}', topic, answers) for index in range(count)]
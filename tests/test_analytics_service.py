@@ -0,0 +1,81 @@
+"""Статистика вопросов по сводным таблицам (services/analytics_service.py)."""
+import random
+import re
+
+import pytest
+
+from EngLes.test_generator_app.models.database_manager import query_db
+from EngLes.test_generator_app.services import analytics_service, quiz_service
+
+from conftest import add_questions
+
+
+@pytest.fixture
+def graded_app(app):
+    """Банк из 12 вопросов (2 темы) и 60 попыток учеников разной подготовки."""
+    rng = random.Random(7)
+    with app.app_context():
+        add_questions(6, topic='A')
+        add_questions(6, topic='B')
+    for _ in range(60):
+        with app.app_context():
+            test_id = quiz_service.generate_new_test_instance(rng.randint(3, 8))
+            answer_key = quiz_service.get_answer_key_for_instance(test_id)
+            ability = rng.random()
+            answers = {}
+            for question_id, correct_ids in answer_key.items():
+                wrong_ids = [row['id'] for row in query_db(
+                    "SELECT id FROM answers WHERE question_id = ? AND is_correct = 0", (question_id,))]
+                # Вопросы с большим ID труднее
+                knows = rng.random() < ability * (1.3 - question_id / 12)
+                answers[question_id] = min(correct_ids) if knows else rng.choice(wrong_ids)
+            assert 'error' not in quiz_service.submit_and_evaluate_test(test_id, answers)
+    return app
+
+
+def _is_sorted(values, reverse=False):
+    return values == sorted(values, reverse=reverse)
+
+
+@pytest.mark.parametrize('sort', analytics_service.SORT_ORDERS)
+def test_statistics_are_sorted_and_limited(graded_app, sort):
+    with graded_app.app_context():
+        everything = analytics_service.get_question_statistics(sort=sort, min_attempts=1)
+        top = analytics_service.get_question_statistics(sort=sort, min_attempts=1, limit=4)
+    assert len(everything) == 12
+    assert [item['question_id'] for item in top] == [item['question_id'] for item in everything[:4]]
+
+    if sort == 'easiest':
+        assert _is_sorted([item['correct_rate'] for item in everything], reverse=True)
+    elif sort == 'hardest':
+        assert _is_sorted([item['correct_rate'] for item in everything])
+    elif sort == 'attempts':
+        assert _is_sorted([item['attempts'] for item in everything], reverse=True)
+    else:
+        values = [item['discrimination'] for item in everything]
+        defined = [value for value in values if value is not None]
+        assert values[:len(defined)] == defined  # Неопределенные — в конце
+        assert all(b - a > -1e-9 for a, b in zip(defined, defined[1:]))
+
+
+def test_statistics_filters(graded_app):
+    with graded_app.app_context():
+        only_b = analytics_service.get_question_statistics(min_attempts=1, topic='B')
+        frequent = analytics_service.get_question_statistics(min_attempts=25)
+    assert {item['topic'] for item in only_b} == {'B'}
+    assert all(item['attempts'] >= 25 for item in frequent)
+    for item in only_b:
+        assert sum(answer['selections'] for answer in item['answers']) == item['attempts']
+
+
+@pytest.mark.parametrize('sort', analytics_service.SORT_ORDERS)
+def test_statistics_sort_uses_index(app, sort):
+    with app.app_context():
+        plan = ' '.join(row['detail'] for row in query_db(f"""
+            EXPLAIN QUERY PLAN
+            SELECT s.question_id FROM question_attempt_stats s JOIN questions q ON q.id = s.question_id
+            WHERE s.attempts >= 5
+            ORDER BY {analytics_service.SQL_SORT_ORDERS[sort]} LIMIT 500
+        """))
+    assert re.search(r'USING (COVERING )?INDEX idx_question_attempt_stats_', plan)
+    assert 'TEMP B-TREE' not in plan
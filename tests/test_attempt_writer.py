@@ -0,0 +1,203 @@
+"""Отложенная запись попыток (services/attempt_writer.py): журнал, повторы, восстановление."""
+import glob
+import json
+import os
+import queue
+import sqlite3
+
+import pytest
+
+from EngLes.test_generator_app.models.database_manager import query_db
+from EngLes.test_generator_app.services import attempt_writer, question_service, quiz_service
+
+from conftest import add_questions
+
+
+@pytest.fixture
+def test_id(app):
+    with app.app_context():
+        add_questions(2)
+        return quiz_service.generate_new_test_instance(2)
+
+
+@pytest.fixture
+def journal_dir(tmp_path):
+    return str(tmp_path / 'journal')
+
+
+@pytest.fixture
+def make_writer(journal_dir):
+    writers = []
+
+    def make(**kwargs):
+        writer = attempt_writer.AttemptWriter(journal_dir=journal_dir, fsync=False, **kwargs)
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        writer.close()
+
+
+def _saved_submissions(app):
+    with app.app_context():
+        return sorted(row['submission_id'] for row in query_db("SELECT submission_id FROM user_attempts"))
+
+
+def _dead_letters(journal_dir):
+    path = os.path.join(journal_dir, attempt_writer.DEAD_LETTER_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as dead_letter:
+        return [json.loads(line) for line in dead_letter]
+
+
+def _journal_lines(journal_dir):
+    lines = 0
+    for path in glob.glob(os.path.join(journal_dir, attempt_writer.JOURNAL_PREFIX + '*.jsonl')):
+        with open(path, encoding='utf-8') as journal:
+            lines += sum(1 for _ in journal)
+    return lines
+
+
+def _poison(monkeypatch, error, poisoned_ids=None, failures=None):
+    """
+    _insert_attempts падает с error на пачках с poisoned_ids (None — на любых), первые failures
+    раз (None — всегда). Возвращает список размеров пачек во всех вызовах.
+    """
+    calls = []
+    insert_attempts = attempt_writer._insert_attempts
+
+    def failing_insert(conn, records):
+        calls.append(len(records))
+        poisoned = poisoned_ids is None or any(record['submission_id'] in poisoned_ids for record in records)
+        if poisoned and (failures is None or len(calls) <= failures):
+            raise error
+        insert_attempts(conn, records)
+
+    monkeypatch.setattr(attempt_writer, '_insert_attempts', failing_insert)
+    monkeypatch.setattr(attempt_writer.time, 'sleep', lambda seconds: None)
+    return calls
+
+
+def test_submitted_attempts_are_saved_with_answers(app, test_id, make_writer):
+    writer = make_writer()
+    submission_id = writer.submit(test_id, 1, 2, answers=[(1, 1, True), (2, 5, False)])
+    assert writer.submit(test_id, 1, 2, submission_id=submission_id) == submission_id  # Повтор
+    writer.flush()
+
+    assert _saved_submissions(app) == [submission_id]
+    with app.app_context():
+        assert len(query_db("SELECT * FROM attempt_answers")) == 2
+
+
+def test_answers_to_deleted_questions_are_skipped(app, test_id, make_writer):
+    with app.app_context():
+        kept, deleted = sorted(quiz_service.get_answer_key_for_instance(test_id))
+        assert question_service.delete_question_by_id(deleted)
+    writer = make_writer()
+    submission_id = writer.submit(test_id, 2, 2, answers=[(kept, 1, True), (deleted, 4, True)])
+    writer.flush()
+
+    assert _saved_submissions(app) == [submission_id]
+    with app.app_context():
+        assert [row['question_id'] for row in query_db("SELECT question_id FROM attempt_answers")] == [kept]
+
+def test_saved_segments_are_removed_while_others_are_pending(app, test_id, make_writer, journal_dir,
+                                                             monkeypatch):
+    entered, proceed = queue.Queue(), queue.Queue()
+    insert_attempts = attempt_writer._insert_attempts
+
+    def gated_insert(conn, records):
+        entered.put(len(records))
+        proceed.get(timeout=10)
+        insert_attempts(conn, records)
+
+    monkeypatch.setattr(attempt_writer, '_insert_attempts', gated_insert)
+    writer = make_writer(batch_size=3)
+    writer.submit(test_id, 1, 2)
+    assert entered.get(timeout=10) == 1  # Пачка из первой попытки ждет записи
+    for _ in range(6):
+        writer.submit(test_id, 1, 2)  # Сегменты журнала: 3 + 3 + 1 попытка
+    assert _journal_lines(journal_dir) == 7
+
+    proceed.put(True)
+    assert entered.get(timeout=10) == 3
+    proceed.put(True)
+    assert entered.get(timeout=10) == 3
+    # Первый сегмент сохранен целиком и удален, хотя в очереди еще есть попытки
+    assert _journal_lines(journal_dir) == 4
+    proceed.put(True)
+    writer.flush()
+
+    assert _journal_lines(journal_dir) == 0
+    assert len(_saved_submissions(app)) == 7
+
+
+def test_bad_attempt_goes_to_dead_letter_and_frees_queue(app, test_id, make_writer, journal_dir, monkeypatch):
+    _poison(monkeypatch, sqlite3.DatabaseError('malformed'), poisoned_ids={'bad'})
+    writer = make_writer(queue_size=2, queue_timeout=5)
+
+    writer.submit(test_id, 1, 2, submission_id='bad')
+    for number in range(5):  # Места в очереди освобождаются и после отказа
+        writer.submit(test_id, 2, 2, submission_id=f'good-{number}')
+    writer.flush()
+
+    assert _saved_submissions(app) == [f'good-{number}' for number in range(5)]
+    [dead_letter] = _dead_letters(journal_dir)
+    assert dead_letter['submission_id'] == 'bad'
+    assert dead_letter['error'] == 'malformed'
+
+
+def test_locked_database_is_retried(app, test_id, make_writer, monkeypatch):
+    calls = _poison(monkeypatch, sqlite3.OperationalError('database is locked'), failures=2)
+    writer = make_writer()
+    submission_id = writer.submit(test_id, 1, 2)
+    writer.flush()
+
+    assert calls == [1, 1, 1]
+    assert _saved_submissions(app) == [submission_id]
+
+
+def test_retries_are_bounded(app, test_id, make_writer, journal_dir, monkeypatch):
+    calls = _poison(monkeypatch, sqlite3.OperationalError('database is locked'))
+    writer = make_writer()
+    submission_id = writer.submit(test_id, 1, 2)
+    writer.flush()
+
+    assert len(calls) == attempt_writer.MAX_WRITE_ATTEMPTS
+    assert _saved_submissions(app) == []
+    assert [record['submission_id'] for record in _dead_letters(journal_dir)] == [submission_id]
+
+
+def test_journal_of_crashed_process_is_recovered(app, test_id, make_writer, journal_dir):
+    os.makedirs(journal_dir)
+    records = [
+        {'submission_id': 'crashed-1', 'test_instance_id': test_id, 'score': 1, 'total_questions_in_test': 2,
+         'submitted_at': '2026-01-01 10:00:00', 'answers': []},
+        {'submission_id': 'crashed-2', 'test_instance_id': test_id},  # Неполная запись
+    ]
+    with open(os.path.join(journal_dir, 'attempts-99999.jsonl'), 'w', encoding='utf-8') as journal:
+        journal.writelines(json.dumps(record) + '\n' for record in records)
+        journal.write('{"submission_id": "crash')  # Недописанная строка
+
+    make_writer().flush()
+    writer = make_writer()  # Восстановление выполняет поток писателя при старте
+    writer.submit(test_id, 0, 2, submission_id='after-restart')
+    writer.flush()
+
+    assert _saved_submissions(app) == ['after-restart', 'crashed-1']
+    assert [record['submission_id'] for record in _dead_letters(journal_dir)] == ['crashed-2']
+    assert not os.path.exists(os.path.join(journal_dir, 'attempts-99999.jsonl'))
+
+
+def test_close_attempt_writer_saves_pending_attempts(app, test_id, journal_dir, monkeypatch):
+    monkeypatch.setattr(attempt_writer, '_writer', attempt_writer.AttemptWriter(journal_dir=journal_dir, fsync=False))
+    monkeypatch.setattr(attempt_writer, '_writer_pid', os.getpid())
+    submission_id = attempt_writer.record_attempt(test_id, 1, 2)
+
+    attempt_writer.close_attempt_writer()
+
+    assert attempt_writer._writer is None
+    assert _saved_submissions(app) == [submission_id]
+    assert _journal_lines(journal_dir) == 0
@@ -0,0 +1,71 @@
+"""Кэши вопросов в памяти процесса и счетчик поколений cache_generation."""
+import multiprocessing
+
+from EngLes.test_generator_app.models import database_manager
+from EngLes.test_generator_app.services import question_service, quiz_service, cache_service
+
+from conftest import add_questions
+
+
+def _edit_in_other_worker(database_path, question_id, answers):
+    """Правка вопроса в отдельном процессе (другом воркере) со своими кэшами."""
+    from EngLes.test_generator_app import config
+    config.SCHEMA_BOOTSTRAP = False
+    config.TEMPLATE_BYTECODE_CACHE_DIR = None
+    database_manager.DATABASE_PATH = database_path
+    from EngLes.test_generator_app.app import create_app
+
+    with create_app().app_context():
+        if not question_service.update_existing_question(question_id, 'q0', None, answers):
+            raise SystemExit(1)
+
+
+def _edit_elsewhere(database_path, question_id, answers):
+    process = multiprocessing.get_context('spawn').Process(
+        target=_edit_in_other_worker, args=(database_path, question_id, answers))
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+
+def _snapshot_answers(test_instance_id, question_id):
+    for q_id, _, _, answers in quiz_service._load_test_snapshot(test_instance_id):
+        if q_id == question_id:
+            return sorted(answer_text for _, answer_text, _ in answers)
+
+
+def test_answer_added_in_other_process_reaches_cached_question(app, database_path):
+    with app.app_context():
+        [question_id] = add_questions(1, wrong=('b',))
+    with app.app_context():
+        first_test = quiz_service.generate_new_test_instance(1)  # Вопрос попадает в кэш процесса
+        assert cache_service.question_cache.get(question_id) is not None
+        answers = [{'id': answer.id, 'text': answer.answer_text, 'is_correct': answer.is_correct}
+                   for answer in question_service.get_question_by_id_with_answers(question_id).answers]
+
+    # Текст и тема не меняются: добавляется только ответ
+    _edit_elsewhere(database_path, question_id, answers + [{'text': 'c', 'is_correct': 0}])
+
+    with app.app_context():
+        new_test = quiz_service.generate_new_test_instance(1)
+        assert _snapshot_answers(new_test, question_id) == ['a', 'b', 'c']
+        # Уже созданный тест заморожен и не меняется
+        assert _snapshot_answers(first_test, question_id) == ['a', 'b']
+
+
+def test_new_questions_do_not_bump_generation(app):
+    with app.app_context():
+        generation = database_manager.query_db("SELECT generation FROM cache_generation", one=True)[0]
+        add_questions(3)
+        assert database_manager.query_db("SELECT generation FROM cache_generation", one=True)[0] == generation
+
+
+def test_edit_in_same_process_invalidates_question(app):
+    with app.app_context():
+        [question_id] = add_questions(1)
+        quiz_service.generate_new_test_instance(1)
+        assert question_service.update_existing_question(
+            question_id, 'q0 (исправлен)', None, [{'text': 'a', 'is_correct': 1}, {'text': 'b', 'is_correct': 0}])
+    with app.app_context():
+        test_id = quiz_service.generate_new_test_instance(1)
+        assert quiz_service._load_test_snapshot(test_id)[0][1] == 'q0 (исправлен)'
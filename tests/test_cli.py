@@ -0,0 +1,28 @@
+"""Команды flask (app.py): разбор аргументов."""
+import pytest
+
+from conftest import add_questions
+
+
+@pytest.mark.parametrize('raw_ids', ['abc', '5-1', '1-100000'])
+def test_export_tests_rejects_bad_ids(app, tmp_path, raw_ids):
+    result = app.test_cli_runner().invoke(args=['export-tests', '--ids', raw_ids, '-o', str(tmp_path / 'out.zip')])
+    assert result.exit_code == 2
+    assert "'--ids'" in result.output and 'некорректный список ID тестов' in result.output
+    assert not (tmp_path / 'out.zip').exists()
+
+
+def test_regrade_attempts_rejects_bad_question_list(app):
+    result = app.test_cli_runner().invoke(args=['regrade-attempts', '--questions', '1,x'])
+    assert result.exit_code == 2
+    assert "'--questions'" in result.output and 'некорректный список ID вопросов' in result.output
+
+
+def test_regrade_attempts_clamps_ranges_to_existing_questions(app):
+    with app.app_context():
+        add_questions(3)
+    # Диапазон не разворачивается: берутся только существующие вопросы, повторы отбрасываются
+    result = app.test_cli_runner().invoke(args=['regrade-attempts', '--questions', '2-1000000000,1,3'])
+    assert result.exit_code == 0, result.output
+    assert 'Вопросов: 3/3' in result.output
+    assert 'Обновлен ключ в тестах: 0' in result.output
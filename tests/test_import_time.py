@@ -0,0 +1,47 @@
+"""Бюджет времени запуска воркера (scripts/check_import_time.py)."""
+from EngLes.test_generator_app.scripts import check_import_time
+
+APP = check_import_time.APP_PACKAGE
+
+
+def _importtime_line(self_us, cumulative_us, depth, name):
+    # Формат строк python -X importtime
+    return f"import time: {self_us:9} | {cumulative_us:10} | {'  ' * depth}{name}"
+
+
+def test_parse_importtime_finds_importer():
+    lines = [
+        'import time: self [us] | cumulative | imported package',
+        _importtime_line(120, 120, 2, 'docx.oxml'),
+        _importtime_line(300, 420, 1, 'docx'),
+        _importtime_line(80, 500, 0, f'{APP}.services.export_service'),
+    ]
+    entries = check_import_time.parse_importtime(lines)
+    assert entries == [
+        ('docx.oxml', 120, 120, 'docx'),
+        ('docx', 300, 420, f'{APP}.services.export_service'),
+        (f'{APP}.services.export_service', 80, 500, None),
+    ]
+
+
+def test_check_reports_deferred_module_imported_by_app():
+    entries = check_import_time.parse_importtime([
+        _importtime_line(300, 300, 1, 'docx'),
+        _importtime_line(50, 50, 1, 'numpy'),
+        _importtime_line(80, 430, 0, f'{APP}.services.export_service'),
+        _importtime_line(200, 200, 1, 'asyncio'),
+        _importtime_line(10, 210, 0, 'flask.app'),  # Импорт самой Flask нарушением не считается
+    ])
+    total_ms, problems = check_import_time.check(entries, budget_ms=0.5)
+    assert total_ms == 0.64
+    assert len(problems) == 3
+    assert 'больше бюджета' in problems[0]
+    assert problems[1].startswith(f'{APP}.services.export_service импортирует при запуске docx')
+    assert problems[2].startswith(f'{APP}.services.export_service импортирует при запуске numpy')
+
+
+def test_worker_start_within_budget(tmp_path):
+    lines = check_import_time.run_importtime(str(tmp_path / 'quiz.db'))
+    total_ms, problems = check_import_time.check(check_import_time.parse_importtime(lines),
+                                                 check_import_time.DEFAULT_BUDGET_MS)
+    assert problems == [], f"время импортов {total_ms:.1f} мс"
@@ -0,0 +1,64 @@
+"""Постраничный список вопросов с keyset-пагинацией (services/question_service.py)."""
+from EngLes.test_generator_app.models.database_manager import query_db
+from EngLes.test_generator_app.services import question_service
+
+from conftest import add_questions
+
+
+def _ids(page):
+    return [question.id for question in page['questions']]
+
+
+def _walk_forward(page_size, **filters):
+    pages = [question_service.get_questions_page(page_size=page_size, **filters)]
+    while pages[-1]['has_next']:
+        pages.append(question_service.get_questions_page(before_id=pages[-1]['last_id'], page_size=page_size,
+                                                         **filters))
+    return pages
+
+
+def test_pages_cover_bank_in_both_directions(app):
+    with app.app_context():
+        all_ids = sorted(add_questions(23, topic='A') + add_questions(4, topic='B'), reverse=True)
+        forward = _walk_forward(5)
+        backward = [forward[-1]]
+        while backward[-1]['has_prev']:
+            backward.append(question_service.get_questions_page(after_id=backward[-1]['first_id'], page_size=5))
+
+    assert [question_id for page in forward for question_id in _ids(page)] == all_ids
+    assert [len(_ids(page)) for page in forward] == [5, 5, 5, 5, 5, 2]
+    assert not forward[0]['has_prev'] and all(page['has_prev'] for page in forward[1:])
+    assert [_ids(page) for page in backward] == [_ids(page) for page in reversed(forward)]
+    assert backward[-1]['has_next'] and not backward[-1]['has_prev']
+
+
+def test_pages_stay_stable_when_questions_are_added(app):
+    with app.app_context():
+        add_questions(10)
+        first = question_service.get_questions_page(page_size=4)
+        add_questions(3)  # Новые вопросы попадают в начало списка и не сдвигают следующие страницы
+        second = question_service.get_questions_page(before_id=first['last_id'], page_size=4)
+    assert _ids(second) == list(range(first['last_id'] - 1, first['last_id'] - 5, -1))
+
+
+def test_topic_and_prefix_filters(app):
+    with app.app_context():
+        add_questions(7, topic='A')
+        add_questions(6, topic='B')
+        topic_pages = _walk_forward(3, topic='B')
+        prefix_pages = _walk_forward(2, prefix='Q1')  # q1 из обеих тем, без учета регистра
+        expected_prefix = [row['id'] for row in query_db(
+            "SELECT id FROM questions WHERE question_text LIKE 'q1%' ORDER BY id DESC")]
+        empty = question_service.get_questions_page(topic='C')
+
+    assert {question.topic for page in topic_pages for question in page['questions']} == {'B'}
+    assert sum(len(_ids(page)) for page in topic_pages) == 6
+    assert [question_id for page in prefix_pages for question_id in _ids(page)] == expected_prefix
+    assert empty['questions'] == [] and empty['first_id'] is None and not empty['has_next']
+
+
+def test_page_size_is_clamped(app):
+    with app.app_context():
+        add_questions(3)
+        assert len(_ids(question_service.get_questions_page(page_size=0))) == 1
+        assert len(_ids(question_service.get_questions_page(page_size=10 ** 6))) == 3
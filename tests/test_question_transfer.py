@@ -0,0 +1,50 @@
+"""Импорт и экспорт банка вопросов (services/question_transfer_service.py)."""
+import io
+
+import pytest
+
+from EngLes.test_generator_app.models.database_manager import query_db
+from EngLes.test_generator_app.services import question_transfer_service
+
+from conftest import add_questions
+
+
+def _bank(min_id=0):
+    """Вопросы с ID > min_id: (текст, тема, [(ответ, правильный), ...]) по возрастанию ID."""
+    questions = query_db("SELECT id, question_text, topic FROM questions WHERE id > ? ORDER BY id", (min_id,))
+    return [(row['question_text'], row['topic'],
+             [(ans['answer_text'], ans['is_correct']) for ans in query_db(
+                 "SELECT answer_text, is_correct FROM answers WHERE question_id = ? ORDER BY id", (row['id'],))])
+            for row in questions]
+
+
+@pytest.mark.parametrize('file_format', question_transfer_service.SUPPORTED_FORMATS)
+def test_export_import_round_trip(app, file_format):
+    with app.app_context():
+        add_questions(3, topic='grammar')
+        add_questions(2, correct=('a', 'c'), wrong=('b',))  # Несколько правильных, без темы
+        add_questions(1, topic='vocabulary, "phrasal"', correct=('x',), wrong=('y', 'z', 'w'))
+        original = _bank()
+        last_id = query_db("SELECT MAX(id) AS id FROM questions", one=True)['id']
+
+        exported = ''.join(question_transfer_service.export_questions(file_format, batch_size=2))
+        report = question_transfer_service.import_questions(io.StringIO(exported), file_format, batch_size=4)
+        imported = _bank(last_id)
+
+    assert report['imported'] == report['processed'] == 6
+    assert report['rejects'] == []
+    assert imported == original
+
+
+def test_csv_correct_column_lists_several_answers(app):
+    csv_text = ("question_text,topic,correct,answer_1,answer_2,answer_3\n"
+                "Pick two,,1;3,a,b,c\n"
+                "Pick one,t,2,a,b,\n"
+                "Bad number,,first,a,b,c\n")
+    with app.app_context():
+        report = question_transfer_service.import_questions(io.StringIO(csv_text), 'csv')
+        bank = _bank()
+    assert report['imported'] == 2
+    assert [line_no for line_no, _ in report['rejects']] == [4]
+    assert bank == [('Pick two', None, [('a', 1), ('b', 0), ('c', 1)]),
+                    ('Pick one', 't', [('a', 0), ('b', 1)])]
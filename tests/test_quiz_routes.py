@@ -0,0 +1,41 @@
+"""Прохождение теста через маршруты quiz_bp."""
+import re
+
+import pytest
+
+from conftest import add_questions
+
+TEST_URL_RE = re.compile(r'/test/(\d+)/take')
+SEED_RE = re.compile(r'name="shuffle_seed" value="(\d+)"')
+ANSWER_RE = re.compile(r'name="question_(\d+)"\s+value="(\d+)"')
+
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        add_questions(5)
+    return app.test_client()
+
+
+def test_generate_take_submit(client):
+    response = client.post('/test/generate', data={'num_questions': 3, 'generation_mode': 'uniform'})
+    assert response.status_code == 302
+    take_url = response.headers['Location']
+    test_id = TEST_URL_RE.search(take_url).group(1)
+
+    page = client.get(take_url).get_data(as_text=True)
+    answers = {}
+    for question_id, answer_id in ANSWER_RE.findall(page):
+        answers.setdefault(f'question_{question_id}', answer_id)
+    assert len(answers) == 3
+    answers['shuffle_seed'] = SEED_RE.search(page).group(1)
+
+    response = client.post(f'/test/{test_id}/submit', data=answers)
+    assert response.status_code == 200
+    assert 'из <strong>3</strong>' in response.get_data(as_text=True)
+
+
+def test_unknown_test_redirects_to_start(client):
+    response = client.get('/test/999/take')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/test/start')
@@ -0,0 +1,105 @@
+"""Замороженное содержимое тестов и перемешивание по зерну (services/quiz_service.py)."""
+from EngLes.test_generator_app.models.database_manager import execute_db, query_db
+from EngLes.test_generator_app.services import question_service, quiz_service
+from EngLes.test_generator_app.services.cache_service import question_cache, test_cache
+
+from conftest import add_questions
+
+
+def _view(questions):
+    """Вид теста для сравнения: [(ID вопроса, текст, [(ID ответа, текст), ...]), ...] в порядке показа."""
+    return [(q.id, q.question_text, [(ans.id, ans.answer_text) for ans in q.answers]) for q in questions]
+
+
+def _answers_data(question_id):
+    return [{'id': ans['id'], 'text': ans['answer_text'], 'is_correct': ans['is_correct']}
+            for ans in query_db("SELECT id, answer_text, is_correct FROM answers WHERE question_id = ? ORDER BY id",
+                                (question_id,))]
+
+
+def test_frozen_test_survives_question_edits_and_deletes(app):
+    with app.app_context():
+        first, second, third = add_questions(3)
+        test_id = quiz_service.generate_new_test_instance(3)
+        before = _view(quiz_service.get_test_questions_for_instance(test_id, shuffle_seed=11))
+        answer_key = quiz_service.get_answer_key_for_instance(test_id)
+
+        answers = _answers_data(first)
+        answers[0]['text'], answers[1]['is_correct'] = 'changed', 1
+        assert question_service.update_existing_question(first, 'rewritten', None, answers)
+        assert question_service.update_existing_question(
+            second, 'q1', None, _answers_data(second) + [{'text': 'd', 'is_correct': 0}])
+        assert question_service.delete_question_by_id(third)
+        question_cache.clear()
+        test_cache.clear()  # Читаем содержимое из generated_tests, а не из кэша
+
+        assert _view(quiz_service.get_test_questions_for_instance(test_id, shuffle_seed=11)) == before
+        assert quiz_service.get_answer_key_for_instance(test_id) == answer_key
+        # Новый тест видит текущий банк
+        fresh = quiz_service.get_test_questions_for_instance(quiz_service.generate_new_test_instance(2))
+    assert {q.question_text for q in fresh} == {'rewritten', 'q1'}
+
+
+def test_shuffle_seed_is_deterministic(app):
+    with app.app_context():
+        add_questions(8, wrong=('b', 'c', 'd'))
+        test_id = quiz_service.generate_new_test_instance(8)
+        views = {seed: _view(quiz_service.get_test_questions_for_instance(test_id, shuffle_seed=seed))
+                 for seed in range(5)}
+        again = _view(quiz_service.get_test_questions_for_instance(test_id, shuffle_seed=3))
+    assert again == views[3]
+    assert len({repr(view) for view in views.values()}) > 1
+    # Разные зерна меняют только порядок
+    assert len({repr(sorted((q_id, sorted(answers)) for q_id, _, answers in view)) for view in views.values()}) == 1
+
+
+def test_refreshed_answer_key_keeps_frozen_text(app):
+    with app.app_context():
+        (question_id,) = add_questions(1)
+        test_id = quiz_service.generate_new_test_instance(1)
+        answers = _answers_data(question_id)
+        for ans in answers:
+            ans['is_correct'] = 1 if ans['text'] == 'b' else 0
+        answers[1]['text'] = 'B'
+        assert question_service.update_existing_question(question_id, 'q0', None, answers)
+
+        assert quiz_service.refresh_frozen_answer_keys([question_id]) == 1
+        test_cache.clear()
+        (question,) = quiz_service.get_test_questions_for_instance(test_id, shuffle_seed=0)
+        answer_key = quiz_service.get_answer_key_for_instance(test_id)
+    assert answer_key == {question_id: {answers[1]['id']}}
+    assert 'B' not in [ans.answer_text for ans in question.answers]
+
+
+def test_legacy_test_is_frozen_on_first_read(app):
+    with app.app_context():
+        add_questions(3)
+        test_id = quiz_service.generate_new_test_instance(3)
+        execute_db("UPDATE generated_tests SET frozen_content = NULL WHERE id = ?", (test_id,))
+        test_cache.clear()
+        view = _view(quiz_service.get_test_questions_for_instance(test_id, shuffle_seed=1))
+        row = query_db("SELECT frozen_content FROM generated_tests WHERE id = ?", (test_id,), one=True)
+        test_cache.clear()
+        again = _view(quiz_service.get_test_questions_for_instance(test_id, shuffle_seed=1))
+    assert row['frozen_content'] is not None
+    assert again == view and len(view) == 3
+
+
+def test_attempt_is_saved_after_question_is_deleted(app):
+    with app.app_context():
+        kept, deleted = add_questions(2)
+        test_id = quiz_service.generate_new_test_instance(2)
+        answer_key = quiz_service.get_answer_key_for_instance(test_id)
+        assert question_service.delete_question_by_id(deleted)
+
+        result = quiz_service.submit_and_evaluate_test(
+            test_id, {question_id: min(correct_ids) for question_id, correct_ids in answer_key.items()})
+        saved = query_db("SELECT score, total_questions_in_test FROM user_attempts WHERE id = ?",
+                         (result.get('attempt_id'),), one=True)
+        answered = [row['question_id'] for row in query_db("SELECT question_id FROM attempt_answers")]
+        stats = query_db("SELECT question_id, attempts, correct FROM question_attempt_stats")
+
+    assert 'error' not in result
+    assert (result['score'], saved['score'], saved['total_questions_in_test']) == (2, 2, 2)
+    assert answered == [kept]  # Ответ на удаленный вопрос в статистику не попадает
+    assert [tuple(row) for row in stats] == [(kept, 1, 1)]